@@ -0,0 +1,161 @@
+from multiprocessing import shared_memory, resource_tracker
+import atexit
+import os
+import subprocess
+import sys
+import numpy as np
+
+# AI decisions on worker processes
+# Wandering and chase steering only read a handful of numbers per actor, so the
+# actor state lives in one shared-memory block (a row per field, a column per
+# actor slot) that the main process and every worker map as NumPy arrays. Each
+# step the main process writes the actors' state, then each worker decides for
+# its own slice of slots while the frame renders. The results are read back at
+# the start of the next step, so decisions arrive one step late.
+# With workers=0 the same decisions are made inline, no processes involved.
+# Random draws come from (seed, step number) for all submitted slots at once and
+# each worker takes its slice, so a run decides the same whatever the worker count.
+# Workers are separate Python processes running this file, not forks of the game,
+# so they never import Ursina.
+
+AI_NONE = 0
+AI_WANDER = 1   # random new heading when the timer runs out or on a random turn
+AI_CHASE = 2    # head for (target_x, target_z), stop within stop_distance
+
+INPUTS = ('kind', 'x', 'z', 'heading', 'timer', 'turn_rate', 'timer_min', 'timer_max',
+          'target_x', 'target_z', 'stop_distance')
+OUTPUTS = ('out_heading', 'out_timer', 'turned', 'moving')
+FIELDS = INPUTS + OUTPUTS
+
+
+def decide(data, start, end, count, dt, seed, step):
+    # One slice of slots out of the first count: reads the input rows, writes the output rows
+    fields = {name: data[i, start:end] for i, name in enumerate(FIELDS)}
+    turn_roll, heading_roll, timer_roll = np.random.default_rng((seed, step)).random((3, count))[:, start:end]
+    kind = fields['kind']
+    heading = fields['heading'].copy()
+    timer = fields['timer'] - dt
+    turned = np.zeros(end - start, dtype=bool)
+    moving = np.zeros(end - start, dtype=bool)
+
+    wander = kind == AI_WANDER
+    turn = wander & (((fields['timer_max'] > 0) & (timer <= 0)) | (turn_roll < fields['turn_rate'] * dt))
+    heading = np.where(turn, heading_roll * 360, heading)
+    timer = np.where(turn, fields['timer_min'] + timer_roll * (fields['timer_max'] - fields['timer_min']), timer)
+    turned |= turn
+    moving |= wander
+
+    chase = kind == AI_CHASE
+    dx = fields['target_x'] - fields['x']
+    dz = fields['target_z'] - fields['z']
+    heading = np.where(chase, np.degrees(np.arctan2(dx, dz)), heading)
+    turned |= chase
+    moving |= chase & (np.hypot(dx, dz) > np.maximum(fields['stop_distance'], 1e-3))
+
+    fields['out_heading'][:] = heading
+    fields['out_timer'][:] = timer
+    fields['turned'][:] = turned
+    fields['moving'][:] = moving
+
+
+def attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching also registers the block for cleanup,
+        # which is the owner's job
+        shm = shared_memory.SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class AIWorkers:
+    def __init__(self, capacity, workers=None, seed=None):
+        # workers: process count, None for one per spare core, 0 to decide inline
+        if workers is None:
+            workers = max((os.cpu_count() or 1) - 1, 1)
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(create=True, size=len(FIELDS) * capacity * 4)
+        self.data = np.ndarray((len(FIELDS), capacity), dtype=np.float32, buffer=self.shm.buf)
+        self.data[:] = 0
+        for i, name in enumerate(FIELDS):
+            setattr(self, name, self.data[i])
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().generate_state(1)[0])
+        self.step = 0
+        self.pending = False
+        self.busy = 0
+        self.processes = []
+        for _ in range(workers):
+            self.processes.append(subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), self.shm.name, str(capacity), str(self.seed)],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1))
+        atexit.register(self.close)
+
+    @property
+    def workers(self):
+        return len(self.processes)
+
+    def slices(self, count):
+        # Disjoint, even slices of the first count slots
+        bounds = np.linspace(0, count, self.workers + 1).astype(int)
+        return [(bounds[i], bounds[i + 1]) for i in range(self.workers) if bounds[i] < bounds[i + 1]]
+
+    def submit(self, dt, count=None):
+        # Decide for slots [0, count) from what is in the input rows now
+        count = self.capacity if count is None else count
+        self.collect()
+        self.step += 1
+        if not self.processes:
+            decide(self.data, 0, count, count, dt, self.seed, self.step)
+            return
+        for process, (start, end) in zip(self.processes, self.slices(count)):
+            process.stdin.write(f'step {dt} {start} {end} {count} {self.step}\n')
+        self.busy = len(self.slices(count))
+        self.pending = True
+
+    def collect(self):
+        # Wait for the last submit; the output rows are valid afterwards
+        if not self.pending:
+            return
+        for process in self.processes[:self.busy]:
+            process.stdout.readline()
+        self.pending = False
+
+    def close(self):
+        if self.shm is None:
+            return
+        self.collect()
+        for process in self.processes:
+            try:
+                process.stdin.write('quit\n')
+                process.stdin.close()
+            except OSError:
+                pass
+            process.wait()
+            process.stdout.close()
+        self.processes = []
+        self.data = None
+        for name in FIELDS:
+            setattr(self, name, None)
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+
+def worker_main(name, capacity, seed):
+    shm = attach(name)
+    data = np.ndarray((len(FIELDS), capacity), dtype=np.float32, buffer=shm.buf)
+    for line in sys.stdin:
+        command = line.split()
+        if not command or command[0] == 'quit':
+            break
+        start, end, count, step = (int(value) for value in command[2:6])
+        decide(data, start, end, count, float(command[1]), seed, step)
+        sys.stdout.write('done\n')
+        sys.stdout.flush()
+    del data
+    shm.close()
+
+
+if __name__ == '__main__':
+    worker_main(sys.argv[1], int(sys.argv[2]), int(sys.argv[3]))
@@ -1,223 +1,55 @@
 from ursina import *
-from ursina.shaders import lit_with_shadows_shader
-import random
+from ursina.shaders import lit_with_shadows_shader, unlit_shader
+from static_batching import StaticBatcher, box_bounds
+from building_lod import BuildingLod
+from visibility import GridCuller
+from shadow_budget import ShadowManager
+from light_baking import load_or_bake
+from crowd import CrowdRenderer
+from sim_clock import SimClock
+from simulation import Simulation, ACTOR_PLAYER, ACTOR_POLICE, CITY_SEED, ROAD_WIDTH
+from rng_streams import rng_streams, choice, STREAM_COSMETIC
+from PIL import Image
+import math
 
 app = Ursina()
 
-# Game state
-class GameState:
-    def __init__(self):
-        self.wanted_level = 0
-        self.in_vehicle = False
-        self.current_vehicle = None
-        self.police_chase_active = False
-
-game_state = GameState()
-
-# Player class
-class Player(Entity):
-    def __init__(self, **kwargs):
-        super().__init__(
-            model='cube',
-            color=color.blue,
-            position=(0, 1, 0),
-            scale=(0.8, 1.8, 0.8),
-            collider='box',
-            **kwargs
-        )
-        self.speed = 8
-        self.rotation_speed = 150
-        self.health = 100
-
-    def update(self):
-        if not game_state.in_vehicle:
-            # Player movement
-            self.rotation_y += held_keys['d'] * self.rotation_speed * time.dt
-            self.rotation_y -= held_keys['a'] * self.rotation_speed * time.dt
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * held_keys['w'] * self.speed * time.dt
-            self.position -= forward * held_keys['s'] * self.speed * time.dt
-            
-            # Keep player on ground
-            self.y = 1
-            
-            # Check for nearby vehicles to enter
-            if held_keys['e']:
-                self.try_enter_vehicle()
-
-    def try_enter_vehicle(self):
-        for vehicle in vehicles:
-            if distance(self.position, vehicle.position) < 3:
-                game_state.in_vehicle = True
-                game_state.current_vehicle = vehicle
-                self.visible = False
-                vehicle.take_control()
-                break
-
-    def exit_vehicle(self):
-        if game_state.in_vehicle and game_state.current_vehicle:
-            game_state.in_vehicle = False
-            self.position = game_state.current_vehicle.position + Vec3(2, 0, 0)
-            self.visible = True
-            game_state.current_vehicle.release_control()
-            game_state.current_vehicle = None
-
-# Vehicle class
-class Vehicle(Entity):
-    def __init__(self, position=(0, 0, 0), vehicle_type='car', **kwargs):
-        color_choice = random.choice([color.red, color.yellow, color.green, color.white, color.black])
-        scale_choice = (2.5, 1.2, 5) if vehicle_type == 'car' else (3, 2, 6)
-        
-        super().__init__(
-            model='cube',
-            color=color_choice,
-            position=position,
-            scale=scale_choice,
-            collider='box',
-            **kwargs
-        )
-        self.speed = 0
-        self.max_speed = 25
-        self.acceleration = 15
-        self.brake_force = 20
-        self.turn_speed = 80
-        self.controlled = False
-        self.ai_speed = random.uniform(8, 15)
-        self.ai_direction = random.choice([1, -1])
-        self.vehicle_type = vehicle_type
-
-    def update(self):
-        if self.controlled:
-            # Player control
-            if held_keys['w']:
-                self.speed = min(self.speed + self.acceleration * time.dt, self.max_speed)
-            elif held_keys['s']:
-                self.speed = max(self.speed - self.brake_force * time.dt, -self.max_speed * 0.5)
-            else:
-                # Gradual deceleration
-                if self.speed > 0:
-                    self.speed = max(0, self.speed - self.brake_force * 0.5 * time.dt)
-                elif self.speed < 0:
-                    self.speed = min(0, self.speed + self.brake_force * 0.5 * time.dt)
-            
-            # Steering
-            if abs(self.speed) > 0.1:
-                self.rotation_y += held_keys['d'] * self.turn_speed * time.dt * (self.speed / self.max_speed)
-                self.rotation_y -= held_keys['a'] * self.turn_speed * time.dt * (self.speed / self.max_speed)
-            
-            # Movement
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * self.speed * time.dt
-            self.y = 0.6
-            
-            # Exit vehicle
-            if held_keys['f']:
-                player.exit_vehicle()
-        else:
-            # AI vehicle movement
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * self.ai_speed * self.ai_direction * time.dt
-            
-            # Reverse direction at boundaries
-            if abs(self.position.x) > 80 or abs(self.position.z) > 80:
-                self.ai_direction *= -1
-                self.rotation_y += 180
-
-    def take_control(self):
-        self.controlled = True
-        self.speed = 0
-
-    def release_control(self):
-        self.controlled = False
-        self.speed = 0
-
-# Pedestrian class
-class Pedestrian(Entity):
-    def __init__(self, position=(0, 0, 0), **kwargs):
-        super().__init__(
-            model='cube',
-            color=random.choice([color.orange, color.pink, color.violet, color.cyan]),
-            position=position,
-            scale=(0.7, 1.6, 0.7),
-            collider='box',
-            **kwargs
-        )
-        self.walk_speed = random.uniform(2, 4)
-        self.direction = random.uniform(0, 360)
-        self.rotation_y = self.direction
-        self.alive = True
-
-    def update(self):
-        if self.alive:
-            # Random walking
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * self.walk_speed * time.dt
-            
-            # Random direction changes
-            if random.random() < 0.01:
-                self.direction = random.uniform(0, 360)
-                self.rotation_y = self.direction
-            
-            # Stay within bounds
-            if abs(self.position.x) > 90 or abs(self.position.z) > 90:
-                self.direction += 180
-                self.rotation_y = self.direction
-            
-            self.y = 0.8
-            
-            # Check collision with vehicles
-            for vehicle in vehicles:
-                if vehicle.controlled and distance(self.position, vehicle.position) < 3 and abs(vehicle.speed) > 5:
-                    self.get_hit()
-                    break
-
-    def get_hit(self):
-        self.alive = False
-        self.color = color.dark_gray
-        self.y = 0.2
-        game_state.wanted_level += 1
-        if game_state.wanted_level >= 2 and not game_state.police_chase_active:
-            spawn_police()
-        print(f"Wanted Level: {game_state.wanted_level} ⭐")
-
-# Police vehicle class
-class PoliceVehicle(Vehicle):
-    def __init__(self, position=(0, 0, 0), **kwargs):
-        super().__init__(position=position, vehicle_type='police', **kwargs)
-        self.color = color.rgb(0, 0, 200)
-        self.scale = (2.5, 1.2, 5)
-        self.chase_speed = 18
-        self.controlled = False
-
-    def update(self):
-        if not self.controlled:
-            # Chase player
-            if game_state.in_vehicle and game_state.current_vehicle:
-                target_pos = game_state.current_vehicle.position
-            else:
-                target_pos = player.position
-            
-            direction_to_player = (target_pos - self.position).normalized()
-            self.look_at(target_pos)
-            self.position += direction_to_player * self.chase_speed * time.dt
-            self.y = 0.6
-
-def spawn_police():
-    game_state.police_chase_active = True
-    spawn_positions = [
-        Vec3(player.position.x + 50, 0.6, player.position.z),
-        Vec3(player.position.x - 50, 0.6, player.position.z),
-        Vec3(player.position.x, 0.6, player.position.z + 50),
-    ]
-    for pos in spawn_positions[:game_state.wanted_level]:
-        police_car = PoliceVehicle(position=pos)
-        vehicles.append(police_car)
+# Gameplay steps at a fixed 60 Hz, rendering interpolates in between
+sim_clock = SimClock(rate=60)
+
+# The game itself runs in simulation.py (headless.py runs it without a window);
+# this file draws it. Every actor gets a render proxy Entity.
+vehicle_colors = [color.red, color.yellow, color.green, color.white, color.black]
+
+def make_proxy(actor):
+    if actor.kind == ACTOR_PLAYER:
+        proxy_color, scale = color.blue, (0.8, 1.8, 0.8)
+    elif actor.kind == ACTOR_POLICE:
+        proxy_color, scale = color.rgb(0, 0, 200), (2.5, 1.2, 5)
+    else:
+        proxy_color, scale = choice(rng_streams[STREAM_COSMETIC], vehicle_colors), (2.5, 1.2, 5)
+    proxy = Entity(model='cube', color=proxy_color, position=actor.position, rotation_y=actor.heading,
+                   scale=scale, collider='box')
+    sim_clock.track(proxy)
+    return proxy
+
+def simulation_step(dt):
+    simulation.step(dt)
+    for name, data in simulation.drain_events():
+        if name == 'teleport':
+            # Moved by hand (out of a car, police from the pool): no sliding there
+            sim_clock.snap(data.proxy)
+        elif name == 'wanted':
+            print(f"Wanted Level: {data} ⭐")
+
+# Lighting
+sun = DirectionalLight(parent=scene, y=2, z=3, shadows=True, rotation=(45, -45, 45))
+AmbientLight(color=color.rgba(100, 100, 100, 0.6))
 
 # Create world
 ground = Entity(
     model='plane',
     color=color.rgb(40, 40, 40),
-    collider='box',
     scale=(200, 1, 200),
     texture='white_cube',
     shader=lit_with_shadows_shader
@@ -225,7 +57,7 @@ ground = Entity(
 
 # Create road grid
 roads = []
-road_width = 4
+road_width = ROAD_WIDTH
 for i in range(-100, 101, 20):
     # Horizontal roads
     road = Entity(
@@ -256,21 +88,30 @@ building_types = [
     {'color': color.rgb(180, 150, 100), 'height': 25, 'name': 'Hotel'},
 ]
 
-for x in range(-90, 91, 20):
-    for z in range(-90, 91, 20):
-        if abs(x) < 5 and abs(z) < 5:
-            continue
-        
-        building_type = random.choice(building_types)
-        building = Entity(
-            model='cube',
-            color=building_type['color'],
-            position=(x + random.uniform(-3, 3), building_type['height'] / 2, z + random.uniform(-3, 3)),
-            scale=(random.uniform(6, 10), building_type['height'], random.uniform(6, 10)),
-            collider='box',
-            shader=lit_with_shadows_shader
-        )
-        buildings.append(building)
+# AI worker processes, None for one per spare core, 0 to make the decisions on the main thread
+AI_WORKERS = None
+simulation = Simulation(input=lambda sim_time: held_keys, make_proxy=make_proxy,
+                        building_types=[(t['name'], t['height'], tuple(t['color'])) for t in building_types],
+                        ai_workers=AI_WORKERS, rng_streams=rng_streams)
+sim_clock.register(simulation_step)
+game_state = simulation.game_state
+player = simulation.player.proxy
+vehicles = [vehicle.proxy for vehicle in simulation.vehicles]
+
+# Building layout comes from a seeded, cached generator so every launch
+# (and every performance comparison) gets the same city
+city_seed = CITY_SEED
+for record in simulation.city_layout:
+    building_type = building_types[record['type']]
+    building = Entity(
+        model='cube',
+        color=Color(*record['color']),
+        position=record['position'],
+        scale=record['scale'],
+        shader=unlit_shader
+    )
+    building.building_name = building_type['name']
+    buildings.append(building)
 
 # Special buildings
 police_station = Entity(
@@ -278,8 +119,7 @@ police_station = Entity(
     color=color.rgb(0, 0, 150),
     position=(50, 8, 50),
     scale=(12, 16, 12),
-    collider='box',
-    shader=lit_with_shadows_shader
+    shader=unlit_shader
 )
 
 hotel = Entity(
@@ -287,28 +127,63 @@ hotel = Entity(
     color=color.rgb(200, 180, 100),
     position=(-50, 15, -50),
     scale=(15, 30, 15),
-    collider='box',
-    shader=lit_with_shadows_shader
+    shader=unlit_shader
 )
 
-# Create player
-player = Player()
-
-# Create vehicles
-vehicles = []
-for _ in range(15):
-    x = random.uniform(-80, 80)
-    z = random.uniform(-80, 80)
-    vehicle = Vehicle(position=(x, 0.6, z))
-    vehicles.append(vehicle)
-
-# Create pedestrians
-pedestrians = []
-for _ in range(20):
-    x = random.uniform(-80, 80)
-    z = random.uniform(-80, 80)
-    pedestrian = Pedestrian(position=(x, 0.8, z))
-    pedestrians.append(pedestrian)
+# Merge the static city into per-material meshes (one draw call per block instead
+# of one per building). Buildings are grouped per lod_block so LOD can swap blocks.
+lod_block = 60
+
+def block_of(entity):
+    return (math.floor(entity.x / lod_block), math.floor(entity.z / lod_block))
+
+# The sun and the city never move, so building shadows and ambient occlusion are
+# baked once (and cached per layout seed): into a ground lightmap with the roads
+# painted in, and into the buildings' vertex colors. Real-time shadows are left
+# to the things that move.
+static_buildings = buildings + [police_station, hotel]
+ground_image, building_shades = load_or_bake(
+    city_seed,
+    boxes=[box_bounds(tuple(e.world_position), tuple(e.world_scale)) for e in static_buildings],
+    paint=[(r.x - r.scale_x / 2, r.z - r.scale_z / 2, r.x + r.scale_x / 2, r.z + r.scale_z / 2, tuple(r.color))
+           for r in roads],
+    extent=(-100, -100, 100, 100),
+    ground_color=tuple(ground.color),
+    light_direction=tuple(sun.forward)
+)
+ground.texture = Texture(Image.fromarray(ground_image).convert('RGBA'))
+ground.color = color.white
+
+city_batch = StaticBatcher()
+for road in roads:
+    city_batch.add(road, tag='Road', group='roads')
+for i, building in enumerate(buildings):
+    city_batch.add(building, tag=building.building_name, group=block_of(building), shades=building_shades[i])
+city_batch.add(police_station, tag='Police Station', group=block_of(police_station), shades=building_shades[-2])
+city_batch.add(hotel, tag='Hotel', group=block_of(hotel), shades=building_shades[-1])
+city_meshes = city_batch.build()
+
+# Roads live in the lightmap now, only their bounds are kept for gameplay queries
+for mesh in [m for m in city_meshes if m.group == 'roads']:
+    city_meshes.remove(mesh)
+    destroy(mesh)
+# Baked buildings ignore the lights and stay out of the shadow pass
+for mesh in city_meshes:
+    mesh.unlit = True
+
+# Distant blocks drop to flat boxes, then to billboard impostor strips.
+# Each block is also a culling cell: hiding its root hides the block and its impostor.
+building_lod = BuildingLod(flat_distance=60, impostor_distance=120)
+city_culler = GridCuller()
+for mesh in city_meshes:
+    block_root = Entity()
+    mesh.parent = block_root
+    building_lod.add_group(mesh.group, [mesh], [(r['min'], r['max'], r['color']) for r in mesh.batch_bounds],
+                           parent=block_root)
+    city_culler.register_cell(mesh.group, [block_root], [(r['min'], r['max']) for r in mesh.batch_bounds])
+
+# Pedestrians are simulated as arrays and drawn instanced
+crowd_renderer = CrowdRenderer(simulation.crowd)
 
 # Camera setup
 camera.parent = player
@@ -316,17 +191,29 @@ camera.position = (0, 8, -20)
 camera.rotation_x = 15
 
 def update():
+    sim_clock.tick(time.dt)
+
     # Update camera to follow player or vehicle
     if game_state.in_vehicle and game_state.current_vehicle:
-        camera.parent = game_state.current_vehicle
+        camera.parent = game_state.current_vehicle.proxy
         camera.position = (0, 8, -20)
     else:
         camera.parent = player
         camera.position = (0, 8, -20)
 
-# Lighting
-DirectionalLight(parent=scene, y=2, z=3, shadows=True, rotation=(45, -45, 45))
-AmbientLight(color=color.rgba(100, 100, 100, 0.6))
+    crowd_renderer.sync()
+    building_lod.update(camera.world_position)
+    stats = city_culler.update_from_camera(camera)
+    shadow_manager.update(game_state.current_vehicle.proxy.position if game_state.in_vehicle else player.position)
+    culling_text.text = (f'Blocks drawn: {stats["drawn"]} | frustum culled: {stats["frustum_culled"]} | '
+                         f'occluded: {stats["occluded"]} | shadow casters: {shadow_manager.caster_count}\n'
+                         f'systems: {simulation.world.stats_text()}')
+
+# Real-time shadows only for moving things around the player; the ground receives but never casts
+shadow_manager = ShadowManager(sun, radius=50)
+shadow_manager.add_receivers(ground)
+shadow_manager.add_casters([player])
+shadow_manager.add_casters(vehicles)
 
 # UI
 wanted_text = Text(
@@ -345,12 +232,17 @@ info_text = Text(
     color=color.white
 )
 
+culling_text = Text(
+    text='',
+    position=(-0.85, -0.4),
+    scale=0.8,
+    color=color.light_gray
+)
+
 def update_ui():
-    wanted_text.text = f'Wanted: {"⭐" * game_state.wanted_level} {game_state.wanted_level}'
-    if game_state.in_vehicle:
-        info_text.text = f'Speed: {abs(game_state.current_vehicle.speed):.1f} | F: Exit Vehicle'
-    else:
-        info_text.text = 'WASD: Move | E: Enter Vehicle'
+    ui = simulation.ui_state()
+    wanted_text.text = ui['wanted']
+    info_text.text = ui['info']
 
 # Update UI continuously
 def game_update():
@@ -1,6 +1,14 @@
 from ursina import *
 from ursina.shaders import lit_with_shadows_shader
-import random
+from shadow_budget import ShadowManager
+from static_collision import StaticCollision
+from visibility import entity_bounds
+from sim_clock import SimClock
+from update_scheduler import UpdateScheduler
+from vehicle_dynamics import VehicleDynamics, DRAG_DAMP, DRAG_NONE
+from avoidance import Avoidance
+from rng_streams import stream, choice, STREAM_WORLD, STREAM_CROWD, STREAM_TRAFFIC, STREAM_POLICE, STREAM_WANTED, STREAM_COSMETIC
+import numpy as np
 
 # Initialize the game
 app = Ursina()
@@ -8,6 +16,12 @@ window.title = 'GTA-Style Game'
 window.borderless = False
 window.fullscreen = False
 
+# Gameplay steps at a fixed 60 Hz, rendering interpolates in between
+sim_clock = SimClock(rate=60)
+# AI actors step less often the further they are from the camera
+ai_scheduler = UpdateScheduler(clock=sim_clock)
+sim_clock.register(lambda dt: ai_scheduler.tick(dt, camera.world_position))
+
 # Load assets (you should replace these with actual texture files)
 # For now, we'll use built-in textures
 ground_texture = 'grass'
@@ -44,29 +58,33 @@ class Player(Entity):
         self.velocity_y = 0
         self.on_ground = True
         self.in_vehicle = False
+        sim_clock.register(self)
 
-    def update(self):
+    def fixed_update(self, dt):
         if self.in_vehicle:
             return
             
         # Movement controls
-        self.rotation_y += held_keys['d'] * self.rotation_speed * time.dt
-        self.rotation_y -= held_keys['a'] * self.rotation_speed * time.dt
+        self.rotation_y += held_keys['d'] * self.rotation_speed * dt
+        self.rotation_y -= held_keys['a'] * self.rotation_speed * dt
         
         forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
         right = Vec3(self.right.x, 0, self.right.z).normalized()
         
         # Forward/backward movement
         if held_keys['w']:
-            self.position += forward * self.speed * time.dt
+            self.position += forward * self.speed * dt
         if held_keys['s']:
-            self.position -= forward * self.speed * time.dt
+            self.position -= forward * self.speed * dt
         
         # Strafe movement
         if held_keys['q']:
-            self.position -= right * self.speed * time.dt
+            self.position -= right * self.speed * dt
         if held_keys['e']:
-            self.position += right * self.speed * time.dt
+            self.position += right * self.speed * dt
+        
+        # Keep out of buildings
+        self.x, self.z, _ = static_collision.push_out(self.x, self.z, 0.25, self.y - 0.8, self.y + 0.9)
         
         # Jump
         if held_keys['space'] and self.on_ground:
@@ -75,8 +93,8 @@ class Player(Entity):
         
         # Apply gravity
         if not self.on_ground:
-            self.velocity_y -= self.gravity * time.dt
-            self.y += self.velocity_y * time.dt
+            self.velocity_y -= self.gravity * dt
+            self.y += self.velocity_y * dt
             
             # Ground collision
             if self.y <= 0.9:
@@ -88,7 +106,7 @@ class Vehicle(Entity):
     def __init__(self, model_type='car', position=(0, 0, 0), **kwargs):
         super().__init__(
             model='cube',
-            texture=random.choice(car_textures),
+            texture=choice(stream(STREAM_COSMETIC), car_textures),
             position=position,
             scale=(2, 1, 4),
             collider='box',
@@ -96,92 +114,104 @@ class Vehicle(Entity):
             **kwargs
         )
         self.model_type = model_type
-        self.speed = 0
-        self.max_speed = 15 if model_type == 'car' else 20
-        self.acceleration = 8 if model_type == 'car' else 12
-        self.brake_power = 12
-        self.turn_speed = 60
+        max_speed = 15 if model_type == 'car' else 20
+        acceleration = 8 if model_type == 'car' else 12
         self.engine_on = False
         self.driver = None
         
         # Different vehicle types
         if model_type == 'police':
             self.color = color.blue
-            self.max_speed = 18
+            max_speed = 18
         elif model_type == 'taxi':
             self.color = color.yellow
         elif model_type == 'sports':
             self.color = color.red
-            self.max_speed = 25
-            self.acceleration = 15
+            max_speed = 25
+            acceleration = 15
 
-    def update(self):
-        if self.driver is not None:
-            # Player is driving
-            self.engine_on = True
-            
-            # Acceleration
-            if held_keys['w']:
-                self.speed += self.acceleration * time.dt
-            elif held_keys['s']:
-                self.speed -= self.brake_power * time.dt
-            else:
-                # Natural deceleration
-                self.speed *= 0.95
-            
-            # Limit speed
-            self.speed = max(-self.max_speed/2, min(self.speed, self.max_speed))
-            
-            # Steering
-            if held_keys['d']:
-                self.rotation_y += self.turn_speed * time.dt * (self.speed/self.max_speed)
-            if held_keys['a']:
-                self.rotation_y -= self.turn_speed * time.dt * (self.speed/self.max_speed)
-            
-            # Movement
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * self.speed * time.dt
-            
-            # Keep vehicle on ground
-            self.y = max(0.5, self.y)
-            
-            # Update camera
-            camera.parent = self
-            camera.position = (0, 8, -15)
-            camera.rotation_x = 20
-        else:
-            # NPC vehicle behavior
-            if random.random() < 0.01:  # 1% chance to change direction
-                self.rotation_y += random.uniform(-30, 30)
-            
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * 5 * time.dt
-            
-            # Keep on road (simple boundary check)
-            if abs(self.x) > 40 or abs(self.z) > 40:
-                self.rotation_y += 180
-            
-            # Natural stop
-            self.speed *= 0.98
+        # Speed, heading and handling live in the batched dynamics (drive_vehicles);
+        # AI cars cruise along at a steady 5
+        self.slot = vehicle_dynamics.add(self.x, self.z, self.rotation_y, speed=AI_CRUISE_SPEED,
+                                         max_speed=max_speed, acceleration=acceleration, brake_power=12,
+                                         turn_speed=60, drag=DRAG_NONE)
+        vehicle_dynamics.bind(self.slot, self)
+        sim_clock.track(self)
+
+    @property
+    def speed(self):
+        return vehicle_dynamics.speed[self.slot].item()
 
     def enter_vehicle(self, player):
         self.driver = player
+        self.engine_on = True
+        vehicle_dynamics.stop(self.slot)
+        vehicle_dynamics.drag[self.slot] = DRAG_DAMP
         player.visible = False
         player.in_vehicle = True
         player.position = self.position
+        sim_clock.snap(player)
         game_state['in_vehicle'] = True
         game_state['current_vehicle'] = self
         
     def exit_vehicle(self, player):
         self.driver = None
+        vehicle_dynamics.stop(self.slot)
+        vehicle_dynamics.speed[self.slot] = AI_CRUISE_SPEED
+        vehicle_dynamics.drag[self.slot] = DRAG_NONE
         player.visible = True
         player.in_vehicle = False
         player.position = self.position + Vec3(2, 0, 0)
+        sim_clock.snap(player)
         game_state['in_vehicle'] = False
         game_state['current_vehicle'] = None
         camera.parent = player
         camera.position = (0, 5, -15)
 
+# All cars, driven and AI, are integrated together in one batched step
+AI_CRUISE_SPEED = 5
+vehicle_dynamics = VehicleDynamics()
+
+def drive_vehicles(dt):
+    dynamics = vehicle_dynamics
+    n = dynamics.count
+    ai = np.ones(n, dtype=bool)
+    driven = game_state['current_vehicle'] if game_state['in_vehicle'] else None
+    if driven is not None:
+        # Player is driving
+        ai[driven.slot] = False
+        dynamics.throttle[driven.slot] = 1 if held_keys['w'] else -1 if held_keys['s'] else 0
+        dynamics.steer[driven.slot] = held_keys['d'] - held_keys['a']
+
+    # NPC vehicle behavior: 1% chance per step to change direction
+    traffic_rng = stream(STREAM_TRAFFIC)
+    turn = np.flatnonzero(ai & (traffic_rng.random(n) < 0.01))
+    dynamics.heading[turn] += traffic_rng.uniform(-30, 30, len(turn))
+
+    dynamics.step(dt)
+
+    # Keep AI cars on the road (simple boundary check)
+    out = np.flatnonzero(ai & ((np.abs(dynamics.x[:n]) > 40) | (np.abs(dynamics.z[:n]) > 40)))
+    dynamics.heading[out] += 180
+
+    if driven is not None:
+        # Keep vehicle on ground, stop against buildings
+        driven.y = max(0.5, driven.y)
+        x, z, hit = static_collision.push_out(dynamics.x[driven.slot].item(), dynamics.z[driven.slot].item(),
+                                              1.2, driven.y - 0.4, driven.y + 0.5)
+        dynamics.place(driven.slot, x, z)
+        if hit >= 0:
+            dynamics.speed[driven.slot] = 0
+
+        # Update camera
+        camera.parent = driven
+        camera.position = (0, 8, -15)
+        camera.rotation_x = 20
+
+    dynamics.sync()
+
+sim_clock.register(drive_vehicles)
+
 class NPC(Entity):
     def __init__(self, position=(0, 0, 0), **kwargs):
         super().__init__(
@@ -193,19 +223,23 @@ class NPC(Entity):
             shader=lit_with_shadows_shader,
             **kwargs
         )
-        self.speed = random.uniform(1, 3)
-        self.direction = random.uniform(0, 360)
+        crowd_rng = stream(STREAM_CROWD)
+        self.speed = crowd_rng.uniform(1, 3)
+        self.direction = crowd_rng.uniform(0, 360)
         self.walk_timer = 0
+        sim_clock.track(self)
+        ai_scheduler.add(self, camera.world_position)
         
-    def update(self):
-        self.walk_timer += time.dt
-        if self.walk_timer > random.uniform(2, 5):
-            self.direction = random.uniform(0, 360)
+    def fixed_update(self, dt):
+        self.walk_timer += dt
+        crowd_rng = stream(STREAM_CROWD)
+        if self.walk_timer > crowd_rng.uniform(2, 5):
+            self.direction = crowd_rng.uniform(0, 360)
             self.walk_timer = 0
         
         self.rotation_y = self.direction
         forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-        self.position += forward * self.speed * time.dt
+        self.position += forward * self.speed * dt
         
         # Keep NPCs in bounds
         if abs(self.x) > 45 or abs(self.z) > 45:
@@ -225,8 +259,10 @@ class Police(Entity):
         )
         self.speed = 4
         self.target = None
+        sim_clock.track(self)
+        ai_scheduler.add(self, camera.world_position)
         
-    def update(self):
+    def fixed_update(self, dt):
         if game_state['wanted_level'] > 0:
             # Chase player
             if player.visible:
@@ -238,7 +274,7 @@ class Police(Entity):
                 direction = self.target.position - self.position
                 if direction.length() > 0:
                     direction.normalize()
-                    self.position += direction * self.speed * time.dt
+                    self.position += direction * self.speed * dt
                     self.look_at(self.target)
 
 class Building(Entity):
@@ -247,13 +283,12 @@ class Building(Entity):
             model='cube',
             texture=building_texture,
             position=position,
-            collider='box',
             shader=lit_with_shadows_shader,
             **kwargs
         )
         
         self.building_type = building_type
-        self.scale_y = random.uniform(3, 8)
+        self.scale_y = stream(STREAM_WORLD).uniform(3, 8)
         
         if building_type == 'hotel':
             self.color = color.gold
@@ -275,7 +310,6 @@ class Building(Entity):
 ground = Entity(
     model='plane',
     texture=ground_texture,
-    collider='box',
     scale=(100, 1, 100),
     shader=lit_with_shadows_shader
 )
@@ -288,8 +322,7 @@ for z in range(-40, 41, 20):
         texture=road_texture,
         position=(0, 0.01, z),
         scale=(15, 1, 100),
-        color=color.dark_gray,
-        collider='box'
+        color=color.dark_gray
     )
     roads.append(road)
 
@@ -299,12 +332,12 @@ for x in range(-40, 41, 20):
         texture=road_texture,
         position=(x, 0.01, 0),
         scale=(100, 1, 15),
-        color=color.dark_gray,
-        collider='box'
+        color=color.dark_gray
     )
     roads.append(road)
 
 # Add road markings
+road_markings = []
 for z in range(-50, 51, 10):
     line = Entity(
         model='cube',
@@ -312,6 +345,7 @@ for z in range(-50, 51, 10):
         position=(0, 0.02, z),
         scale=(0.1, 0.01, 2)
     )
+    road_markings.append(line)
 
 # Create buildings with different types
 building_types = ['apartment', 'hotel', 'police_station', 'hospital', 'bank']
@@ -320,13 +354,22 @@ buildings = []
 for x in range(-30, 31, 15):
     for z in range(-30, 31, 15):
         if abs(x) > 10 or abs(z) > 10:  # Leave center area open
-            building_type = random.choice(building_types)
+            building_type = choice(stream(STREAM_WORLD), building_types)
             building = Building(
                 position=(x, building.scale_y/2 if 'scale_y' in locals() else 2, z),
                 building_type=building_type
             )
             buildings.append(building)
 
+# Static geometry has no collider nodes, it lives in one collision table instead
+static_collision = StaticCollision()
+static_collision.add((-50, -0.5, -50), (50, 0, 50), tag='Ground')
+for road in roads:
+    static_collision.add((road.x - road.scale_x / 2, 0, road.z - road.scale_z / 2),
+                         (road.x + road.scale_x / 2, 0.01, road.z + road.scale_z / 2), tag='Road')
+for building in buildings:
+    static_collision.add(*entity_bounds(building), tag=building.building_type)
+
 # Create player
 player = Player()
 
@@ -347,16 +390,33 @@ for i, pos in enumerate(vehicle_positions):
 
 # Create NPCs
 npcs = []
-for _ in range(20):
-    npc = NPC(position=(random.uniform(-40, 40), 0.9, random.uniform(-40, 40)))
+for x, z in stream(STREAM_CROWD).uniform(-40, 40, (20, 2)):
+    npc = NPC(position=(x, 0.9, z))
     npcs.append(npc)
 
 # Create police officers
 police_force = []
-for _ in range(5):
-    police = Police(position=(random.uniform(-40, 40), 0.9, random.uniform(-40, 40)))
+for x, z in stream(STREAM_POLICE).uniform(-40, 40, (5, 2)):
+    police = Police(position=(x, 0.9, z))
     police_force.append(police)
 
+# NPCs and police officers on foot keep apart, out of buildings and out of the way of cars
+walker_avoidance = Avoidance(static_collision=static_collision)
+
+def avoid_walkers(dt):
+    walkers = npcs + police_force
+    x = np.array([walker.x for walker in walkers])
+    z = np.array([walker.z for walker in walkers])
+    cars = vehicle_dynamics.count
+    steer_x, steer_z = walker_avoidance.steer(x, z, obstacles=(vehicle_dynamics.x[:cars], vehicle_dynamics.z[:cars],
+                                                                np.full(cars, 2.5)))
+    for walker, push_x, push_z in zip(walkers, steer_x.tolist(), steer_z.tolist()):
+        if push_x or push_z:
+            walker.x += push_x * dt
+            walker.z += push_z * dt
+
+sim_clock.register(avoid_walkers)
+
 # Setup camera
 camera.parent = player
 camera.position = (0, 5, -15)
@@ -364,9 +424,18 @@ camera.rotation_x = 20
 camera.fov = 90
 
 # Lighting
-DirectionalLight(parent=scene, rotation=(45, -45, 45), shadows=True)
+sun = DirectionalLight(parent=scene, rotation=(45, -45, 45), shadows=True)
 AmbientLight(color=color.rgba(100, 100, 100, 0.5))
 
+# Shadows only around the player: the ground, roads and markings receive but never cast
+shadow_manager = ShadowManager(sun, radius=40)
+shadow_manager.add_receivers(ground, *roads, *road_markings)
+shadow_manager.add_casters(buildings)
+shadow_manager.add_casters([player])
+shadow_manager.add_casters(vehicles)
+shadow_manager.add_casters(npcs)
+shadow_manager.add_casters(police_force)
+
 # UI Elements
 wanted_display = Text(text=f'Wanted Level: {game_state["wanted_level"]}', 
                       position=(-0.85, 0.45), scale=2, color=color.red)
@@ -391,14 +460,16 @@ def update_ui():
         vehicle_display.text = 'On Foot'
         vehicle_display.color = color.white
 
-def check_collisions():
+def check_collisions(dt):
     # Check vehicle collisions with NPCs
     for vehicle in vehicles:
         if vehicle.driver is player:  # Player is driving
             for npc in npcs:
                 if distance(vehicle, npc) < 2:
                     # Hit an NPC
-                    npc.position = (random.uniform(-40, 40), 0.9, random.uniform(-40, 40))
+                    x, z = stream(STREAM_CROWD).uniform(-40, 40, 2)
+                    npc.position = (x, 0.9, z)
+                    sim_clock.snap(npc)
                     game_state['wanted_level'] = min(5, game_state['wanted_level'] + 1)
                     game_state['money'] -= 100
                     
@@ -410,6 +481,8 @@ def check_collisions():
                 game_state['wanted_level'] = 0
                 game_state['money'] = max(0, game_state['money'] - 500)
 
+sim_clock.register(check_collisions)
+
 def input(key):
     # Enter/Exit vehicle
     if key == 'f':
@@ -432,14 +505,21 @@ def input(key):
     if key == 'm':
         game_state['money'] += 1000
 
+# Wanted level wears off at about 6% a second, one roll per fixed step so the
+# odds don't depend on the frame rate
+WANTED_DECAY_RATE = 0.06
+
+def decay_wanted(dt):
+    if game_state['wanted_level'] > 0 and stream(STREAM_WANTED).random() < WANTED_DECAY_RATE * dt:
+        game_state['wanted_level'] -= 1
+
+sim_clock.register(decay_wanted)
+
 def update():
+    sim_clock.tick(time.dt)
     update_ui()
-    check_collisions()
+    shadow_manager.update(game_state['current_vehicle'].position if game_state['in_vehicle'] else player.position)
     
-    # Auto-decrease wanted level over time
-    if game_state['wanted_level'] > 0 and random.random() < 0.001:
-        game_state['wanted_level'] -= 1
-
 # Run the game
 print("""
 === GTA-STYLE GAME CONTROLS ===
@@ -1,6 +1,11 @@
 from ursina import *
 from ursina.shaders import lit_with_shadows_shader
-import random
+from shadow_budget import ShadowManager
+from pooling import ObjectPool
+from sleep_system import SleepSystem
+from sim_clock import SimClock
+from vehicle_dynamics import VehicleDynamics, DRAG_DAMP
+from rng_streams import stream, choice, STREAM_WANTED, STREAM_COSMETIC
 import math
 
 # Initialize the game
@@ -10,6 +15,9 @@ window.borderless = False
 window.fullscreen = False
 window.size = (1280, 720)
 
+# Gameplay steps at a fixed 60 Hz, rendering interpolates in between
+sim_clock = SimClock(rate=60)
+
 # Custom UI Colors - using direct RGB values
 UI_COLORS = {
     'primary': color.rgb(41, 128, 185),      # Blue
@@ -297,7 +305,33 @@ class NotificationSystem:
     def __init__(self):
         self.notifications = []
         self.max_notifications = 3
-        
+        # Widgets for the visible notifications plus the one being pushed out, recycled
+        self.widget_pool = ObjectPool(self.create_widget, reset=self.show_widget, size=self.max_notifications + 1)
+
+    def create_widget(self):
+        bg = Entity(
+            parent=camera.ui,
+            model='quad',
+            color=UI_COLORS['dark_transparent'],
+            scale=(0.3, 0.07),
+            origin=(0, 0)
+        )
+        bg.icon_text = Text(parent=bg, text='', position=(-0.45, 0), scale=1.5)
+        bg.title_text = Text(parent=bg, text='', position=(-0.35, 0.02), scale=1.2)
+        bg.message_text = Text(parent=bg, text='', position=(-0.35, -0.02), scale=0.9, color=color.gray)
+        return bg
+
+    def show_widget(self, bg, title, message, icon, notif_color, y_position):
+        # A recycled widget may still be sliding from its last life
+        for animation in bg.animations:
+            animation.kill()
+        bg.position = (0, y_position)
+        bg.icon_text.text = icon
+        bg.icon_text.color = notif_color
+        bg.title_text.text = title
+        bg.title_text.color = notif_color
+        bg.message_text.text = message
+
     def add_notification(self, title, message, icon='ℹ️', notif_color=color.white):
         notification = {
             'title': title,
@@ -311,49 +345,15 @@ class NotificationSystem:
         
         self.notifications.append(notification)
         
-        # Create UI elements for notification
-        bg = Entity(
-            parent=camera.ui,
-            model='quad',
-            color=UI_COLORS['dark_transparent'],
-            scale=(0.3, 0.07),
-            position=(0, notification['y_position']),
-            origin=(0, 0)
-        )
-        
-        icon_text = Text(
-            parent=bg,
-            text=icon,
-            position=(-0.45, 0),
-            scale=1.5,
-            color=notif_color
-        )
-        
-        title_text = Text(
-            parent=bg,
-            text=title,
-            position=(-0.35, 0.02),
-            scale=1.2,
-            color=notif_color
-        )
-        
-        message_text = Text(
-            parent=bg,
-            text=message,
-            position=(-0.35, -0.02),
-            scale=0.9,
-            color=color.gray
-        )
-        
-        notification['ui_elements'] = [bg, icon_text, title_text, message_text]
+        # Show it on a pooled widget
+        notification['widget'] = self.widget_pool.acquire(title, message, icon, notif_color, notification['y_position'])
         
         # Limit number of notifications
         if len(self.notifications) > self.max_notifications:
             self.remove_notification(self.notifications[0])
             
     def remove_notification(self, notification):
-        for element in notification['ui_elements']:
-            destroy(element)
+        self.widget_pool.release(notification['widget'])
         self.notifications.remove(notification)
         self.reposition_notifications()
         
@@ -361,9 +361,7 @@ class NotificationSystem:
         for i, notification in enumerate(self.notifications):
             new_y = 0.35 - i * 0.08
             notification['y_position'] = new_y
-            for element in notification['ui_elements']:
-                if isinstance(element, Entity):
-                    element.animate_y(new_y, duration=0.2)
+            notification['widget'].animate_y(new_y, duration=0.2)
                     
     def update(self):
         for notification in self.notifications[:]:
@@ -824,26 +822,27 @@ class Player(Entity):
         self.gravity = 1
         self.velocity_y = 0
         self.on_ground = True
+        sim_clock.register(self)
 
-    def update(self):
+    def fixed_update(self, dt):
         # Movement controls
-        self.rotation_y += held_keys['d'] * self.rotation_speed * time.dt
-        self.rotation_y -= held_keys['a'] * self.rotation_speed * time.dt
+        self.rotation_y += held_keys['d'] * self.rotation_speed * dt
+        self.rotation_y -= held_keys['a'] * self.rotation_speed * dt
         
         forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
         right = Vec3(self.right.x, 0, self.right.z).normalized()
         
         # Forward/backward movement
         if held_keys['w']:
-            self.position += forward * self.speed * time.dt
+            self.position += forward * self.speed * dt
         if held_keys['s']:
-            self.position -= forward * self.speed * time.dt
+            self.position -= forward * self.speed * dt
         
         # Strafe movement
         if held_keys['q']:
-            self.position -= right * self.speed * time.dt
+            self.position -= right * self.speed * dt
         if held_keys['e']:
-            self.position += right * self.speed * time.dt
+            self.position += right * self.speed * dt
         
         # Jump
         if held_keys['space'] and self.on_ground:
@@ -852,8 +851,8 @@ class Player(Entity):
         
         # Apply gravity
         if not self.on_ground:
-            self.velocity_y -= self.gravity * time.dt
-            self.y += self.velocity_y * time.dt
+            self.velocity_y -= self.gravity * dt
+            self.y += self.velocity_y * dt
             
             # Ground collision
             if self.y <= 0.9:
@@ -865,7 +864,7 @@ class Vehicle(Entity):
     def __init__(self, model_type='car', position=(0, 0, 0), **kwargs):
         super().__init__(
             model='cube',
-            texture=random.choice(car_textures),
+            texture=choice(stream(STREAM_COSMETIC), car_textures),
             position=position,
             scale=(2, 1, 4),
             collider='box',
@@ -873,40 +872,38 @@ class Vehicle(Entity):
             **kwargs
         )
         self.model_type = model_type
-        self.speed = 0
-        self.max_speed = 15
-        self.acceleration = 8
-        self.brake_power = 12
-        self.turn_speed = 60
         self.driver = None
+        # Speed, heading and handling live in the batched dynamics (drive_vehicles)
+        self.slot = vehicle_dynamics.add(self.x, self.z, self.rotation_y, max_speed=15, acceleration=8,
+                                         brake_power=12, turn_speed=60, drag=DRAG_DAMP)
+        vehicle_dynamics.bind(self.slot, self)
+        sim_clock.track(self)
 
-    def update(self):
-        if self.driver is not None:
-            # Player is driving
-            # Acceleration
-            if held_keys['w']:
-                self.speed += self.acceleration * time.dt
-            elif held_keys['s']:
-                self.speed -= self.brake_power * time.dt
-            else:
-                self.speed *= 0.95
-            
-            self.speed = max(-self.max_speed/2, min(self.speed, self.max_speed))
-            
-            # Steering
-            if held_keys['d']:
-                self.rotation_y += self.turn_speed * time.dt * (self.speed/self.max_speed)
-            if held_keys['a']:
-                self.rotation_y -= self.turn_speed * time.dt * (self.speed/self.max_speed)
-            
-            # Movement
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * self.speed * time.dt
-            
-            # Camera
-            camera.parent = self
-            camera.position = (0, 8, -15)
-            camera.rotation_x = 20
+    @property
+    def speed(self):
+        return vehicle_dynamics.speed[self.slot].item()
+
+# All cars are integrated together in one batched step
+vehicle_dynamics = VehicleDynamics()
+
+def drive_vehicles(dt):
+    # The player's keys go in as the driven car's controls
+    vehicle = game_state['current_vehicle'] if game_state['in_vehicle'] else None
+    if vehicle is not None:
+        vehicle_dynamics.throttle[vehicle.slot] = 1 if held_keys['w'] else -1 if held_keys['s'] else 0
+        vehicle_dynamics.steer[vehicle.slot] = held_keys['d'] - held_keys['a']
+    vehicle_dynamics.step(dt)
+    moving = vehicle_dynamics.moving()
+    vehicle_dynamics.sync(moving)
+    # A moving car bumping into a parked one wakes it
+    parked_cars.wake_touching(vehicle_dynamics.x[moving], vehicle_dynamics.z[moving], 4)
+    if vehicle is not None:
+        # Camera
+        camera.parent = vehicle
+        camera.position = (0, 8, -15)
+        camera.rotation_x = 20
+
+sim_clock.register(drive_vehicles)
 
 # Create the world
 ground = Entity(
@@ -918,6 +915,7 @@ ground = Entity(
 )
 
 # Create roads
+roads = []
 for z in range(-40, 41, 20):
     road = Entity(
         model='plane',
@@ -927,6 +925,7 @@ for z in range(-40, 41, 20):
         color=color.dark_gray,
         collider='box'
     )
+    roads.append(road)
 
 for x in range(-40, 41, 20):
     road = Entity(
@@ -937,6 +936,7 @@ for x in range(-40, 41, 20):
         color=color.dark_gray,
         collider='box'
     )
+    roads.append(road)
 
 # Create player
 player = Player()
@@ -944,6 +944,20 @@ player = Player()
 # Create sample vehicle
 car = Vehicle(position=(5, 0.5, 5))
 
+# Parked cars sleep (no update, no collision) until the player comes near. Asleep
+# they also drop out of the batched dynamics and the clock's interpolation.
+def park(vehicle):
+    vehicle_dynamics.sleep(vehicle.slot)
+    sim_clock.untrack(vehicle)
+
+def unpark(vehicle):
+    vehicle_dynamics.wake(vehicle.slot)
+    sim_clock.track(vehicle)
+
+parked_cars = SleepSystem(wake_radius=15, sleep_radius=25, can_sleep=lambda v: v.driver is None,
+                          on_sleep=park, on_wake=unpark)
+parked_cars.add(car)
+
 # Setup UI
 setup_ui()
 add_sample_notifications()
@@ -954,17 +968,22 @@ camera.position = (0, 5, -15)
 camera.rotation_x = 20
 
 # Lighting
-DirectionalLight(parent=scene, rotation=(45, -45, 45), shadows=True)
+sun = DirectionalLight(parent=scene, rotation=(45, -45, 45), shadows=True)
 AmbientLight(color=color.rgba(100, 100, 100, 0.5))
 
+# Shadows only around the player: the ground and roads receive but never cast
+shadow_manager = ShadowManager(sun, radius=40)
+shadow_manager.add_receivers(ground, *roads)
+shadow_manager.add_casters([player, car])
+
 # Input handling
 def input(key):
     # Enter/Exit vehicle
     if key == 'f':
         if not game_state['in_vehicle']:
             # Try to enter nearest vehicle
-            for entity in scene.entities:
-                if hasattr(entity, 'model_type') and distance(player, entity) < 3:
+            for entity in parked_cars.active:
+                if distance(player, entity) < 3:
                     entity.driver = player
                     player.visible = False
                     game_state['in_vehicle'] = True
@@ -980,8 +999,10 @@ def input(key):
             # Exit current vehicle
             if game_state['current_vehicle']:
                 game_state['current_vehicle'].driver = None
+                vehicle_dynamics.stop(game_state['current_vehicle'].slot)
                 player.visible = True
                 player.position = game_state['current_vehicle'].position + Vec3(2, 0, 0)
+                sim_clock.snap(player)
                 game_state['in_vehicle'] = False
                 game_state['current_vehicle'] = None
                 camera.parent = player
@@ -1042,13 +1063,22 @@ def input(key):
     if key in ['1', '2', '3', '4', '5']:
         weapon_wheel.select_weapon(int(key) - 1)
 
+# Wanted level wears off at about 6% a second, one roll per fixed step so the
+# odds don't depend on the frame rate
+WANTED_DECAY_RATE = 0.06
+
+def decay_wanted(dt):
+    if game_state['wanted_level'] > 0 and stream(STREAM_WANTED).random() < WANTED_DECAY_RATE * dt:
+        game_state['wanted_level'] -= 1
+
+sim_clock.register(decay_wanted)
+
 # Update function
 def update():
+    sim_clock.tick(time.dt)
     update_ui()
-    
-    # Auto-decrease wanted level
-    if game_state['wanted_level'] > 0 and random.random() < 0.001:
-        game_state['wanted_level'] -= 1
+    shadow_manager.update(game_state['current_vehicle'].position if game_state['in_vehicle'] else player.position)
+    parked_cars.update(game_state['current_vehicle'].position if game_state['in_vehicle'] else player.position)
     
     # Update time (simple simulation)
     game_state['time'] = f'{int((time.time() % 1440)/60):02d}:{int(time.time() % 60):02d}'
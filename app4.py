@@ -1,64 +1,98 @@
 from ursina import *
 from ursina.prefabs.first_person_controller import FirstPersonController
-from random import uniform, randint, choice
+from world_streaming import ChunkManager
+from procedural_city import ProceduralCity
+from road_graph import RoadGraph
+from building_lod import BuildingLod
+from crowd import Crowd, CrowdRenderer
+from avoidance import Avoidance
+from traffic import Traffic, TrafficRenderer
+from update_scheduler import UpdateScheduler
+from sim_clock import SimClock
+from sleep_system import SleepSystem
+from pooling import ObjectPool
+from rng_streams import stream, choice, STREAM_WORLD, STREAM_CROWD, STREAM_TRAFFIC, STREAM_POLICE, STREAM_COSMETIC
+from static_collision import StaticCollision
+from visibility import entity_bounds
+import numpy as np
 
 app = Ursina()
 
+# Gameplay steps at a fixed 60 Hz, rendering interpolates in between
+sim_clock = SimClock(rate=60)
+
 # Lighting and sky for a more immersive world
 Sky()
 directional_light = DirectionalLight(rotation=(45, -45, 45), shadows=True)
 AmbientLight(color=color.rgba(100, 100, 100, 0.5))
 
-# Larger world
-world_size = 300
-ground = Entity(
-    model='plane',
-    texture='grass',
-    scale=(world_size, 1, world_size),
-    collider='box'
-)
-
 # City grid parameters
 road_spacing = 60
 road_width = 20
 
-# Create roads (horizontal and vertical)
-for i in range(-5, 6):
-    z = i * road_spacing
-    Entity(model='plane', scale=(world_size * 2, 0.1, road_width), position=(0, 0.05, z), color=color.gray66)
-    
-    x = i * road_spacing
-    Entity(model='plane', scale=(road_width, 0.1, world_size * 2), position=(x, 0.05, 0), color=color.gray66)
-
-# Generate buildings in city blocks (between roads)
-police_station_pos = None
-for ix in range(-5, 6):
-    for iz in range(-5, 6):
-        # Center of block
-        bx = ix * road_spacing + road_width / 2 + (road_spacing - road_width) / 4
-        bz = iz * road_spacing + road_width / 2 + (road_spacing - road_width) / 4
-        
-        block_w = (road_spacing - road_width) / 2
-        
-        # Normal building
-        height = uniform(8, 25)
-        building_color = color.white
-        
-        # Occasionally make a hotel (taller)
-        if randint(1, 12) == 1:
-            height = uniform(35, 60)
-            building_color = color.azure
-        
-        # Special police station
-        if ix == 2 and iz == 2:
-            height = 30
-            building_color = color.blue
-            police_station_pos = (bx, 0, bz)
-            Entity(model='cube', position=(bx, height/2, bz), scale=(block_w * 1.8, height, block_w * 1.8),
-                   texture='brick', color=building_color, collider='box')
-        else:
-            Entity(model='cube', position=(bx, height/2, bz), scale=(block_w * 1.6, height, block_w * 1.6),
-                   texture='brick', color=building_color, collider='box')
+# Chunk streaming: chunks of chunk_blocks x chunk_blocks city blocks are only
+# built near the player or the car being driven
+chunk_blocks = 2
+chunk_load_radius = 240
+
+# The city has no edge: every chunk (ground, roads, buildings, landmarks) is rolled
+# from a hash of the seed and its coordinates when it streams in
+city_seed = 1337
+city = ProceduralCity(
+    city_seed, road_spacing, road_width, chunk_blocks,
+    palette=[tuple(color.white), tuple(color.azure), tuple(color.blue)]
+)
+
+def build_city_chunk(cx, cz):
+    chunk = city.chunk(cx, cz)
+    ground_position, ground_scale = chunk['ground']
+    entities = [Entity(model='plane', texture='grass', position=ground_position, scale=ground_scale)]
+
+    # Roads (horizontal and vertical pieces crossing this chunk)
+    for position, scale in chunk['roads']:
+        entities.append(Entity(model='plane', scale=scale, position=position, color=color.gray66))
+
+    # Buildings in city blocks (between roads)
+    for block in chunk['buildings']:
+        entities.append(Entity(model='cube', position=block['position'], scale=block['scale'],
+                               texture='brick', color=Color(*block['color'])))
+    return entities
+
+# Lanes and intersections of the central roads, shared by traffic, police and pedestrians.
+# The streamed city goes on past this; queries outside it clamp to its edge.
+road_graph = RoadGraph(road_spacing, road_width, road_range=range(-5, 6))
+
+city_chunks = ChunkManager(
+    build_city_chunk,
+    chunk_size=city.chunk_size,
+    load_radius=chunk_load_radius
+)
+
+# Distant buildings drop to flat boxes, then to one billboard strip per chunk
+building_lod = BuildingLod(flat_distance=90, impostor_distance=170)
+city_chunks.add_listener(
+    on_load=lambda key, entities: building_lod.add_group(key, [e for e in entities if e.model.name == 'cube']),
+    on_unload=building_lod.remove_group
+)
+
+# Streamed ground, roads and buildings have no collider nodes; each chunk's boxes
+# go into the static collision table while it's loaded
+static_collision = StaticCollision(cell_size=road_spacing)
+
+def chunk_collision_boxes(entities):
+    boxes = []
+    for e in entities:
+        bmin, bmax = entity_bounds(e)
+        if e.model.name == 'plane':
+            # Planes are flat whatever their y scale
+            bmin, bmax = (bmin[0], e.y, bmin[2]), (bmax[0], e.y, bmax[2])
+        boxes.append((bmin, bmax, e.model.name))
+    return boxes
+
+city_chunks.add_listener(
+    on_load=lambda key, entities: static_collision.add_group(key, chunk_collision_boxes(entities)),
+    on_unload=static_collision.remove_group
+)
 
 # Vehicle base class
 class Vehicle(Entity):
@@ -70,6 +104,7 @@ class Vehicle(Entity):
             **kwargs
         )
         self.speed = 20
+        sim_clock.track(self)
 
 # Drivable vehicles (parked cars you can enter)
 drivable_vehicles = []
@@ -79,65 +114,66 @@ park_positions = [
 ]
 car_colors = [color.red, color.yellow, color.green, color.orange, color.violet]
 for pos in park_positions:
-    car = Vehicle(position=pos, color=choice(car_colors), rotation_y=randint(0, 3)*90)
+    car = Vehicle(position=pos, color=choice(stream(STREAM_COSMETIC), car_colors),
+                  rotation_y=int(stream(STREAM_WORLD).integers(0, 4))*90)
     drivable_vehicles.append(car)
 
-# Traffic cars (AI moving back and forth)
-class TrafficCar(Vehicle):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.direction = 1
+# Parked cars sleep (no update, no collision, no interpolation) until the player comes near
+parked_cars = SleepSystem(wake_radius=15, sleep_radius=25, can_sleep=lambda v: player.in_vehicle is not v,
+                          on_sleep=sim_clock.untrack, on_wake=sim_clock.track)
+for car in drivable_vehicles:
+    parked_cars.add(car)
 
-    def update(self):
-        self.z += self.speed * self.direction * time.dt
-        if abs(self.z) > world_size / 2 - 20:
-            self.direction *= -1
+# Traffic: cars follow the lanes of the road graph, keep their distance and stop
+# at red lights, all simulated as arrays and drawn instanced
+traffic = Traffic(road_graph, 200, car_size=(4, 2, 8), speed_range=(15, 25), y=1,
+                  rng=stream(STREAM_TRAFFIC))
+traffic.spawn(200, palette=[tuple(c) for c in (color.gray, color.light_gray, color.dark_gray)])
+traffic_renderer = TrafficRenderer(traffic)
 
-for i in range(6):
-    TrafficCar(position=(i*40 - 100, 1, -150), color=color.gray, rotation_y=90)
+# Pedestrians (NPCs that walk randomly): one crowd simulated as arrays and drawn instanced,
+# steering around each other, the loaded buildings and the cars
+crowd = Crowd(30, speed_range=(3, 3), timer_range=(4, 10), y=1, size=(0.8, 1.8, 0.8),
+              rng=stream(STREAM_CROWD), avoidance=Avoidance(static_collision=static_collision, top=1.9))
+crowd.spawn(30, (-140, -140, 140, 140))
+crowd_renderer = CrowdRenderer(crowd)
 
-# Pedestrians (NPCs that walk randomly)
-pedestrians = []
-class Pedestrian(Entity):
-    def __init__(self, **kwargs):
-        super().__init__(
-            model='cube',
-            scale=(0.8, 1.8, 0.8),
-            color=color.random_color(),
-            collider='box',
-            **kwargs
-        )
-        self.velocity = Vec3(uniform(-1,1), 0, uniform(-1,1)).normalized() * 3
-        self.change_timer = uniform(4, 10)
-
-    def update(self):
-        self.position += self.velocity * time.dt
-        self.change_timer -= time.dt
-        if self.change_timer <= 0:
-            self.velocity = Vec3(uniform(-1,1), 0, uniform(-1,1)).normalized() * 3
-            self.look_at(self.position + self.velocity, 'forward')
-            self.change_timer = uniform(4, 10)
-
-# Spawn pedestrians
-for _ in range(30):
-    pos = (uniform(-140, 140), 1, uniform(-140, 140))
-    pedestrians.append(Pedestrian(position=pos))
-
-# Police cars (spawn when wanted)
+# Police cars (spawn when wanted), ticked less often the further they are from the camera
+ai_scheduler = UpdateScheduler(clock=sim_clock)
+sim_clock.register(lambda dt: ai_scheduler.tick(dt, camera.world_position))
 police_cars = []
 wanted_level = 0
 
+def crowd_obstacles():
+    # Cars the pedestrians walk around: lane traffic, parked cars and police
+    cars = drivable_vehicles + police_cars
+    driving = traffic.driving
+    return (np.concatenate((traffic.x[driving], [car.x for car in cars])),
+            np.concatenate((traffic.z[driving], [car.z for car in cars])),
+            np.full(np.count_nonzero(driving) + len(cars), 3.5))
+
 class PoliceCar(Vehicle):
     def __init__(self, **kwargs):
         super().__init__(color=color.blue.tint(-0.4), **kwargs)
 
-    def update(self):
+    def fixed_update(self, dt):
         if wanted_level > 0:
             target = player.position if not player.in_vehicle else player.in_vehicle.position
             direction = target - self.position
             if direction.length() > 5:
                 self.look_at(target, 'forward')
-                self.position += self.forward * 25 * time.dt
+                self.position += self.forward * 25 * dt
+                # Ramming a parked car wakes it
+                parked_cars.wake_near(self.x, self.z, 6)
+
+# Police cars are built at load time and recycled, never created mid-chase
+def place_police_car(p_car, position, rotation_y):
+    p_car.position = position
+    p_car.rotation = (0, rotation_y, 0)
+    sim_clock.snap(p_car)
+    ai_scheduler.add(p_car, camera.world_position)
+
+police_pool = ObjectPool(PoliceCar, reset=place_police_car, retire=ai_scheduler.remove, size=4)
 
 # Player class with vehicle enter/exit
 class Player(Entity):
@@ -154,6 +190,7 @@ class Player(Entity):
         self.rotation_speed = 120
         self.in_vehicle = None
         self.nearest_vehicle = None
+        sim_clock.register(self)
 
     def input(self, key):
         if key == 'e':
@@ -172,10 +209,12 @@ class Player(Entity):
         camera.rotation_x = 15
         # Reset wanted when entering a new car (for testing)
         wanted_level = 0
+        dismiss_police()
 
     def exit_vehicle(self):
         vehicle = self.in_vehicle
         self.position = vehicle.position + vehicle.right * 4  # Exit to the right
+        sim_clock.snap(self)
         self.visible = True
         self.collider = 'box'
         camera.parent = self
@@ -183,11 +222,11 @@ class Player(Entity):
         camera.rotation_x = 20
         self.in_vehicle = None
 
-    def update(self):
+    def fixed_update(self, dt):
         # Find nearest drivable vehicle when on foot
         self.nearest_vehicle = None
         if not self.in_vehicle:
-            for v in drivable_vehicles:
+            for v in parked_cars.active:
                 if distance(self, v) < 6:
                     self.nearest_vehicle = v
                     break
@@ -195,45 +234,76 @@ class Player(Entity):
         if self.in_vehicle:
             # Drive the vehicle
             v = self.in_vehicle
-            v.rotation_y += held_keys['d'] * 100 * time.dt
-            v.rotation_y -= held_keys['a'] * 100 * time.dt
-            v.position += v.forward * (held_keys['w'] - held_keys['s']) * v.speed * time.dt
+            v.rotation_y += held_keys['d'] * 100 * dt
+            v.rotation_y -= held_keys['a'] * 100 * dt
+            v.position += v.forward * (held_keys['w'] - held_keys['s']) * v.speed * dt
+            v.x, v.z, _ = static_collision.push_out(v.x, v.z, 2.5, 0.1, 2)
+            parked_cars.wake_near(v.x, v.z, 6)
         else:
             # Normal walking
-            self.rotation_y += held_keys['d'] * self.rotation_speed * time.dt
-            self.rotation_y -= held_keys['a'] * self.rotation_speed * time.dt
+            self.rotation_y += held_keys['d'] * self.rotation_speed * dt
+            self.rotation_y -= held_keys['a'] * self.rotation_speed * dt
             direction = self.forward * (held_keys['w'] - held_keys['s'])
-            self.position += direction * self.speed * time.dt
+            self.position += direction * self.speed * dt
+            self.x, self.z, _ = static_collision.push_out(self.x, self.z, 0.5, self.y - 1, self.y + 1)
 
 # Collision check for hitting pedestrians
 def check_hits():
     global wanted_level
     if player.in_vehicle:
         car = player.in_vehicle
-        for ped in pedestrians[:]:
-            if car.intersects(ped).hit:
-                destroy(ped)
-                pedestrians.remove(ped)
-                wanted_level = 1
-                spawn_police()
+        for ped in crowd.in_box(car.x, car.z, car.rotation_y, car.scale_x / 2, car.scale_z / 2):
+            crowd.remove(ped)
+            wanted_level = 1
+            spawn_police()
 
 def spawn_police():
     global police_cars
-    if len(police_cars) < 4 and police_station_pos:
+    if len(police_cars) < 4:
+        # Cars come out of the closest police station
+        focus = player.in_vehicle.position if player.in_vehicle else player.position
+        police_station_pos = city.nearest_police_station(focus[0], focus[2])
         for _ in range(2):
-            offset = Vec3(uniform(-20,20), 1, uniform(-20,20))
-            p_car = PoliceCar(position=Vec3(police_station_pos) + offset)
+            offset_x, offset_z = stream(STREAM_POLICE).uniform(-20, 20, 2)
+            x, z, rotation_y = road_graph.snap_to_lane(police_station_pos[0] + offset_x, police_station_pos[2] + offset_z)
+            p_car = police_pool.acquire((x, 1, z), rotation_y)
             police_cars.append(p_car)
 
+def dismiss_police():
+    for p_car in police_cars:
+        police_pool.release(p_car)
+    police_cars.clear()
+
+def simulate(dt):
+    # Array actors and hit checks, on the fixed clock
+    traffic.step(dt)
+    # Lane traffic running into parked cars wakes them
+    driving = traffic.driving
+    parked_cars.wake_touching(traffic.x[driving], traffic.z[driving], 6)
+    crowd.step(dt, crowd_obstacles())
+    check_hits()
+
+sim_clock.register(simulate)
+
 # Create player and camera
 player = Player()
 camera.parent = player
 camera.position = (0, 5, -15)
 camera.rotation_x = 20
 camera.fov = 90
+city_chunks.prime(player.position)
 
-# Global update for collisions
+# Parked car sleep stats (bottom right)
+sleep_text = Text('', parent=camera.ui, scale=0.8, position=(0.45, -0.45), color=color.light_gray)
+
+# Global update for collisions and chunk streaming
 def update():
-    check_hits()
+    sim_clock.tick(time.dt)
+    parked_cars.update(player.in_vehicle.position if player.in_vehicle else player.position)
+    sleep_text.text = f"parked cars {parked_cars.stats_text()}"
+    traffic_renderer.sync()
+    crowd_renderer.sync()
+    city_chunks.update(player.in_vehicle.position if player.in_vehicle else player.position)
+    building_lod.update(camera.world_position)
 
 app.run()
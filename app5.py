@@ -1,8 +1,27 @@
 from ursina import *
-from random import uniform, randint, choice
+from road_markings import RoadMarkingLayer
+from world_streaming import ChunkManager, chunk_block_range, chunk_road_segments
+from road_graph import RoadGraph
+from visibility import GridCuller, entity_bounds
+from static_batching import MeshBuilder, box_bounds
+from materials import TextureAtlas
+from crowd import Crowd, CrowdRenderer
+from avoidance import Avoidance
+from static_collision import StaticCollision
+from traffic import Traffic, TrafficRenderer
+from update_scheduler import UpdateScheduler
+from sim_clock import SimClock
+from sleep_system import SleepSystem
+from rng_streams import stream, choice, STREAM_WORLD, STREAM_CROWD, STREAM_TRAFFIC, STREAM_POLICE, STREAM_COSMETIC
+from pooling import ObjectPool
+from procedural_city import generate_blocks, block_colors
+import numpy as np
 
 app = Ursina()
 
+# Gameplay steps at a fixed 60 Hz, rendering interpolates in between
+sim_clock = SimClock(rate=60)
+
 # Lighting and sky
 Sky()
 DirectionalLight(rotation=(45, -45, 45), shadows=True)
@@ -21,48 +40,83 @@ ground = Entity(
 road_spacing = 60
 road_width = 20
 
-# Roads (fixed valid color)
-for i in range(-5, 6):
-    z = i * road_spacing
-    Entity(model='plane', scale=(world_size * 2, 0.1, road_width), position=(0, 0.05, z), color=color.dark_gray)
-    
-    x = i * road_spacing
-    Entity(model='plane', scale=(road_width, 0.1, world_size * 2), position=(x, 0.05, 0), color=color.dark_gray)
-
-# Add simple white road markings (dashed lines)
-for i in range(-5, 6):
-    z = i * road_spacing
-    for dash in range(-20, 21, 4):
-        Entity(model='cube', scale=(4, 0.11, 1), position=(dash*10, 0.06, z), color=color.white)
-    
-    x = i * road_spacing
-    for dash in range(-20, 21, 4):
-        Entity(model='cube', scale=(1, 0.11, 4), position=(x, 0.06, dash*10), color=color.white)
-
-# Buildings and police station
-police_station_pos = None
-for ix in range(-5, 6):
-    for iz in range(-5, 6):
-        bx = ix * road_spacing + road_width / 2 + (road_spacing - road_width) / 4
-        bz = iz * road_spacing + road_width / 2 + (road_spacing - road_width) / 4
-        block_w = (road_spacing - road_width) / 2
-        
-        height = uniform(8, 25)
-        building_color = color.gray.tint(uniform(-0.2, 0.2))
-        
-        if randint(1, 12) == 1:  # Hotels
-            height = uniform(35, 60)
-            building_color = color.azure.tint(uniform(-0.1, 0.1))
-        
-        if ix == 2 and iz == 2:  # Police station
-            height = 30
-            building_color = color.blue
-            police_station_pos = (bx, 0, bz)
-            Entity(model='cube', position=(bx, height/2, bz), scale=(block_w * 1.8, height, block_w * 1.8),
-                   texture='brick', color=building_color, collider='box')
-        else:
-            Entity(model='cube', position=(bx, height/2, bz), scale=(block_w * 1.6, height, block_w * 1.6),
-                   texture='brick', color=building_color, collider='box')
+# Chunk streaming: chunks of chunk_blocks x chunk_blocks city blocks are only
+# built near the player or the car being driven
+chunk_blocks = 2
+chunk_load_radius = 240
+road_range = range(-5, 6)
+
+# Lanes and intersections of the road grid, shared by traffic, police and pedestrians
+road_graph = RoadGraph(road_spacing, road_width, road_range)
+
+# Add simple white road markings (dashed lines), instanced in one draw call
+road_markings = RoadMarkingLayer(road_spacing, road_width)
+
+# Buildings and police station (layout rolled once, entities are created per chunk).
+# The whole grid is rolled in one vectorized pass, then turned into block records.
+city_rng = stream(STREAM_WORLD)
+block_ix, block_iz = np.meshgrid(road_range, road_range, indexing='ij')
+police_block = (2, 2)
+blocks = generate_blocks(city_rng, block_ix.ravel(), block_iz.ravel(), road_spacing, road_width,
+                         hotel_odds=12, police_block=police_block)
+# Plain buildings are grey -0.2..0.2, hotels azure -0.1..0.1, the police station blue
+block_rgba = block_colors(blocks['kind'], blocks['tint'],
+                          [tuple(color.gray), tuple(color.azure), tuple(color.blue)], tint_range=(0.2, 0.1, 0))
+
+city_blocks = {}
+for i, key in enumerate(zip(block_ix.ravel().tolist(), block_iz.ravel().tolist())):
+    height, footprint = float(blocks['height'][i]), float(blocks['footprint'][i])
+    city_blocks[key] = {
+        'position': (float(blocks['x'][i]), height / 2, float(blocks['z'][i])),
+        'scale': (footprint, height, footprint),
+        'color': Color(*block_rgba[i].tolist()),
+    }
+police_station_pos = (city_blocks[police_block]['position'][0], 0, city_blocks[police_block]['position'][2])
+
+# Textures share one atlas, so a chunk's buildings (each with its own tint) are one mesh
+city_atlas = TextureAtlas()
+
+def build_city_chunk(cx, cz):
+    entities = []
+    # Roads (fixed valid color)
+    for position, scale in chunk_road_segments(cx, cz, road_spacing, road_width, chunk_blocks, road_range):
+        entities.append(Entity(model='plane', scale=scale, position=position, color=color.dark_gray))
+
+    # Buildings: texture choice goes into the UVs, tint into the vertex colors
+    builder = MeshBuilder()
+    bounds = []
+    for ix in chunk_block_range(cx, chunk_blocks):
+        for iz in chunk_block_range(cz, chunk_blocks):
+            block = city_blocks.get((ix, iz))
+            if block:
+                builder.add_box(block['position'], block['scale'], block['color'], uv_rect=city_atlas.rect('brick'))
+                bounds.append(box_bounds(block['position'], block['scale']))
+    if bounds:
+        buildings = Entity(model=builder.build(), texture=city_atlas.texture)
+        buildings.batch_bounds = bounds
+        entities.append(buildings)
+    return entities
+
+def chunk_boxes(entities):
+    # Batched buildings carry their own boxes, the mesh itself sits at the origin
+    boxes = []
+    for e in entities:
+        boxes.extend(getattr(e, 'batch_bounds', None) or [entity_bounds(e)])
+    return boxes
+
+city_chunks = ChunkManager(
+    build_city_chunk,
+    chunk_size=road_spacing * chunk_blocks,
+    load_radius=chunk_load_radius,
+    chunk_bounds=(-5 // chunk_blocks, 5 // chunk_blocks, -5 // chunk_blocks, 5 // chunk_blocks)
+)
+
+# Every loaded chunk is a culling cell (frustum + occlusion by tall buildings)
+city_culler = GridCuller()
+city_chunks.add_listener(
+    on_load=lambda key, entities: city_culler.register_cell(key, entities, chunk_boxes(entities)),
+    on_unload=city_culler.unregister_cell
+)
 
 # Vehicle base
 class Vehicle(Entity):
@@ -74,6 +128,7 @@ class Vehicle(Entity):
             **kwargs
         )
         self.speed = 30  # Increased max speed
+        sim_clock.track(self)
 
 # Drivable cars
 drivable_vehicles = []
@@ -84,65 +139,73 @@ park_positions = [
 ]
 car_colors = [color.red, color.yellow, color.green, color.orange, color.violet, color.cyan, color.lime]
 for pos in park_positions:
-    car = Vehicle(position=pos, color=choice(car_colors), rotation_y=randint(0, 3)*90)
+    car = Vehicle(position=pos, color=choice(stream(STREAM_COSMETIC), car_colors),
+                  rotation_y=int(stream(STREAM_WORLD).integers(0, 4))*90)
     drivable_vehicles.append(car)
 
-# Traffic cars
-class TrafficCar(Vehicle):
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        self.direction = 1
-
-    def update(self):
-        self.z += self.speed * self.direction * time.dt
-        if abs(self.z) > world_size / 2 - 30:
-            self.direction *= -1
-
-for i in range(10):
-    TrafficCar(position=(i*40 - 180, 1, -160), color=color.gray, rotation_y=choice([0, 90, 180, 270]))
-
-# Pedestrians
-pedestrians = []
-class Pedestrian(Entity):
-    def __init__(self, **kwargs):
-        super().__init__(
-            model='cube',
-            scale=(0.8, 1.8, 0.8),
-            color=color.random_color(),
-            collider='box',
-            **kwargs
-        )
-        self.velocity = Vec3(uniform(-2,2), 0, uniform(-2,2)).normalized() * 4
-        self.change_timer = uniform(3, 8)
-
-    def update(self):
-        self.position += self.velocity * time.dt
-        self.change_timer -= time.dt
-        if self.change_timer <= 0:
-            self.velocity = Vec3(uniform(-2,2), 0, uniform(-2,2)).normalized() * 4
-            self.look_at(self.position + self.velocity, 'forward')
-            self.change_timer = uniform(3, 8)
-
-for _ in range(50):
-    pos = (uniform(-140, 140), 1, uniform(-140, 140))
-    pedestrians.append(Pedestrian(position=pos))
-
-# Police
+# Parked cars sleep (no update, no collision, no interpolation) until the player comes near
+parked_cars = SleepSystem(wake_radius=15, sleep_radius=25, can_sleep=lambda v: player.in_vehicle is not v,
+                          on_sleep=sim_clock.untrack, on_wake=sim_clock.track)
+for car in drivable_vehicles:
+    parked_cars.add(car)
+
+# Traffic: cars follow the lanes of the road graph, keep their distance and stop
+# at red lights, all simulated as arrays and drawn instanced
+traffic = Traffic(road_graph, 300, car_size=(4, 2, 8), speed_range=(15, 25), y=1,
+                  rng=stream(STREAM_TRAFFIC))
+traffic.spawn(300, palette=[tuple(c) for c in (color.gray, color.light_gray, color.dark_gray)])
+traffic_renderer = TrafficRenderer(traffic)
+
+# The whole city's buildings as walls for the pedestrians (the blocks are known up front)
+building_walls = StaticCollision(cell_size=road_spacing)
+for block in city_blocks.values():
+    building_walls.add(*box_bounds(block['position'], block['scale']))
+
+# Pedestrians: one crowd simulated as arrays and drawn instanced,
+# steering around each other, the buildings and the cars
+crowd = Crowd(50, speed_range=(4, 4), timer_range=(3, 8), y=1, size=(0.8, 1.8, 0.8),
+              rng=stream(STREAM_CROWD), avoidance=Avoidance(static_collision=building_walls, top=1.9))
+crowd.spawn(50, (-140, -140, 140, 140))
+crowd_renderer = CrowdRenderer(crowd)
+
+# Police, ticked less often the further they are from the camera
+ai_scheduler = UpdateScheduler(clock=sim_clock)
+sim_clock.register(lambda dt: ai_scheduler.tick(dt, camera.world_position))
 police_cars = []
 wanted_level = 0
 
+def crowd_obstacles():
+    # Cars the pedestrians walk around: lane traffic, parked cars and police
+    cars = drivable_vehicles + police_cars
+    driving = traffic.driving
+    return (np.concatenate((traffic.x[driving], [car.x for car in cars])),
+            np.concatenate((traffic.z[driving], [car.z for car in cars])),
+            np.full(np.count_nonzero(driving) + len(cars), 3.5))
+
 class PoliceCar(Vehicle):
     def __init__(self, **kwargs):
         super().__init__(color=color.blue.tint(-0.3), **kwargs)
 
-    def update(self):
+    def fixed_update(self, dt):
         if wanted_level > 0 and player:
             target = player.position if not player.in_vehicle else player.in_vehicle.position
             direction = (target - self.position)
             dist = direction.length()
             if dist > 8:
                 self.look_at(target, 'forward')
-                self.position += self.forward * 40 * time.dt
+                self.position += self.forward * 40 * dt
+                # Ramming a parked car wakes it
+                parked_cars.wake_near(self.x, self.z, 6)
+
+# Police cars are built at load time and recycled, never created mid-chase
+def place_police_car(p_car, position, rotation_y):
+    p_car.position = position
+    p_car.rotation = (0, rotation_y, 0)
+    sim_clock.snap(p_car)
+    ai_scheduler.add(p_car, camera.world_position)
+
+# Enough for five stars
+police_pool = ObjectPool(PoliceCar, reset=place_police_car, retire=ai_scheduler.remove, size=15)
 
 # Player
 class Player(Entity):
@@ -160,6 +223,7 @@ class Player(Entity):
         self.rotation_speed = 120
         self.in_vehicle = None
         self.nearest_vehicle = None
+        sim_clock.register(self)
 
     def input(self, key):
         if key == 'e':
@@ -180,16 +244,17 @@ class Player(Entity):
             return
         vehicle = self.in_vehicle
         self.position = vehicle.position + vehicle.right * 5
+        sim_clock.snap(self)
         self.enable()
         camera.parent = self
         camera.position = (0, 5, -15)
         camera.rotation_x = 20
         self.in_vehicle = None
 
-    def update(self):
+    def fixed_update(self, dt):
         self.nearest_vehicle = None
         if not self.in_vehicle:
-            for v in drivable_vehicles:
+            for v in parked_cars.active:
                 if distance(self, v) < 7:
                     self.nearest_vehicle = v
                     break
@@ -197,34 +262,45 @@ class Player(Entity):
         if self.in_vehicle:
             v = self.in_vehicle
             turn = held_keys['d'] - held_keys['a']
-            v.rotation_y += turn * 120 * time.dt
+            v.rotation_y += turn * 120 * dt
             accel = held_keys['w'] - held_keys['s']
-            v.position += v.forward * accel * v.speed * time.dt
+            v.position += v.forward * accel * v.speed * dt
+            parked_cars.wake_near(v.x, v.z, 6)
         else:
             turn = held_keys['d'] - held_keys['a']
-            self.rotation_y += turn * self.rotation_speed * time.dt
+            self.rotation_y += turn * self.rotation_speed * dt
             move = held_keys['w'] - held_keys['s']
-            self.position += self.forward * move * self.speed * time.dt
+            self.position += self.forward * move * self.speed * dt
 
 # Hit detection
 def check_hits():
     global wanted_level
     if player.in_vehicle:
         car = player.in_vehicle
-        for ped in pedestrians[:]:
-            if car.intersects(ped).hit:
-                destroy(ped)
-                pedestrians.remove(ped)
-                wanted_level = min(wanted_level + 1, 5)
-                spawn_police()
+        for ped in crowd.in_box(car.x, car.z, car.rotation_y, car.scale_x / 2, car.scale_z / 2):
+            crowd.remove(ped)
+            wanted_level = min(wanted_level + 1, 5)
+            spawn_police()
 
 def spawn_police():
     if police_station_pos and wanted_level > 0 and len(police_cars) < wanted_level * 3:
         for _ in range(min(3, wanted_level * 3 - len(police_cars))):
-            offset = Vec3(uniform(-40,40), 1, uniform(-40,40))
-            p_car = PoliceCar(position=Vec3(police_station_pos) + offset)
+            offset_x, offset_z = stream(STREAM_POLICE).uniform(-40, 40, 2)
+            x, z, rotation_y = road_graph.snap_to_lane(police_station_pos[0] + offset_x, police_station_pos[2] + offset_z)
+            p_car = police_pool.acquire((x, 1, z), rotation_y)
             police_cars.append(p_car)
 
+def simulate(dt):
+    # Array actors and hit checks, on the fixed clock
+    traffic.step(dt)
+    # Lane traffic running into parked cars wakes them
+    driving = traffic.driving
+    parked_cars.wake_touching(traffic.x[driving], traffic.z[driving], 6)
+    crowd.step(dt, crowd_obstacles())
+    check_hits()
+
+sim_clock.register(simulate)
+
 # === GOOD UI ADDITIONS ===
 # Health bar (bottom left)
 health_bar_bg = Entity(parent=camera.ui, model='quad', color=color.black, scale=(0.3, 0.04), position=(-0.7, -0.4), alpha=0.7)
@@ -237,6 +313,9 @@ wanted_stars = Text('', parent=camera.ui, scale=4, position=(0.65, 0.45), color=
 # Speedometer (bottom center - visible only in vehicle)
 speed_text = Text('', parent=camera.ui, scale=2, position=(0, -0.4), color=color.white)
 
+# Culling stats (bottom right)
+culling_text = Text('', parent=camera.ui, scale=0.8, position=(0.45, -0.45), color=color.light_gray)
+
 # Crosshair (center)
 crosshair = Text('+', parent=camera.ui, scale=1.5, origin=(0,0), color=color.white.tint(0.5))
 
@@ -257,10 +336,18 @@ camera.parent = player
 camera.position = (0, 5, -15)
 camera.rotation_x = 20
 camera.fov = 90
+city_chunks.prime(player.position)
 
 # Global update
 def update():
-    check_hits()
+    sim_clock.tick(time.dt)
+    parked_cars.update(player.in_vehicle.position if player.in_vehicle else player.position)
+    traffic_renderer.sync()
+    crowd_renderer.sync()
+    city_chunks.update(player.in_vehicle.position if player.in_vehicle else player.position)
+    culling = city_culler.update_from_camera(camera)
+    culling_text.text = (f"chunks drawn {culling['drawn']} | culled {culling['frustum_culled']} | occluded {culling['occluded']}\n"
+                         f"AI {ai_scheduler.stats_text()} | parked cars {parked_cars.stats_text()}")
     
     # Update health bar (currently static, can add damage later)
     health_bar_fill.scale_x = player.health / 100
@@ -1,6 +1,10 @@
 from ursina import *
 from ursina.shaders import lit_with_shadows_shader
-import random
+from shadow_budget import ShadowManager
+from pooling import ObjectPool
+from sim_clock import SimClock
+from vehicle_dynamics import VehicleDynamics, DRAG_DAMP
+from rng_streams import stream, STREAM_WORLD, STREAM_WANTED
 import math
 
 # Initialize the game
@@ -9,6 +13,9 @@ window.title = 'GTA: Python City'
 window.borderless = False
 window.fullscreen = False
 
+# Gameplay steps at a fixed 60 Hz, rendering interpolates in between
+sim_clock = SimClock(rate=60)
+
 # Custom UI Colors
 UI_COLORS = {
     'primary': color.rgb(41, 128, 185),      # Blue
@@ -228,7 +235,33 @@ class NotificationSystem:
     def __init__(self):
         self.notifications = []
         self.max_notifications = 3
-        
+        # Widgets for the visible notifications plus the one being pushed out, recycled
+        self.widget_pool = ObjectPool(self.create_widget, reset=self.show_widget, size=self.max_notifications + 1)
+
+    def create_widget(self):
+        bg = Entity(
+            parent=camera.ui,
+            model='quad',
+            color=UI_COLORS['dark_transparent'],
+            scale=(0.3, 0.07),
+            origin=(0, 0)
+        )
+        bg.icon_text = Text(parent=bg, text='', position=(-0.45, 0), scale=1.5)
+        bg.title_text = Text(parent=bg, text='', position=(-0.35, 0.02), scale=1.2)
+        bg.message_text = Text(parent=bg, text='', position=(-0.35, -0.02), scale=0.9, color=color.gray)
+        return bg
+
+    def show_widget(self, bg, title, message, icon, notif_color, y_position):
+        # A recycled widget may still be sliding from its last life
+        for animation in bg.animations:
+            animation.kill()
+        bg.position = (0, y_position)
+        bg.icon_text.text = icon
+        bg.icon_text.color = notif_color
+        bg.title_text.text = title
+        bg.title_text.color = notif_color
+        bg.message_text.text = message
+
     def add_notification(self, title, message, icon='ℹ️', notif_color=color.white):
         notification = {
             'title': title,
@@ -242,49 +275,15 @@ class NotificationSystem:
         
         self.notifications.append(notification)
         
-        # Create UI elements for notification
-        bg = Entity(
-            parent=camera.ui,
-            model='quad',
-            color=UI_COLORS['dark_transparent'],
-            scale=(0.3, 0.07),
-            position=(0, notification['y_position']),
-            origin=(0, 0)
-        )
-        
-        icon_text = Text(
-            parent=bg,
-            text=icon,
-            position=(-0.45, 0),
-            scale=1.5,
-            color=notif_color
-        )
-        
-        title_text = Text(
-            parent=bg,
-            text=title,
-            position=(-0.35, 0.02),
-            scale=1.2,
-            color=notif_color
-        )
-        
-        message_text = Text(
-            parent=bg,
-            text=message,
-            position=(-0.35, -0.02),
-            scale=0.9,
-            color=color.gray
-        )
-        
-        notification['ui_elements'] = [bg, icon_text, title_text, message_text]
+        # Show it on a pooled widget
+        notification['widget'] = self.widget_pool.acquire(title, message, icon, notif_color, notification['y_position'])
         
         # Limit number of notifications
         if len(self.notifications) > self.max_notifications:
             self.remove_notification(self.notifications[0])
             
     def remove_notification(self, notification):
-        for element in notification['ui_elements']:
-            destroy(element)
+        self.widget_pool.release(notification['widget'])
         self.notifications.remove(notification)
         self.reposition_notifications()
         
@@ -292,9 +291,7 @@ class NotificationSystem:
         for i, notification in enumerate(self.notifications):
             new_y = 0.35 - i * 0.08
             notification['y_position'] = new_y
-            for element in notification['ui_elements']:
-                if isinstance(element, Entity):
-                    element.animate_y(new_y, duration=0.2)
+            notification['widget'].animate_y(new_y, duration=0.2)
                     
     def update(self):
         for notification in self.notifications[:]:
@@ -515,6 +512,7 @@ ground = Entity(
 )
 
 # Create roads
+roads = []
 for z in range(-40, 41, 20):
     road = Entity(
         model='plane',
@@ -524,6 +522,7 @@ for z in range(-40, 41, 20):
         color=color.dark_gray,
         collider='box'
     )
+    roads.append(road)
 
 for x in range(-40, 41, 20):
     road = Entity(
@@ -534,8 +533,10 @@ for x in range(-40, 41, 20):
         color=color.dark_gray,
         collider='box'
     )
+    roads.append(road)
 
 # Create buildings
+buildings = []
 for x in range(-30, 31, 15):
     for z in range(-30, 31, 15):
         if abs(x) > 10 or abs(z) > 10:
@@ -543,10 +544,11 @@ for x in range(-30, 31, 15):
                 model='cube',
                 texture='brick',
                 position=(x, 2, z),
-                scale=(4, random.uniform(3, 8), 4),
+                scale=(4, stream(STREAM_WORLD).uniform(3, 8), 4),
                 collider='box',
                 shader=lit_with_shadows_shader
             )
+            buildings.append(building)
 
 class Player(Entity):
     def __init__(self, **kwargs):
@@ -565,26 +567,27 @@ class Player(Entity):
         self.gravity = 1
         self.velocity_y = 0
         self.on_ground = True
+        sim_clock.register(self)
 
-    def update(self):
+    def fixed_update(self, dt):
         # Movement controls
-        self.rotation_y += held_keys['d'] * self.rotation_speed * time.dt
-        self.rotation_y -= held_keys['a'] * self.rotation_speed * time.dt
+        self.rotation_y += held_keys['d'] * self.rotation_speed * dt
+        self.rotation_y -= held_keys['a'] * self.rotation_speed * dt
         
         forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
         right = Vec3(self.right.x, 0, self.right.z).normalized()
         
         # Forward/backward movement
         if held_keys['w']:
-            self.position += forward * self.speed * time.dt
+            self.position += forward * self.speed * dt
         if held_keys['s']:
-            self.position -= forward * self.speed * time.dt
+            self.position -= forward * self.speed * dt
         
         # Strafe movement
         if held_keys['q']:
-            self.position -= right * self.speed * time.dt
+            self.position -= right * self.speed * dt
         if held_keys['e']:
-            self.position += right * self.speed * time.dt
+            self.position += right * self.speed * dt
         
         # Jump
         if held_keys['space'] and self.on_ground:
@@ -593,8 +596,8 @@ class Player(Entity):
         
         # Apply gravity
         if not self.on_ground:
-            self.velocity_y -= self.gravity * time.dt
-            self.y += self.velocity_y * time.dt
+            self.velocity_y -= self.gravity * dt
+            self.y += self.velocity_y * dt
             
             # Ground collision
             if self.y <= 0.9:
@@ -614,40 +617,35 @@ class Vehicle(Entity):
             **kwargs
         )
         self.model_type = model_type
-        self.speed = 0
-        self.max_speed = 15
-        self.acceleration = 8
-        self.brake_power = 12
-        self.turn_speed = 60
         self.driver = None
-
-    def update(self):
-        if self.driver is not None:
-            # Player is driving
-            # Acceleration
-            if held_keys['w']:
-                self.speed += self.acceleration * time.dt
-            elif held_keys['s']:
-                self.speed -= self.brake_power * time.dt
-            else:
-                self.speed *= 0.95
-            
-            self.speed = max(-self.max_speed/2, min(self.speed, self.max_speed))
-            
-            # Steering
-            if held_keys['d']:
-                self.rotation_y += self.turn_speed * time.dt * (self.speed/self.max_speed)
-            if held_keys['a']:
-                self.rotation_y -= self.turn_speed * time.dt * (self.speed/self.max_speed)
-            
-            # Movement
-            forward = Vec3(self.forward.x, 0, self.forward.z).normalized()
-            self.position += forward * self.speed * time.dt
-            
-            # Camera
-            camera.parent = self
-            camera.position = (0, 8, -15)
-            camera.rotation_x = 20
+        # Speed, heading and handling live in the batched dynamics (drive_vehicles)
+        self.slot = vehicle_dynamics.add(self.x, self.z, self.rotation_y, max_speed=15, acceleration=8,
+                                         brake_power=12, turn_speed=60, drag=DRAG_DAMP)
+        vehicle_dynamics.bind(self.slot, self)
+        sim_clock.track(self)
+
+    @property
+    def speed(self):
+        return vehicle_dynamics.speed[self.slot].item()
+
+# All cars are integrated together in one batched step
+vehicle_dynamics = VehicleDynamics()
+
+def drive_vehicles(dt):
+    # The player's keys go in as the driven car's controls
+    vehicle = game_state['current_vehicle'] if game_state['in_vehicle'] else None
+    if vehicle is not None:
+        vehicle_dynamics.throttle[vehicle.slot] = 1 if held_keys['w'] else -1 if held_keys['s'] else 0
+        vehicle_dynamics.steer[vehicle.slot] = held_keys['d'] - held_keys['a']
+    vehicle_dynamics.step(dt)
+    vehicle_dynamics.sync()
+    if vehicle is not None:
+        # Camera
+        camera.parent = vehicle
+        camera.position = (0, 8, -15)
+        camera.rotation_x = 20
+
+sim_clock.register(drive_vehicles)
 
 # Create player
 player = Player()
@@ -665,9 +663,15 @@ camera.position = (0, 5, -15)
 camera.rotation_x = 20
 
 # Lighting
-DirectionalLight(parent=scene, rotation=(45, -45, 45), shadows=True)
+sun = DirectionalLight(parent=scene, rotation=(45, -45, 45), shadows=True)
 AmbientLight(color=color.rgba(100, 100, 100, 0.5))
 
+# Shadows only around the player: the ground and roads receive but never cast
+shadow_manager = ShadowManager(sun, radius=40)
+shadow_manager.add_receivers(ground, *roads)
+shadow_manager.add_casters(buildings)
+shadow_manager.add_casters([player, car])
+
 # Input handling
 def input(key):
     # Enter/Exit vehicle
@@ -691,8 +695,10 @@ def input(key):
             # Exit current vehicle
             if game_state['current_vehicle']:
                 game_state['current_vehicle'].driver = None
+                vehicle_dynamics.stop(game_state['current_vehicle'].slot)
                 player.visible = True
                 player.position = game_state['current_vehicle'].position + Vec3(2, 0, 0)
+                sim_clock.snap(player)
                 game_state['in_vehicle'] = False
                 game_state['current_vehicle'] = None
                 camera.parent = player
@@ -759,13 +765,21 @@ def input(key):
         game_state['ammo'] = 8
         game_state['max_ammo'] = 24
 
+# Wanted level wears off at about 6% a second, one roll per fixed step so the
+# odds don't depend on the frame rate
+WANTED_DECAY_RATE = 0.06
+
+def decay_wanted(dt):
+    if game_state['wanted_level'] > 0 and stream(STREAM_WANTED).random() < WANTED_DECAY_RATE * dt:
+        game_state['wanted_level'] -= 1
+
+sim_clock.register(decay_wanted)
+
 # Update function
 def update():
+    sim_clock.tick(time.dt)
     update_ui()
-    
-    # Auto-decrease wanted level
-    if game_state['wanted_level'] > 0 and random.random() < 0.001:
-        game_state['wanted_level'] -= 1
+    shadow_manager.update(game_state['current_vehicle'].position if game_state['in_vehicle'] else player.position)
     
     # Update time (simple simulation)
     total_seconds = int(time.time() * 10) % 86400  # Speed up time (10x)
@@ -0,0 +1,201 @@
+import itertools
+import numpy as np
+
+# Local avoidance for pedestrians and NPCs
+# Agents only look at neighbours in the 3x3 grid cells around their own (cell size
+# = the avoidance radius), and at most max_neighbors of them, own cell first, so one
+# step costs O(agents * max_neighbors) however dense the crowd gets. On top of
+# separation from each other they steer away from buildings (boxes in a
+# StaticCollision table) and from moving obstacles such as cars (circles, looked
+# up the same way).
+# The result is a steering velocity per agent, added to whatever the agent walks
+# with; agents keep their own heading and speed.
+
+NEIGHBOR_CELLS = ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, -1), (-1, 1), (1, 1))
+CELL_OFFSET = 1 << 20   # cell keys pack (x cell, z cell) into one int, for cells within +-2^20
+CELL_STRIDE = 1 << 21
+
+
+class Avoidance:
+    def __init__(self, radius=1.2, max_neighbors=6, separation=8.0, static_collision=None, wall_distance=1.0,
+                 wall_push=5.0, bottom=0.1, top=1.8, max_push=8.0):
+        # radius: agents closer than this push apart, harder the closer they are (separation at contact)
+        # static_collision: boxes spanning bottom..top in y are walls; agents within
+        # wall_distance get pushed out (wall_push at the wall, inside a box the shortest way out)
+        # max_push: cap on the summed steering speed
+        self.radius = radius
+        self.max_neighbors = max_neighbors
+        self.separation = separation
+        self.static_collision = static_collision
+        self.wall_distance = wall_distance
+        self.wall_push = wall_push
+        self.bottom = bottom
+        self.top = top
+        self.max_push = max_push
+        # Last step, for stats
+        self.pairs = 0
+        self.walls = 0
+
+    def cell_keys(self, x, z, cell_size):
+        cx = np.floor(x / cell_size).astype(np.int64)
+        cz = np.floor(z / cell_size).astype(np.int64)
+        return (cx + CELL_OFFSET) * CELL_STRIDE + cz + CELL_OFFSET
+
+    def cell_of(self, key):
+        cx, cz = divmod(int(key), CELL_STRIDE)
+        return cx - CELL_OFFSET, cz - CELL_OFFSET
+
+    def neighbors(self, x, z, cell_size, others_x=None, others_z=None):
+        # (agent, other) index pairs, at most max_neighbors per agent, from the cells
+        # around each agent. Others are the agents themselves unless given.
+        n = len(x)
+        same = others_x is None
+        keys = self.cell_keys(x, z, cell_size)
+        other_keys = keys if same else self.cell_keys(others_x, others_z, cell_size)
+        order = np.argsort(other_keys, kind='stable')
+        sorted_keys = other_keys[order]
+        # Occupied cells, and where their members start in the sorted order
+        cells, firsts, sizes = np.unique(sorted_keys, return_index=True, return_counts=True)
+        # Lookups go cell by cell in key order (sorted queries are much faster to search)
+        query_cells, agent_cell = np.unique(keys, return_inverse=True)
+        starts = np.empty((len(query_cells), len(NEIGHBOR_CELLS)), dtype=np.int64)
+        counts = np.zeros_like(starts)
+        for i, (dx, dz) in enumerate(NEIGHBOR_CELLS):
+            target = query_cells + dx * CELL_STRIDE + dz
+            found = np.minimum(np.searchsorted(cells, target), len(cells) - 1)
+            hit = cells[found] == target
+            starts[:, i] = firsts[found]
+            counts[:, i] = np.where(hit, sizes[found], 0)
+        starts, counts = starts[agent_cell], counts[agent_cell]
+        ends = np.cumsum(counts, axis=1)
+        totals = ends[:, -1]
+
+        # The k-th candidate of every agent at once. Agents find themselves in their own
+        # cell, which doesn't count towards max_neighbors.
+        agents, others = [], []
+        taken = np.zeros(n, dtype=np.int64)
+        for k in range(self.max_neighbors + same):
+            has = np.flatnonzero(totals > k)
+            if not len(has):
+                break
+            cell = np.count_nonzero(ends[has] <= k, axis=1)
+            other = order[starts[has, cell] + k - (ends[has, cell] - counts[has, cell])]
+            keep = taken[has] < self.max_neighbors
+            if same:
+                keep &= other != has
+            taken[has[keep]] += 1
+            agents.append(has[keep])
+            others.append(other[keep])
+        if not agents:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(agents), np.concatenate(others)
+
+    def separate(self, x, z, vx, vz):
+        agents, others = self.neighbors(x, z, self.radius)
+        dx, dz = x[agents] - x[others], z[agents] - z[others]
+        distance = np.hypot(dx, dz)
+        close = distance < self.radius
+        agents, others, dx, dz, distance = agents[close], others[close], dx[close], dz[close], distance[close]
+        # Agents on the same spot split along x, the lower index to the left
+        same = distance < 1e-6
+        dx = np.where(same, np.where(agents < others, -1.0, 1.0), dx)
+        distance = np.where(same, 1.0, distance)
+        push = self.separation * (1 - distance / self.radius) / distance
+        vx += np.bincount(agents, weights=dx * push, minlength=len(x))
+        vz += np.bincount(agents, weights=dz * push, minlength=len(x))
+        self.pairs = len(agents)
+
+    def avoid_walls(self, x, z, vx, vz):
+        # Agents are bucketed by the table's grid cells (including the cells their
+        # wall_distance reaches into), paired with the boxes listed there, and every
+        # (agent, box) pair pushes at once
+        collision = self.static_collision
+        reach = self.wall_distance
+        n = len(x)
+        size = collision.cell_size
+        cx0, cx1 = np.floor((x - reach) / size).astype(np.int64), np.floor((x + reach) / size).astype(np.int64)
+        cz0, cz1 = np.floor((z - reach) / size).astype(np.int64), np.floor((z + reach) / size).astype(np.int64)
+        # Most agents are well inside one cell, the rest near an edge or corner reach into 2 or 4
+        agents, keys = [], []
+        for cx, cz, extra in ((cx0, cz0, None), (cx1, cz0, cx1 != cx0), (cx0, cz1, cz1 != cz0),
+                              (cx1, cz1, (cx1 != cx0) & (cz1 != cz0))):
+            index = np.arange(n) if extra is None else np.flatnonzero(extra)
+            agents.append(index)
+            keys.append((cx[index] + CELL_OFFSET) * CELL_STRIDE + cz[index] + CELL_OFFSET)
+        agents, keys = np.concatenate(agents), np.concatenate(keys)
+        cell_keys, cell_index = np.unique(keys, return_inverse=True)
+        cell_boxes = [collision.cells.get(self.cell_of(key), ()) for key in cell_keys.tolist()]
+        box_counts = np.array([len(boxes) for boxes in cell_boxes], dtype=np.int64)
+        if not box_counts.any():
+            self.walls = 0
+            return
+        flat_boxes = np.fromiter(itertools.chain.from_iterable(cell_boxes), dtype=np.int64, count=box_counts.sum())
+        box_starts = np.cumsum(box_counts) - box_counts
+        per_agent = box_counts[cell_index]
+        agents = np.repeat(agents, per_agent)
+        ragged = np.arange(len(agents)) - np.repeat(np.cumsum(per_agent) - per_agent, per_agent)
+        boxes = flat_boxes[np.repeat(box_starts[cell_index], per_agent) + ragged]
+        # A box listed in several of an agent's cells pushes once
+        spanning = ((cx1 != cx0) | (cz1 != cz0))[agents]
+        if spanning.any():
+            total = len(collision.alive)
+            pairs = np.unique(agents[spanning] * total + boxes[spanning])
+            agents = np.concatenate((agents[~spanning], pairs // total))
+            boxes = np.concatenate((boxes[~spanning], pairs % total))
+
+        def bound(values):
+            return np.frombuffer(values, dtype=np.float32)[boxes]
+        walls = (bound(collision.max_y) > self.bottom) & (bound(collision.min_y) < self.top)
+        agents, boxes = agents[walls], boxes[walls]
+        self.walls = len(agents)
+        min_x, max_x = bound(collision.min_x), bound(collision.max_x)
+        min_z, max_z = bound(collision.min_z), bound(collision.max_z)
+        px, pz = x[agents], z[agents]
+        dx = px - np.clip(px, min_x, max_x)
+        dz = pz - np.clip(pz, min_z, max_z)
+        distance = np.hypot(dx, dz)
+        outside = distance > 0
+        # Inside the box: out through the nearest side
+        exits = np.stack((px - min_x, max_x - px, pz - min_z, max_z - pz))
+        side = np.argmin(exits, axis=0)
+        inside_x = np.where(side == 0, -1.0, np.where(side == 1, 1.0, 0.0))
+        inside_z = np.where(side == 2, -1.0, np.where(side == 3, 1.0, 0.0))
+        safe = np.where(outside, distance, 1.0)
+        strength = np.where(outside, self.wall_push * np.maximum(1 - distance / reach, 0), self.wall_push)
+        vx += np.bincount(agents, weights=np.where(outside, dx / safe, inside_x) * strength, minlength=n)
+        vz += np.bincount(agents, weights=np.where(outside, dz / safe, inside_z) * strength, minlength=n)
+
+    def avoid_obstacles(self, x, z, vx, vz, obstacles):
+        # obstacles: (x, z, radius) arrays, found through the same capped grid lookup as neighbours
+        ox, oz, radius = (np.asarray(values, dtype=np.float64) for values in obstacles)
+        if not len(ox):
+            return
+        agents, others = self.neighbors(x, z, radius.max() + self.wall_distance, ox, oz)
+        dx, dz = x[agents] - ox[others], z[agents] - oz[others]
+        distance = np.maximum(np.hypot(dx, dz), 1e-6)
+        reach = radius[others] + self.wall_distance
+        # wall_push at the edge of the circle, up to twice that deeper in
+        strength = self.wall_push * np.clip((reach - distance) / self.wall_distance, 0, 2) / distance
+        vx += np.bincount(agents, weights=dx * strength, minlength=len(x))
+        vz += np.bincount(agents, weights=dz * strength, minlength=len(x))
+
+    def steer(self, x, z, active=None, obstacles=None):
+        # Steering velocity (vx, vz) for every agent, zero where not active
+        steer_x = np.zeros(len(x), dtype=np.float32)
+        steer_z = np.zeros(len(x), dtype=np.float32)
+        idx = np.flatnonzero(active) if active is not None else np.arange(len(x))
+        self.pairs = self.walls = 0
+        if not len(idx):
+            return steer_x, steer_z
+        px, pz = x[idx].astype(np.float64), z[idx].astype(np.float64)
+        vx, vz = np.zeros(len(idx)), np.zeros(len(idx))
+        self.separate(px, pz, vx, vz)
+        if self.static_collision is not None:
+            self.avoid_walls(px, pz, vx, vz)
+        if obstacles is not None:
+            self.avoid_obstacles(px, pz, vx, vz, obstacles)
+        speed = np.hypot(vx, vz)
+        scale = np.where(speed > self.max_push, self.max_push / np.maximum(speed, 1e-9), 1)
+        steer_x[idx] = vx * scale
+        steer_z[idx] = vz * scale
+        return steer_x, steer_z
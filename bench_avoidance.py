@@ -0,0 +1,38 @@
+from avoidance import Avoidance
+from crowd import Crowd
+from static_collision import StaticCollision
+import numpy as np
+import sys
+import time
+
+# Pedestrian avoidance benchmark: crowd step cost with and without avoidance for
+# growing crowds at the same density, in a grid of buildings (no rendering).
+# Usage: python bench_avoidance.py [steps]
+
+steps = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+block, street = 16, 8   # building footprint and street width
+print(f'{steps} steps at 60 Hz, one walker per 25 m2, {block} m blocks with {street} m streets')
+
+for count in (100, 1000, 10000):
+    half = np.sqrt(count * 25) / 2
+    static_collision = StaticCollision(cell_size=block + street)
+    corners = np.arange(-half, half, block + street)
+    for x in corners:
+        for z in corners:
+            static_collision.add((x + street, 0, z + street), (x + street + block, 12, z + street + block))
+
+    results = {}
+    for name, avoidance in (('walk', None), ('avoid', Avoidance(static_collision=static_collision))):
+        crowd = Crowd(count, speed_range=(2, 4), bounds=half, rng=np.random.default_rng(1), avoidance=avoidance)
+        crowd.spawn(count, (-half, -half, half, half))
+        start = time.perf_counter()
+        for _ in range(steps):
+            crowd.step(1 / 60)
+        step_time = (time.perf_counter() - start) / steps
+        inside = sum(static_collision.query_point(x, 1, z) >= 0 for x, z in zip(crowd.x.tolist(), crowd.z.tolist()))
+        results[name] = (step_time, inside / count, avoidance.pairs / count if avoidance else 0)
+
+    walk, avoid = results['walk'], results['avoid']
+    print(f'{count:>6} walkers   walk {walk[0] * 1000:7.3f} ms   avoid {avoid[0] * 1000:7.3f} ms '
+          f'({avoid[0] / count * 1e6:5.2f} us/walker, {avoid[2]:4.2f} pushes/walker)   '
+          f'in buildings {walk[1] * 100:5.1f}% -> {avoid[1] * 100:5.1f}%')
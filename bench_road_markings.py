@@ -0,0 +1,53 @@
+from ursina import *
+from road_markings import RoadMarkingLayer, dash_transforms
+import sys
+import time as pytime
+
+# Road marking benchmark: per-dash Entities (the old app5.py loop) against the
+# instanced RoadMarkingLayer. Reports build time and average frame time.
+# Usage: python bench_road_markings.py [frames]
+
+frames = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+road_spacing = 60
+road_width = 20
+
+app = Ursina(vsync=False, development_mode=False)
+camera.position = (0, 250, -250)
+camera.look_at(Vec3(0, 0, 0))
+
+
+def build_entities():
+    dashes = []
+    positions, scales = dash_transforms(road_spacing, road_width)
+    for position, scale in zip(positions, scales):
+        dashes.append(Entity(model='cube', scale=scale, position=position, color=color.white))
+    return dashes
+
+
+def build_instanced():
+    return [RoadMarkingLayer(road_spacing, road_width)]
+
+
+def measure(name, build):
+    start = pytime.perf_counter()
+    created = build()
+    app.step()  # first frame uploads the geometry
+    startup = pytime.perf_counter() - start
+
+    for _ in range(10):
+        app.step()
+    start = pytime.perf_counter()
+    for _ in range(frames):
+        app.step()
+    frame_time = (pytime.perf_counter() - start) / frames
+
+    for entity in created:
+        destroy(entity)
+    app.step()
+    print(f'{name:<12} startup {startup * 1000:8.2f} ms   frame {frame_time * 1000:6.3f} ms')
+
+
+dash_count = len(dash_transforms(road_spacing, road_width)[0])
+print(f'{dash_count} dashes, {frames} frames')
+measure('entities', build_entities)
+measure('instanced', build_instanced)
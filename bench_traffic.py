@@ -0,0 +1,22 @@
+from road_graph import RoadGraph
+from traffic import Traffic
+import numpy as np
+import sys
+import time
+
+# Lane traffic benchmark: simulation cost per step for growing numbers of cars on
+# a large grid (no rendering). Usage: python bench_traffic.py [steps]
+
+steps = int(sys.argv[1]) if len(sys.argv) > 1 else 600
+graph = RoadGraph(road_spacing=60, road_width=20, road_range=range(-12, 13))
+
+print(f'{graph.edge_count} lanes, {steps} steps at 60 Hz')
+for count in (100, 500, 2000, 5000):
+    traffic = Traffic(graph, count, car_size=(4, 2, 8), speed_range=(15, 25), rng=np.random.default_rng(1))
+    spawned = len(traffic.spawn(count))
+    start = time.perf_counter()
+    for _ in range(steps):
+        traffic.step(1 / 60)
+    step_time = (time.perf_counter() - start) / steps
+    moving = np.count_nonzero(traffic.speed[traffic.driving] > 1) / max(spawned, 1)
+    print(f'{spawned:>6} cars   step {step_time * 1000:6.3f} ms   moving {moving * 100:5.1f}%')
@@ -0,0 +1,148 @@
+from ursina import *
+from ursina.shaders import unlit_shader
+import math
+
+# Distance based level of detail for buildings
+#   LOD_FULL      original shader, texture and shadow casting
+#   LOD_FLAT      unlit, untextured, no shadow casting
+#   LOD_IMPOSTOR  the whole group (a block or chunk) is one billboard strip
+# Each switch has a hysteresis band so buildings on a threshold don't pop every frame.
+
+LOD_FULL = 0
+LOD_FLAT = 1
+LOD_IMPOSTOR = 2
+
+
+def impostor_strip(center, boxes, shade=0.85):
+    # One vertical quad per building, laid side by side around the group centre
+    vertices, triangles, colors = [], [], []
+    for i, (bmin, bmax, box_color) in enumerate(boxes):
+        mid_x = (bmin[0] + bmax[0]) / 2 - center[0]
+        half_w = max(bmax[0] - bmin[0], bmax[2] - bmin[2]) / 2
+        # Nudge each quad a little so overlapping ones don't z-fight
+        depth = ((bmin[2] + bmax[2]) / 2 - center[2]) * 0.01 + i * 0.001
+        start = len(vertices)
+        vertices.extend((
+            Vec3(mid_x - half_w, bmin[1], depth), Vec3(mid_x + half_w, bmin[1], depth),
+            Vec3(mid_x + half_w, bmax[1], depth), Vec3(mid_x - half_w, bmax[1], depth),
+        ))
+        triangles.append((start, start + 1, start + 2, start + 3))
+        tint = Color(box_color[0] * shade, box_color[1] * shade, box_color[2] * shade, box_color[3])
+        colors.extend((tint,) * 4)
+    return Mesh(vertices=vertices, triangles=triangles, colors=colors, static=True)
+
+
+def entity_box(entity):
+    half = Vec3(*entity.world_scale) / 2
+    position = entity.world_position
+    return (tuple(position - half), tuple(position + half), tuple(entity.color))
+
+
+class LodGroup:
+    def __init__(self, key, entities, boxes, parent=None):
+        self.key = key
+        self.parent = parent
+        self.entities = entities
+        self.boxes = boxes
+        low = [min(b[0][axis] for b in boxes) for axis in range(3)]
+        high = [max(b[1][axis] for b in boxes) for axis in range(3)]
+        self.center = ((low[0] + high[0]) / 2, 0, (low[2] + high[2]) / 2)
+        self.radius = math.hypot(high[0] - low[0], high[2] - low[2]) / 2
+        self.level = LOD_FULL
+        self.entity_levels = [LOD_FULL] * len(entities)
+        # Remember how each entity looked at full detail (baked buildings are unlit already)
+        self.full_looks = [(e.shader, e.texture, getattr(e, 'unlit', False)) for e in entities]
+        self.impostor = None
+
+
+class BuildingLod:
+    def __init__(self, flat_distance=80, impostor_distance=160, hysteresis=15):
+        self.flat_distance = flat_distance
+        self.impostor_distance = impostor_distance
+        self.hysteresis = hysteresis
+        self.groups = {}
+
+    def add_group(self, key, entities, boxes=None, parent=None):
+        # boxes: (min, max, rgba) per building, taken from the entities if not given.
+        # parent: where the impostor lives, so hiding the parent hides it too
+        if boxes is None:
+            boxes = [entity_box(e) for e in entities]
+        if not boxes:
+            return None
+        group = LodGroup(key, entities, boxes, parent)
+        self.groups[key] = group
+        return group
+
+    def remove_group(self, key):
+        group = self.groups.pop(key, None)
+        if group and group.impostor:
+            destroy(group.impostor)
+
+    def next_level(self, level, distance, near, far):
+        # Thresholds move by the hysteresis band depending on the current level
+        h = self.hysteresis
+        if level == LOD_FULL:
+            return LOD_FLAT if distance > near + h else LOD_FULL
+        if level == LOD_FLAT:
+            if distance < near - h:
+                return LOD_FULL
+            return LOD_IMPOSTOR if far is not None and distance > far + h else LOD_FLAT
+        return LOD_FLAT if distance < far - h else LOD_IMPOSTOR
+
+    def set_entity_level(self, group, i, level):
+        entity = group.entities[i]
+        if level == LOD_FULL:
+            entity.shader, entity.texture, entity.unlit = group.full_looks[i]
+        else:
+            entity.texture = None
+            entity.shader = unlit_shader
+            entity.unlit = True
+        group.entity_levels[i] = level
+
+    def set_group_impostor(self, group, on):
+        if on and not group.impostor:
+            group.impostor = Entity(parent=group.parent or scene, model=impostor_strip(group.center, group.boxes),
+                                    position=group.center,
+                                    shader=unlit_shader, billboard=True, double_sided=True)
+            group.impostor.unlit = True
+        if group.impostor:
+            group.impostor.enabled = on
+        for entity in group.entities:
+            entity.enabled = not on
+
+    def update(self, camera_position):
+        cam_x, cam_z = camera_position[0], camera_position[2]
+        for group in self.groups.values():
+            group_distance = max(0, math.hypot(group.center[0] - cam_x, group.center[2] - cam_z) - group.radius)
+            level = self.next_level(group.level, group_distance, self.flat_distance, self.impostor_distance)
+            if level == LOD_IMPOSTOR and group.level == LOD_FULL:
+                level = LOD_FLAT
+
+            if level == LOD_IMPOSTOR:
+                if group.level != LOD_IMPOSTOR:
+                    self.set_group_impostor(group, True)
+                group.level = level
+                continue
+            if group.level == LOD_IMPOSTOR:
+                self.set_group_impostor(group, False)
+            group.level = level
+
+            # Inside a detailed group every building picks full or flat on its own
+            for i, entity in enumerate(group.entities):
+                if len(group.entities) == 1:
+                    distance = group_distance
+                else:
+                    distance = math.hypot(entity.world_x - cam_x, entity.world_z - cam_z)
+                entity_level = self.next_level(group.entity_levels[i], distance, self.flat_distance, None)
+                if entity_level != group.entity_levels[i]:
+                    self.set_entity_level(group, i, entity_level)
+
+    def counts(self):
+        counts = {LOD_FULL: 0, LOD_FLAT: 0, LOD_IMPOSTOR: 0}
+        for group in self.groups.values():
+            if group.level == LOD_IMPOSTOR:
+                counts[LOD_IMPOSTOR] += len(group.entities)
+            else:
+                for level in group.entity_levels:
+                    counts[level] += 1
+        return counts
@@ -0,0 +1,140 @@
+import hashlib
+import mmap
+import os
+import random
+import struct
+
+# Seeded city layouts with an on-disk cache
+# A layout is a flat array of float32 building records. The first launch with a
+# given seed and set of generator parameters rolls the city and writes it to
+# CACHE_DIR; later launches memory-map that file instead of re-rolling.
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.city_cache')
+LAYOUT_MAGIC = b'CITY'
+LAYOUT_VERSION = 1
+HEADER = struct.Struct('<4sII')  # magic, version, record count
+
+# One record per building
+FIELDS = ('x', 'y', 'z', 'sx', 'sy', 'sz', 'r', 'g', 'b', 'a', 'type', 'block_x', 'block_z')
+RECORD_SIZE = len(FIELDS)
+
+
+class CityLayout:
+    def __init__(self, values, source=None):
+        # values: anything indexable of floats, RECORD_SIZE per building
+        # (a memoryview over the mapped cache file, or a plain list)
+        self.values = values
+        self.source = source
+        self._file = None
+        self._map = None
+
+    def __len__(self):
+        return len(self.values) // RECORD_SIZE
+
+    def record(self, i):
+        start = i * RECORD_SIZE
+        return tuple(self.values[start:start + RECORD_SIZE])
+
+    def building(self, i):
+        x, y, z, sx, sy, sz, r, g, b, a, kind, block_x, block_z = self.record(i)
+        return {
+            'position': (x, y, z),
+            'scale': (sx, sy, sz),
+            'color': (r, g, b, a),
+            'type': int(kind),
+            'block': (int(block_x), int(block_z)),
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.building(i)
+
+    def close(self):
+        if self._map is not None:
+            self.values.release()
+            self._map.close()
+            self._file.close()
+            self._map = None
+
+
+def layout_key(generator, seed, params):
+    text = repr((generator, LAYOUT_VERSION, seed, sorted(params.items())))
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]
+
+
+def layout_path(generator, seed, params):
+    return os.path.join(CACHE_DIR, f'{generator}_{seed}_{layout_key(generator, seed, params)}.bin')
+
+
+def write_layout(path, values):
+    count = len(values) // RECORD_SIZE
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(LAYOUT_MAGIC, LAYOUT_VERSION, count))
+        f.write(struct.pack(f'<{len(values)}f', *values))
+    os.replace(tmp_path, path)
+
+
+def map_layout(path):
+    # Memory-map a cached layout; returns None if the file is missing or stale
+    try:
+        f = open(path, 'rb')
+    except OSError:
+        return None
+    try:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except ValueError:
+        f.close()
+        return None
+
+    if len(mapped) < HEADER.size:
+        # Truncated write: not even a full header
+        mapped.close()
+        f.close()
+        return None
+    magic, version, count = HEADER.unpack_from(mapped, 0)
+    if magic != LAYOUT_MAGIC or version != LAYOUT_VERSION or len(mapped) != HEADER.size + count * RECORD_SIZE * 4:
+        mapped.close()
+        f.close()
+        return None
+
+    layout = CityLayout(memoryview(mapped)[HEADER.size:].cast('f'), source=path)
+    layout._file = f
+    layout._map = mapped
+    return layout
+
+
+def load_or_generate(generator, seed, **params):
+    path = layout_path(generator.__name__, seed, params)
+    layout = map_layout(path)
+    if layout is not None:
+        return layout
+
+    values = generator(random.Random(seed), **params)
+    try:
+        write_layout(path, values)
+    except OSError:
+        # Read-only install: still give the caller the generated city
+        return CityLayout(values)
+    return map_layout(path) or CityLayout(values)
+
+
+def generate_grid_layout(rng, building_types, grid=range(-90, 91, 20), jitter=3, footprint=(6, 10), keep_clear=5):
+    # app.py style: one building per grid point, random type, jittered position
+    # building_types: list of (height, rgba) tuples
+    values = []
+    for x in grid:
+        for z in grid:
+            if abs(x) < keep_clear and abs(z) < keep_clear:
+                continue
+
+            kind = rng.randrange(len(building_types))
+            height, rgba = building_types[kind]
+            px = x + rng.uniform(-jitter, jitter)
+            pz = z + rng.uniform(-jitter, jitter)
+            sx = rng.uniform(*footprint)
+            sz = rng.uniform(*footprint)
+            values.extend((px, height / 2, pz, sx, height, sz, *rgba, kind, x, z))
+    return values
+
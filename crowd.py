@@ -0,0 +1,144 @@
+from ursina import *
+from instancing import InstancedLayer
+import numpy as np
+
+# Crowd simulation, structure of arrays
+# Every pedestrian is one slot in a set of NumPy arrays (position, heading, speed,
+# timer, state, color). One vectorized step per frame moves all of them, and the
+# render side gets all transforms in one bulk upload to an instanced layer.
+
+WALKER_FREE = 0
+WALKER_WALKING = 1
+WALKER_DOWN = 2
+
+
+class Crowd:
+    def __init__(self, capacity, speed_range=(2, 4), timer_range=(4, 10), turn_rate=0.0,
+                 bounds=None, y=0.8, size=(0.7, 1.6, 0.7), down_y=0.2, down_color=(0.25, 0.25, 0.25, 1), rng=None,
+                 avoidance=None):
+        # timer_range: seconds until a walker picks a new heading, None for no timer
+        # turn_rate: extra random heading changes per second (on top of the timer)
+        # bounds: walkers turn around past +-bounds on x or z, None to roam freely
+        # avoidance: an Avoidance that keeps walkers apart and out of buildings, None to walk through
+        self.capacity = capacity
+        self.speed_range = speed_range
+        self.timer_range = timer_range
+        self.turn_rate = turn_rate
+        self.bounds = bounds
+        self.y = y
+        self.size = size
+        self.down_y = down_y
+        self.down_color = down_color
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.avoidance = avoidance
+
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.z = np.zeros(capacity, dtype=np.float32)
+        self.heading = np.zeros(capacity, dtype=np.float32)  # degrees, like rotation_y
+        self.speed = np.zeros(capacity, dtype=np.float32)
+        self.timer = np.zeros(capacity, dtype=np.float32)
+        self.state = np.full(capacity, WALKER_FREE, dtype=np.int8)
+        self.colors = np.ones((capacity, 4), dtype=np.float32)
+
+    def spawn(self, count, area, palette=None):
+        # area: (min_x, min_z, max_x, max_z). palette: rgba choices, random colors if None.
+        # Returns the slots used (fewer than count if the crowd is full).
+        slots = np.flatnonzero(self.state == WALKER_FREE)[:count]
+        n = len(slots)
+        self.x[slots] = self.rng.uniform(area[0], area[2], n)
+        self.z[slots] = self.rng.uniform(area[1], area[3], n)
+        self.heading[slots] = self.rng.uniform(0, 360, n)
+        self.speed[slots] = self.rng.uniform(*self.speed_range, n)
+        if self.timer_range is not None:
+            self.timer[slots] = self.rng.uniform(*self.timer_range, n)
+        if palette is None:
+            self.colors[slots, :3] = self.rng.random((n, 3))
+            self.colors[slots, 3] = 1
+        else:
+            self.colors[slots] = np.asarray(palette, dtype=np.float32)[self.rng.integers(0, len(palette), n)]
+        self.state[slots] = WALKER_WALKING
+        return slots
+
+    @property
+    def walking(self):
+        return self.state == WALKER_WALKING
+
+    @property
+    def walking_count(self):
+        return int(np.count_nonzero(self.walking))
+
+    def step(self, dt, obstacles=None):
+        # obstacles: (x, z, radius) of things to walk around (cars), for the avoidance
+        walking = self.walking
+
+        # New random heading when the timer runs out (or on a random turn)
+        turn = np.zeros(self.capacity, dtype=bool)
+        if self.timer_range is not None:
+            self.timer -= dt
+            turn |= walking & (self.timer <= 0)
+        if self.turn_rate:
+            turn |= walking & (self.rng.random(self.capacity) < self.turn_rate * dt)
+        n = int(np.count_nonzero(turn))
+        if n:
+            self.heading[turn] = self.rng.uniform(0, 360, n)
+            if self.timer_range is not None:
+                self.timer[turn] = self.rng.uniform(*self.timer_range, n)
+
+        radians = np.radians(self.heading)
+        dx, dz = np.sin(radians), np.cos(radians)
+
+        # Turn around at the edge, but only while still heading outwards
+        if self.bounds is not None:
+            outwards = walking & (((np.abs(self.x) > self.bounds) & (self.x * dx > 0))
+                                  | ((np.abs(self.z) > self.bounds) & (self.z * dz > 0)))
+            if outwards.any():
+                self.heading[outwards] += 180
+                dx[outwards] *= -1
+                dz[outwards] *= -1
+
+        step = np.where(walking, self.speed * dt, 0)
+        self.x += dx * step
+        self.z += dz * step
+
+        if self.avoidance is not None:
+            steer_x, steer_z = self.avoidance.steer(self.x, self.z, walking, obstacles)
+            self.x += steer_x * dt
+            self.z += steer_z * dt
+
+    def near(self, x, z, radius):
+        # Walking pedestrians within radius of (x, z)
+        return np.flatnonzero(self.walking & ((self.x - x) ** 2 + (self.z - z) ** 2 < radius * radius))
+
+    def in_box(self, x, z, rotation_y, half_x, half_z):
+        # Walking pedestrians inside a yawed box (e.g. a car), padded by half a walker
+        radians = np.radians(rotation_y)
+        rel_x, rel_z = self.x - x, self.z - z
+        local_x = rel_x * np.cos(radians) - rel_z * np.sin(radians)
+        local_z = rel_x * np.sin(radians) + rel_z * np.cos(radians)
+        pad = self.size[0] / 2
+        return np.flatnonzero(self.walking & (np.abs(local_x) < half_x + pad) & (np.abs(local_z) < half_z + pad))
+
+    def knock_down(self, slots):
+        # Hit walkers stay where they fell
+        self.state[slots] = WALKER_DOWN
+
+    def remove(self, slots):
+        self.state[slots] = WALKER_FREE
+
+
+class CrowdRenderer(InstancedLayer):
+    def __init__(self, crowd, **kwargs):
+        super().__init__(model='cube', **kwargs)
+        self.crowd = crowd
+        # Pedestrians are too small to be worth a place in the shadow map
+        self.unlit = True
+
+    def sync(self):
+        # Upload every visible pedestrian in one go
+        crowd = self.crowd
+        shown = np.flatnonzero(crowd.state != WALKER_FREE)
+        down = crowd.state[shown] == WALKER_DOWN
+        positions = np.stack((crowd.x[shown], np.where(down, crowd.down_y, crowd.y), crowd.z[shown]), axis=1)
+        scales = np.broadcast_to(np.asarray(crowd.size, dtype=np.float32), (len(shown), 3))
+        colors = np.where(down[:, None], np.asarray(crowd.down_color, dtype=np.float32), crowd.colors[shown])
+        self.set_instance_arrays(positions.astype(np.float32), scales.astype(np.float32), colors.astype(np.float32))
@@ -0,0 +1,180 @@
+import time as _time
+from vehicle_dynamics import integrate, DRAG_COAST
+import numpy as np
+
+# Entity-component-system core
+# Actors are plain integer ids. Their data lives in packed component arrays, one
+# NumPy array per field, and systems are functions run over every id that has
+# the components they need, all at once. Rendering stays with Ursina: an Entity
+# is bound to an id as a render proxy and only gets its transform copied over
+# after each step. Every system is timed on its own, see stats_text().
+#
+#   transform   x, y, z, heading (degrees, like rotation_y)
+#   kinematics  speed along the heading and the limits that shape it
+#   driver      throttle and steer (-1..1) from input or AI; mode walk or car
+#   chaser      heads for a target id at chase_speed (steered by the AI workers)
+#   health
+
+DRIVE_WALK = 0   # speed follows the throttle directly
+DRIVE_CAR = 1    # throttle accelerates/brakes, coasting slows down to a stop
+
+COMPONENTS = {
+    'transform': {'x': 0.0, 'y': 0.0, 'z': 0.0, 'heading': 0.0},
+    'kinematics': {'speed': 0.0, 'max_speed': 10.0, 'reverse_speed': 5.0, 'acceleration': 10.0,
+                   'braking': 20.0, 'coast': 10.0, 'turn_speed': 90.0},
+    'driver': {'throttle': 0.0, 'steer': 0.0, 'mode': DRIVE_WALK},
+    'chaser': {'target': -1, 'chase_speed': 10.0, 'stop_distance': 0.0},
+    'health': {'health': 100.0, 'max_health': 100.0},
+}
+INT_FIELDS = {'mode', 'target'}
+
+
+class World:
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.free = list(range(capacity - 1, -1, -1))
+        self.components = {name: {field: np.full(capacity, default, dtype=self.field_dtype(field))
+                                  for field, default in fields.items()}
+                           for name, fields in COMPONENTS.items()}
+        self.masks = {name: np.zeros(capacity, dtype=bool) for name in COMPONENTS}
+        self.proxies = {}
+        self.systems = []
+        self.system_ms = {}
+
+    @staticmethod
+    def field_dtype(field):
+        return np.int32 if field in INT_FIELDS else np.float32
+
+    def __getitem__(self, component):
+        return self.components[component]
+
+    def grow(self):
+        old = self.capacity
+        self.capacity = old * 2
+        self.alive = np.concatenate((self.alive, np.zeros(old, dtype=bool)))
+        for name, fields in self.components.items():
+            for field, values in fields.items():
+                fields[field] = np.concatenate((values, np.full(old, COMPONENTS[name][field], dtype=values.dtype)))
+            self.masks[name] = np.concatenate((self.masks[name], np.zeros(old, dtype=bool)))
+        self.free = list(range(self.capacity - 1, old - 1, -1)) + self.free
+
+    def create(self, **components):
+        # world.create(transform={'x': 1}, kinematics={}, ...) -> id
+        if not self.free:
+            self.grow()
+        eid = self.free.pop()
+        self.alive[eid] = True
+        for name, values in components.items():
+            self.add(eid, name, **(values or {}))
+        return eid
+
+    def destroy(self, eid):
+        if not self.alive[eid]:
+            return
+        for name in self.masks:
+            self.masks[name][eid] = False
+        self.alive[eid] = False
+        self.proxies.pop(eid, None)
+        self.free.append(eid)
+
+    def add(self, eid, component, **values):
+        # Fields not given start at their defaults
+        fields = self.components[component]
+        for field, default in COMPONENTS[component].items():
+            fields[field][eid] = values.get(field, default)
+        self.masks[component][eid] = True
+
+    def remove(self, eid, component):
+        self.masks[component][eid] = False
+
+    def has(self, eid, component):
+        return bool(self.masks[component][eid])
+
+    def query(self, *components):
+        mask = self.alive.copy()
+        for name in components:
+            mask &= self.masks[name]
+        return np.flatnonzero(mask)
+
+    def get(self, eid, component, field):
+        return self.components[component][field][eid].item()
+
+    def set(self, eid, component, field, value):
+        self.components[component][field][eid] = value
+
+    # Render proxies
+
+    def bind(self, eid, entity):
+        self.proxies[eid] = entity
+
+    def place(self, eid, x, y, z, heading=None):
+        # Teleport: write the transform and move the proxy right away
+        transform = self.components['transform']
+        transform['x'][eid], transform['y'][eid], transform['z'][eid] = x, y, z
+        if heading is not None:
+            transform['heading'][eid] = heading
+        if eid in self.proxies:
+            self.sync_proxy(eid)
+
+    def sync_proxy(self, eid):
+        transform = self.components['transform']
+        entity = self.proxies[eid]
+        entity.position = (transform['x'][eid].item(), transform['y'][eid].item(), transform['z'][eid].item())
+        entity.rotation_y = transform['heading'][eid].item()
+
+    def sync_proxies(self):
+        for eid in self.proxies:
+            self.sync_proxy(eid)
+
+    # Systems
+
+    def add_system(self, system, name=None):
+        # system(world, dt), run in the order added
+        name = name or system.__name__
+        self.systems.append((name, system))
+        self.system_ms[name] = 0.0
+
+    def step(self, dt):
+        for name, system in self.systems:
+            start = _time.perf_counter()
+            system(self, dt)
+            self.system_ms[name] = (_time.perf_counter() - start) * 1000
+        start = _time.perf_counter()
+        self.sync_proxies()
+        self.system_ms['proxies'] = (_time.perf_counter() - start) * 1000
+
+    def stats_text(self):
+        return ' | '.join(f'{name} {ms:.2f} ms' for name, ms in self.system_ms.items())
+
+
+def driver_system(world, dt):
+    # Turns throttle/steer into speed and heading
+    ids = world.query('transform', 'kinematics', 'driver')
+    if not len(ids):
+        return
+    k, d, t = world['kinematics'], world['driver'], world['transform']
+    throttle, steer = d['throttle'][ids], d['steer'][ids]
+    max_speed = k['max_speed'][ids]
+
+    # Cars: accelerate forwards, brake into reverse, coast down to a stop
+    car_speed, car_heading = integrate(k['speed'][ids], t['heading'][ids], throttle, steer, max_speed,
+                                       k['reverse_speed'][ids], k['acceleration'][ids], k['braking'][ids],
+                                       k['turn_speed'][ids], DRAG_COAST, k['coast'][ids], dt=dt)
+    # People walk at the throttle's share of their top speed and turn on the spot
+    walk = d['mode'][ids] == DRIVE_WALK
+    k['speed'][ids] = np.where(walk, throttle * max_speed, car_speed)
+    t['heading'][ids] = np.where(walk, t['heading'][ids] + steer * k['turn_speed'][ids] * dt, car_heading)
+
+
+def movement_system(world, dt):
+    # Everything with a speed moves along its heading
+    ids = world.query('transform', 'kinematics')
+    if not len(ids):
+        return
+    t = world['transform']
+    radians = np.radians(t['heading'][ids])
+    step = world['kinematics']['speed'][ids] * dt
+    t['x'][ids] += np.sin(radians) * step
+    t['z'][ids] += np.cos(radians) * step
+
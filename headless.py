@@ -0,0 +1,62 @@
+from simulation import Simulation, ScriptedInput
+from rng_streams import GAME_SEED
+import json
+import sys
+import time
+
+# Headless run of the app.py game: the full simulation at a fixed 60 Hz step with
+# scripted input and no window, as fast as the CPU allows. For servers, load tests
+# and benchmarks. Usage: python headless.py [seconds] [script.json or - for the demo] [ai_workers]
+# A script is a JSON list of [start, end, keys] entries, in sim seconds.
+# Runs are seeded (GAME_SEED, 1 by default): the same seed and script end in the
+# same state digest, whatever the AI worker count.
+
+RATE = 60
+
+# Walk up to the nearest parked car, drive it around the block and get out again
+DEMO_SCRIPT = [
+    (0.0, 0.5, 'e'),
+    (0.5, 6.0, 'w'),
+    (6.0, 8.0, 'wd'),
+    (8.0, 14.0, 'w'),
+    (14.0, 15.0, 's'),
+    (15.0, 15.2, 'f'),
+    (15.2, 18.0, 'wa'),
+]
+
+seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 60
+if len(sys.argv) > 2 and sys.argv[2] != '-':
+    with open(sys.argv[2]) as f:
+        script = json.load(f)
+else:
+    script = DEMO_SCRIPT
+ai_workers = int(sys.argv[3]) if len(sys.argv) > 3 else None
+
+start = time.perf_counter()
+seed = GAME_SEED if GAME_SEED is not None else 1
+simulation = Simulation(input=ScriptedInput(script), ai_workers=ai_workers, seed=seed)
+setup_time = time.perf_counter() - start
+# Start next to a parked car so the demo script has something to get into
+car = simulation.vehicles[0]
+simulation.world.place(simulation.player.eid, car.x + 2, 1, car.z)
+
+steps = int(seconds * RATE)
+events = 0
+start = time.perf_counter()
+for _ in range(steps):
+    simulation.step(1 / RATE)
+    for name, data in simulation.drain_events():
+        events += 1
+        if name == 'wanted':
+            print(f'{simulation.time:7.2f}s  Wanted Level: {data} ⭐')
+run_time = time.perf_counter() - start
+simulation.close()
+
+ui = simulation.ui_state()
+print(f'setup {setup_time:.2f} s, {steps} steps in {run_time:.2f} s: {steps / run_time:.0f} steps/s, '
+      f'{seconds / run_time:.1f}x real time')
+print(f'{simulation.traffic.count} cars in traffic, {simulation.crowd.walking_count} pedestrians walking, '
+      f'{len(simulation.police_pool)} police, {events} events')
+print(f'{ui["wanted"]} | {ui["info"]}')
+print(f'systems: {simulation.world.stats_text()}')
+print(f'seed {seed}, state digest {simulation.state_digest()}')
@@ -0,0 +1,136 @@
+from ursina import *
+from panda3d.core import BoundingBox, Point3, PTA_LVecBase3f, PTA_LVecBase4f
+import numpy as np
+
+# Hardware instancing for lots of identical models
+# Every instance is a position, a scale and a color in a uniform array, so a
+# whole layer of boxes goes out in one draw call per MAX_INSTANCES.
+
+MAX_INSTANCES = 256
+
+instanced_box_shader = Shader(name='instanced_box_shader', language=Shader.GLSL, vertex='''#version 140
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+in vec4 p3d_Vertex;
+in vec2 p3d_MultiTexCoord0;
+out vec2 texcoords;
+out vec4 instance_color;
+
+uniform vec3 position_offsets[256];
+uniform vec3 scale_multipliers[256];
+uniform vec4 instance_colors[256];
+
+void main() {
+    vec3 v = p3d_Vertex.xyz * scale_multipliers[gl_InstanceID];
+    gl_Position = p3d_ModelViewProjectionMatrix * vec4(v + position_offsets[gl_InstanceID], 1.);
+    texcoords = p3d_MultiTexCoord0;
+    instance_color = instance_colors[gl_InstanceID];
+}
+''',
+
+fragment='''#version 140
+
+uniform sampler2D p3d_Texture0;
+uniform vec4 p3d_ColorScale;
+in vec2 texcoords;
+in vec4 instance_color;
+out vec4 fragColor;
+
+void main() {
+    fragColor = texture(p3d_Texture0, texcoords) * p3d_ColorScale * instance_color;
+}
+''',
+default_input={
+    'position_offsets': [Vec3(0) for i in range(MAX_INSTANCES)],
+    'scale_multipliers': [Vec3(1) for i in range(MAX_INSTANCES)],
+    'instance_colors': [Vec4(1) for i in range(MAX_INSTANCES)],
+}
+)
+
+
+class InstancedLayer(Entity):
+    def __init__(self, model='cube', texture=None, **kwargs):
+        super().__init__(**kwargs)
+        self.instance_model = model
+        self.instance_texture = texture
+        self.batches = []
+        self.instance_count = 0
+
+    def set_instances(self, positions, scales=None, colors=None):
+        count = len(positions)
+        if scales is None:
+            scales = [Vec3(1)] * count
+        if colors is None:
+            colors = [color.white] * count
+
+        batch_count = (count + MAX_INSTANCES - 1) // MAX_INSTANCES
+        while len(self.batches) < batch_count:
+            self.batches.append(Entity(parent=self, model=self.instance_model, texture=self.instance_texture,
+                                       shader=instanced_box_shader))
+        while len(self.batches) > batch_count:
+            destroy(self.batches.pop())
+
+        for i, batch in enumerate(self.batches):
+            start = i * MAX_INSTANCES
+            end = min(start + MAX_INSTANCES, count)
+            batch_positions = [Vec3(*p) for p in positions[start:end]]
+            batch_scales = [Vec3(*s) for s in scales[start:end]]
+            batch.set_shader_input('position_offsets', batch_positions)
+            batch.set_shader_input('scale_multipliers', batch_scales)
+            batch.set_shader_input('instance_colors', [Vec4(*c) for c in colors[start:end]])
+            batch.setInstanceCount(end - start)
+            self.fit_bounds(batch, batch_positions, batch_scales)
+
+        self.instance_count = count
+
+    def set_instance_arrays(self, positions, scales, colors):
+        # Bulk version of set_instances for NumPy arrays ((n, 3), (n, 3), (n, 4)):
+        # every batch owns fixed uniform arrays that are filled in place, no Vec3 per instance
+        count = len(positions)
+        batch_count = (count + MAX_INSTANCES - 1) // MAX_INSTANCES
+        while len(self.batches) < batch_count:
+            batch = Entity(parent=self, model=self.instance_model, texture=self.instance_texture,
+                           shader=instanced_box_shader)
+            arrays = (PTA_LVecBase3f.empty_array(MAX_INSTANCES), PTA_LVecBase3f.empty_array(MAX_INSTANCES),
+                      PTA_LVecBase4f.empty_array(MAX_INSTANCES))
+            batch.set_shader_input('position_offsets', arrays[0])
+            batch.set_shader_input('scale_multipliers', arrays[1])
+            batch.set_shader_input('instance_colors', arrays[2])
+            # The uniform arrays are shared with the shader, so writing into these views updates it
+            batch.instance_arrays = arrays
+            batch.instance_views = (np.frombuffer(arrays[0], dtype=np.float32).reshape(-1, 3),
+                                    np.frombuffer(arrays[1], dtype=np.float32).reshape(-1, 3),
+                                    np.frombuffer(arrays[2], dtype=np.float32).reshape(-1, 4))
+            self.batches.append(batch)
+        while len(self.batches) > batch_count:
+            destroy(self.batches.pop())
+
+        for i, batch in enumerate(self.batches):
+            start = i * MAX_INSTANCES
+            end = min(start + MAX_INSTANCES, count)
+            position_view, scale_view, color_view = batch.instance_views
+            position_view[:end - start] = positions[start:end]
+            scale_view[:end - start] = scales[start:end]
+            color_view[:end - start] = colors[start:end]
+            batch.setInstanceCount(end - start)
+            half = np.abs(scales[start:end]) / 2
+            low = (positions[start:end] - half).min(axis=0)
+            high = (positions[start:end] + half).max(axis=0)
+            batch.node().set_bounds(BoundingBox(Point3(*low.tolist()), Point3(*high.tolist())))
+            batch.node().set_final(True)
+
+        self.instance_count = count
+
+    def fit_bounds(self, batch, positions, scales):
+        # The engine only knows the bounds of one model, so give it the bounds
+        # of all instances or the batch gets culled when the origin is off screen
+        if not positions:
+            return
+        low = [min(p[axis] - abs(s[axis]) / 2 for p, s in zip(positions, scales)) for axis in range(3)]
+        high = [max(p[axis] + abs(s[axis]) / 2 for p, s in zip(positions, scales)) for axis in range(3)]
+        batch.node().set_bounds(BoundingBox(Point3(*low), Point3(*high)))
+        batch.node().set_final(True)
+
+    @property
+    def draw_calls(self):
+        return len(self.batches)
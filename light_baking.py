@@ -0,0 +1,135 @@
+import hashlib
+import os
+import numpy as np
+from city_layout import CACHE_DIR
+from static_batching import BOX_FACES
+
+# Baked lighting for the static city
+# The sun never moves and neither do the buildings, so their shadows and ambient
+# occlusion are computed once instead of every frame:
+#   - a ground lightmap (ground colour, roads painted in, darkened where buildings
+#     shadow it and around their feet)
+#   - brightness per building vertex, for MeshBuilder.add_box(shades=...)
+# Results are cached in CACHE_DIR keyed by the layout seed and everything else
+# that goes into the bake.
+
+BAKE_VERSION = 1
+
+
+def shadowed(points, to_light, box_min, box_max):
+    # For each point, does the ray towards the light hit any box? (slab test, all points at once)
+    points = np.asarray(points, dtype=np.float32)
+    to_light = np.asarray(to_light, dtype=np.float32)
+    hit = np.zeros(len(points), dtype=bool)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1.0 / to_light
+    for low, high in zip(box_min, box_max):
+        near = np.zeros(len(points), dtype=np.float32)
+        far = np.full(len(points), np.inf, dtype=np.float32)
+        for axis in range(3):
+            if to_light[axis] == 0:
+                outside = (points[:, axis] < low[axis]) | (points[:, axis] > high[axis])
+                far = np.where(outside, -np.inf, far)
+                continue
+            t0 = (low[axis] - points[:, axis]) * inverse[axis]
+            t1 = (high[axis] - points[:, axis]) * inverse[axis]
+            near = np.maximum(near, np.minimum(t0, t1))
+            far = np.minimum(far, np.maximum(t0, t1))
+        hit |= near <= far
+    return hit
+
+
+def footprint_distance(xs, zs, box_min, box_max):
+    # Distance from each point to the closest building footprint
+    distance = np.full(xs.shape, np.inf, dtype=np.float32)
+    for low, high in zip(box_min, box_max):
+        dx = np.maximum(np.maximum(low[0] - xs, xs - high[0]), 0)
+        dz = np.maximum(np.maximum(low[2] - zs, zs - high[2]), 0)
+        distance = np.minimum(distance, np.hypot(dx, dz))
+    return distance
+
+
+def bake_ground(extent, resolution, ground_color, paint, box_min, box_max, to_light,
+                ambient=0.4, ao_radius=3.0, ao_strength=0.45):
+    # extent: (min_x, min_z, max_x, max_z) of the ground plane
+    # paint: (min_x, min_z, max_x, max_z, rgb) rectangles drawn on top, e.g. roads
+    # Returns an RGB uint8 image, top row = far (max z) edge like a texture on Ursina's plane
+    min_x, min_z, max_x, max_z = extent
+    texel_x = (max_x - min_x) / resolution
+    texel_z = (max_z - min_z) / resolution
+    xs, zs = np.meshgrid(min_x + (np.arange(resolution) + 0.5) * texel_x,
+                         min_z + (np.arange(resolution) + 0.5) * texel_z)
+
+    albedo = np.empty((resolution, resolution, 3), dtype=np.float32)
+    albedo[:] = ground_color[:3]
+    for p_min_x, p_min_z, p_max_x, p_max_z, rgb in paint:
+        inside = (xs >= p_min_x) & (xs <= p_max_x) & (zs >= p_min_z) & (zs <= p_max_z)
+        albedo[inside] = rgb[:3]
+
+    points = np.stack((xs.ravel(), np.full(xs.size, 0.05, dtype=np.float32), zs.ravel()), axis=1)
+    shadow = shadowed(points, to_light, box_min, box_max).reshape(xs.shape)
+    # The ground is still lit in real time, so shadow only takes away the direct share
+    light = np.where(shadow, ambient, 1.0)
+    light *= 1.0 - ao_strength * np.exp(-footprint_distance(xs, zs, box_min, box_max) / ao_radius)
+
+    image = np.clip(albedo * light[:, :, None], 0, 1)
+    return (np.flipud(image) * 255).astype(np.uint8)
+
+
+def bake_box_shades(box_min, box_max, to_light, ambient=0.4, direct=0.6, foot_ao=0.7):
+    # Brightness of the 24 vertices of every box, in MeshBuilder.add_box order
+    box_min = np.asarray(box_min, dtype=np.float32).reshape(-1, 3)
+    box_max = np.asarray(box_max, dtype=np.float32).reshape(-1, 3)
+    center = (box_min + box_max) / 2
+    size = box_max - box_min
+
+    corners = np.array([corner for _, face_corners in BOX_FACES for corner in face_corners], dtype=np.float32)
+    normals = np.array([normal for normal, face_corners in BOX_FACES for _ in face_corners], dtype=np.float32)
+    points = center[:, None, :] + corners[None, :, :] * size[:, None, :]
+    # Nudge off the surface so a box doesn't shadow itself
+    points = (points + normals[None, :, :] * 0.05).reshape(-1, 3)
+
+    facing = np.maximum(normals @ np.asarray(to_light, dtype=np.float32), 0)
+    shadow = shadowed(points, to_light, box_min, box_max).reshape(len(box_min), 24)
+    shades = ambient + direct * facing[None, :] * ~shadow
+    # Darken where walls meet the ground
+    shades = shades * np.where(corners[:, 1] < 0, foot_ao, 1.0)[None, :]
+    return shades.astype(np.float32)
+
+
+def bake_key(seed, *parts):
+    h = hashlib.sha1(repr((BAKE_VERSION, seed)).encode())
+    for part in parts:
+        h.update(np.ascontiguousarray(part).tobytes() if isinstance(part, np.ndarray) else repr(part).encode())
+    return f'lighting_{seed}_{h.hexdigest()[:16]}'
+
+
+def load_or_bake(seed, boxes, paint, extent, ground_color, light_direction, resolution=512, ambient=0.4):
+    # boxes: (min, max) of every static building. light_direction: the way the light shines
+    # (the DirectionalLight's forward). Returns (ground image, shades per box).
+    box_min = np.array([b[0] for b in boxes], dtype=np.float32).reshape(-1, 3)
+    box_max = np.array([b[1] for b in boxes], dtype=np.float32).reshape(-1, 3)
+    to_light = -np.asarray(light_direction, dtype=np.float32)
+    to_light /= np.linalg.norm(to_light)
+
+    key = bake_key(seed, box_min, box_max, paint, extent, tuple(ground_color), to_light, resolution, ambient)
+    path = os.path.join(CACHE_DIR, key + '.npz')
+    if os.path.exists(path):
+        try:
+            with np.load(path) as cached:
+                return cached['ground'], cached['shades']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    ground = bake_ground(extent, resolution, ground_color, paint, box_min, box_max, to_light, ambient)
+    shades = bake_box_shades(box_min, box_max, to_light, ambient, 1 - ambient)
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = path + '.tmp.npz'
+        np.savez_compressed(tmp_path, ground=ground, shades=shades)
+        os.replace(tmp_path, path)
+    except OSError:
+        # Read-only install or full disk: the bake is still good for this run
+        pass
+    return ground, shades
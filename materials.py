@@ -0,0 +1,55 @@
+from ursina import *
+from ursina import application
+from PIL import Image
+
+# Texture atlas for batched geometry
+# The built-in textures are packed side by side into one image, so boxes with
+# different textures can share one mesh and one draw call. Which texture a box
+# uses becomes its UV rect inside the atlas, its tint becomes vertex colors
+# (MeshBuilder.add_box(uv_rect=..., box_color=...)).
+
+ATLAS_TEXTURES = ('brick', 'grass', 'white_cube')
+
+
+def find_texture_file(name):
+    # Project folder first, then Ursina's own textures
+    for folder in (application.asset_folder, application.internal_textures_folder):
+        for suffix in ('.png', '.jpg', '.jpeg'):
+            path = Path(folder) / (name + suffix)
+            if path.exists():
+                return path
+    return None
+
+
+class TextureAtlas:
+    def __init__(self, names=ATLAS_TEXTURES, tile_size=256, padding=4):
+        self.tile_size = tile_size
+        self.padding = padding
+        self.rects = {}
+
+        # One row of tiles, each with a border of its own edge colours so
+        # filtering never picks up the neighbouring tile
+        cell = tile_size + padding * 2
+        # Plain white for untextured geometry is always the first tile
+        names = ('white',) + tuple(names)
+        image = Image.new('RGBA', (cell * len(names), cell), (255, 255, 255, 255))
+        for i, name in enumerate(names):
+            if name != 'white':
+                path = find_texture_file(name)
+                if path is None:
+                    print('atlas: texture not found:', name)
+                    continue
+                tile = Image.open(path).convert('RGBA')
+                image.paste(tile.resize((cell, cell)), (i * cell, 0))
+                image.paste(tile.resize((tile_size, tile_size)), (i * cell + padding, padding))
+
+            u0 = (i * cell + padding) / image.width
+            u1 = (i * cell + padding + tile_size) / image.width
+            self.rects[name] = (u0, padding / cell, u1, (padding + tile_size) / cell)
+
+        self.image = image
+        self.texture = Texture(image)
+
+    def rect(self, name):
+        # UV rect of a texture, plain white for anything not in the atlas
+        return self.rects.get(name, self.rects['white'])
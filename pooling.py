@@ -0,0 +1,71 @@
+# Object pools
+# Creating and destroying entities in the middle of a chase (police cars, UI
+# notifications) churns the scene graph and shows up as frame spikes. A pool
+# builds its objects up front (warm), hands them out with acquire() and takes
+# them back with release(), so after load time nothing is created or destroyed.
+# Entities are enabled/disabled on the way out and in; the reset hook puts a
+# recycled object back into a fresh state (position, text, ...), the retire hook
+# undoes whatever reset set up (registrations and the like).
+
+
+class ObjectPool:
+    def __init__(self, factory, reset=None, retire=None, size=0):
+        # factory(): a new object. reset(obj, *args, **kwargs): called on every acquire.
+        # retire(obj): called on every release and once for objects made by warm().
+        self.factory = factory
+        self.reset = reset
+        self.retire = retire
+        self.free = []
+        self.active = []
+        self.created = 0
+        self.misses = 0        # acquires the pool had to build a new object for
+        self.high_water = 0    # most objects out at once
+        self.warm(size)
+
+    def __len__(self):
+        return len(self.active)
+
+    def create(self):
+        self.created += 1
+        return self.factory()
+
+    def warm(self, count):
+        # Build objects until the pool holds count of them in total
+        while len(self.free) + len(self.active) < count:
+            obj = self.create()
+            self.put_away(obj)
+            self.free.append(obj)
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            obj = self.free.pop()
+        else:
+            self.misses += 1
+            obj = self.create()
+        self.active.append(obj)
+        self.high_water = max(self.high_water, len(self.active))
+        if hasattr(obj, 'enable'):
+            obj.enable()
+        if self.reset:
+            self.reset(obj, *args, **kwargs)
+        return obj
+
+    def release(self, obj):
+        if obj not in self.active:
+            return
+        self.active.remove(obj)
+        self.put_away(obj)
+        self.free.append(obj)
+
+    def release_all(self):
+        for obj in list(self.active):
+            self.release(obj)
+
+    def put_away(self, obj):
+        if self.retire:
+            self.retire(obj)
+        if hasattr(obj, 'disable'):
+            obj.disable()
+
+    def stats_text(self):
+        return f'{len(self.active)} in use / {self.created} built, peak {self.high_water}, misses {self.misses}'
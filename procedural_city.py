@@ -0,0 +1,165 @@
+import math
+import numpy as np
+
+# Infinite procedural city
+# Every chunk is rolled from a hash of (world seed, chunk x, chunk z), so any chunk
+# can be rebuilt on demand without global state and the same chunk always comes
+# back identical. Landmarks (police stations) are placed per district, a square of
+# district_chunks x district_chunks chunks, also from a hash, so finding the nearest
+# one only needs the neighbouring districts.
+
+MASK_64 = (1 << 64) - 1
+LANDMARK_SALT = 0x5DEECE66D
+
+# Building types, as returned in generate_blocks' 'kind' array (defined only here)
+BLOCK_BUILDING = 0
+BLOCK_HOTEL = 1
+BLOCK_POLICE = 2
+
+
+def mix64(z):
+    # splitmix64 finalizer
+    z = (z + 0x9E3779B97F4A7C15) & MASK_64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return z ^ (z >> 31)
+
+
+def chunk_hash(seed, cx, cz):
+    # Negative coordinates wrap to two's complement, so every chunk gets its own hash
+    h = mix64(seed & MASK_64)
+    h = mix64(h ^ (cx & MASK_64))
+    return mix64(h ^ (cz & MASK_64))
+
+
+def generate_blocks(rng, ix, iz, road_spacing, road_width, hotel_odds=12, police_block=None):
+    # One building per block for whole arrays of block indices in one pass.
+    # rng is a numpy Generator. Returns arrays: x, z, height, footprint, kind and a
+    # tint roll in -1..1 (see block_colors)
+    ix = np.asarray(ix)
+    iz = np.asarray(iz)
+    count = ix.size
+    offset = road_width / 2 + (road_spacing - road_width) / 4
+    block_w = (road_spacing - road_width) / 2
+
+    height = rng.uniform(8, 25, count)
+    hotel = rng.integers(1, hotel_odds + 1, count) == 1
+    hotel_height = rng.uniform(35, 60, count)
+    tint = rng.uniform(-1, 1, count)
+
+    kind = np.where(hotel, BLOCK_HOTEL, BLOCK_BUILDING)
+    height = np.where(hotel, hotel_height, height)
+    footprint = np.full(count, block_w * 1.6)
+    if police_block is not None:
+        police = (ix == police_block[0]) & (iz == police_block[1])
+        kind = np.where(police, BLOCK_POLICE, kind)
+        height = np.where(police, 30.0, height)
+        footprint = np.where(police, block_w * 1.8, footprint)
+
+    return {
+        'x': ix * road_spacing + offset,
+        'z': iz * road_spacing + offset,
+        'height': height,
+        'footprint': footprint,
+        'kind': kind,
+        'tint': tint,
+    }
+
+
+def block_colors(kind, tint, palette, tint_range=(0, 0, 0)):
+    # rgba per block: palette[kind] brightened or darkened by tint * tint_range[kind],
+    # the same as Color.tint
+    palette = np.asarray(palette, dtype=float)
+    amount = (tint * np.asarray(tint_range, dtype=float)[kind])[:, None]
+    colors = palette[kind].copy()
+    colors[:, :3] = np.clip(colors[:, :3] + amount, 0, 1)
+    return colors
+
+
+class ProceduralCity:
+    def __init__(self, seed, road_spacing, road_width, chunk_blocks, palette,
+                 hotel_odds=12, police_block=(2, 2), district_chunks=4, road_y=0.05):
+        # palette: rgba per building type (BLOCK_BUILDING, BLOCK_HOTEL, BLOCK_POLICE)
+        self.seed = seed
+        self.road_spacing = road_spacing
+        self.road_width = road_width
+        self.chunk_blocks = chunk_blocks
+        self.chunk_size = road_spacing * chunk_blocks
+        self.palette = palette
+        self.hotel_odds = hotel_odds
+        # The home district keeps the police station where the fixed city had it
+        self.police_block = tuple(police_block)
+        self.district_chunks = district_chunks
+        self.district_blocks = district_chunks * chunk_blocks
+        self.road_y = road_y
+
+    def block_center(self, ix, iz):
+        offset = self.road_width / 2 + (self.road_spacing - self.road_width) / 4
+        return (ix * self.road_spacing + offset, iz * self.road_spacing + offset)
+
+    def district_of_block(self, ix, iz):
+        return (math.floor(ix / self.district_blocks), math.floor(iz / self.district_blocks))
+
+    def district_police_block(self, dx, dz):
+        if (dx, dz) == self.district_of_block(*self.police_block):
+            return self.police_block
+        h = chunk_hash(self.seed ^ LANDMARK_SALT, dx, dz)
+        return (dx * self.district_blocks + h % self.district_blocks,
+                dz * self.district_blocks + (h >> 32) % self.district_blocks)
+
+    def nearest_police_station(self, x, z):
+        # The nearest station is always in the district around (x, z) or a neighbour
+        dx, dz = self.district_of_block(math.floor(x / self.road_spacing), math.floor(z / self.road_spacing))
+        best, best_distance = None, None
+        for nx in (dx - 1, dx, dx + 1):
+            for nz in (dz - 1, dz, dz + 1):
+                bx, bz = self.block_center(*self.district_police_block(nx, nz))
+                d = math.hypot(bx - x, bz - z)
+                if best is None or d < best_distance:
+                    best, best_distance = (bx, 0, bz), d
+        return best
+
+    def chunk_roads(self, cx, cz):
+        # One road piece per road line crossing the chunk, as (position, scale)
+        size = self.chunk_size
+        center_x, center_z = (cx + 0.5) * size, (cz + 0.5) * size
+        roads = []
+        for i in range(cz * self.chunk_blocks, (cz + 1) * self.chunk_blocks):
+            roads.append(((center_x, self.road_y, i * self.road_spacing), (size, 0.1, self.road_width)))
+        for i in range(cx * self.chunk_blocks, (cx + 1) * self.chunk_blocks):
+            roads.append(((i * self.road_spacing, self.road_y, center_z), (self.road_width, 0.1, size)))
+        return roads
+
+    def chunk_ground(self, cx, cz):
+        return (((cx + 0.5) * self.chunk_size, 0, (cz + 0.5) * self.chunk_size), (self.chunk_size, 1, self.chunk_size))
+
+    def chunk_buildings(self, cx, cz):
+        # One building per block, with the odd hotel and the district's police station.
+        # Returns dicts shaped like CityLayout.building()
+        rng = np.random.default_rng(chunk_hash(self.seed, cx, cz))
+        police_block = self.district_police_block(
+            *self.district_of_block(cx * self.chunk_blocks, cz * self.chunk_blocks))
+        ix, iz = np.meshgrid(np.arange(cx * self.chunk_blocks, (cx + 1) * self.chunk_blocks),
+                             np.arange(cz * self.chunk_blocks, (cz + 1) * self.chunk_blocks), indexing='ij')
+        blocks = generate_blocks(rng, ix.ravel(), iz.ravel(), self.road_spacing, self.road_width,
+                                 self.hotel_odds, police_block)
+        colors = block_colors(blocks['kind'], blocks['tint'], self.palette)
+
+        buildings = []
+        for i in range(len(blocks['kind'])):
+            height, footprint = float(blocks['height'][i]), float(blocks['footprint'][i])
+            buildings.append({
+                'position': (float(blocks['x'][i]), height / 2, float(blocks['z'][i])),
+                'scale': (footprint, height, footprint),
+                'color': tuple(float(c) for c in colors[i]),
+                'type': int(blocks['kind'][i]),
+                'block': (int(ix.ravel()[i]), int(iz.ravel()[i])),
+            })
+        return buildings
+
+    def chunk(self, cx, cz):
+        return {
+            'ground': self.chunk_ground(cx, cz),
+            'roads': self.chunk_roads(cx, cz),
+            'buildings': self.chunk_buildings(cx, cz),
+        }
@@ -0,0 +1,58 @@
+import os
+import zlib
+import numpy as np
+
+# Seeded random streams, one per subsystem
+# A single shared generator ties every subsystem to the draw order of all the others:
+# vectorizing the crowd would change what the traffic rolls. Instead each subsystem
+# (world gen, crowd, traffic, police, wanted decay, ...) draws from its own NumPy
+# Generator, derived from one root seed and the stream's name. A stream gives the
+# same numbers whatever else draws, or in which order the streams were first used,
+# and it draws whole arrays at once. Same seed, same run: set GAME_SEED to replay one.
+
+STREAM_WORLD = 'world'        # city and map generation, placement at load time
+STREAM_CROWD = 'crowd'        # pedestrians and NPCs
+STREAM_TRAFFIC = 'traffic'    # AI cars
+STREAM_POLICE = 'police'
+STREAM_WANTED = 'wanted'      # wanted level decay
+STREAM_AI = 'ai'              # AI worker decisions
+STREAM_COSMETIC = 'cosmetic'  # colors and textures, nothing gameplay depends on
+
+
+class RngStreams:
+    def __init__(self, seed=None):
+        # seed None picks a fresh one; it is kept in self.seed so the run can be replayed
+        self.root = np.random.SeedSequence(seed)
+        self.seed = self.root.entropy
+        self.streams = {}
+
+    def seed_sequence(self, name):
+        # Keyed by name, not by creation order
+        return np.random.SeedSequence(self.seed, spawn_key=(zlib.crc32(name.encode('utf-8')),))
+
+    def stream(self, name):
+        generator = self.streams.get(name)
+        if generator is None:
+            generator = np.random.Generator(np.random.PCG64(self.seed_sequence(name)))
+            self.streams[name] = generator
+        return generator
+
+    def __getitem__(self, name):
+        return self.stream(name)
+
+    def seed_for(self, name):
+        # An int seed derived from the stream, for things that seed themselves (worker processes)
+        return int(self.seed_sequence(name).generate_state(1)[0])
+
+
+GAME_SEED = int(os.environ['GAME_SEED']) if os.environ.get('GAME_SEED') else None
+rng_streams = RngStreams(GAME_SEED)
+
+
+def stream(name):
+    return rng_streams.stream(name)
+
+
+def choice(generator, options):
+    # One item of a plain list (colors, textures), which Generator.choice would turn into an array
+    return options[int(generator.integers(len(options)))]
@@ -0,0 +1,161 @@
+import math
+from array import array
+
+# Road network graph
+# Built from the same grid parameters the road planes use (roads along x and z
+# every road_spacing, indices in road_range). Intersections are nodes, every
+# road piece between two intersections is a pair of directed lane edges (one per
+# travel direction, driving on the right). Everything is stored in flat arrays:
+#   node_x, node_z        intersection positions
+#   node_out              4 slots per node, the edge leaving it per direction (-1 if none)
+#   edge_from, edge_to    node ids
+#   edge_dir, edge_length travel direction and length
+# Because the roads lie on a grid, the spatial queries are O(1) arithmetic
+# instead of searches.
+
+DIR_NORTH = 0  # +z, rotation_y 0
+DIR_EAST = 1   # +x, rotation_y 90
+DIR_SOUTH = 2  # -z, rotation_y 180
+DIR_WEST = 3   # -x, rotation_y 270
+DIR_VECTORS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+
+def direction_of(rotation_y):
+    # Closest grid direction to a heading
+    return int(round((rotation_y % 360) / 90)) % 4
+
+
+def direction_rotation(direction):
+    return direction * 90
+
+
+def opposite(direction):
+    return (direction + 2) % 4
+
+
+class RoadGraph:
+    def __init__(self, road_spacing, road_width, road_range=range(-5, 6)):
+        self.road_spacing = road_spacing
+        self.road_width = road_width
+        # Lanes run a quarter road width from the centre line
+        self.lane_offset = road_width / 4
+        self.first = road_range.start
+        self.last = road_range[-1]
+        self.lines = len(road_range)
+        # Extent of the road planes along each line
+        self.min_coord = self.first * road_spacing
+        self.max_coord = self.last * road_spacing
+
+        count = self.lines * self.lines
+        self.node_x = array('f', [0.0]) * count
+        self.node_z = array('f', [0.0]) * count
+        self.node_out = array('i', [-1]) * (count * 4)
+        self.edge_from = array('i')
+        self.edge_to = array('i')
+        self.edge_dir = array('b')
+        self.edge_length = array('f')
+
+        for ix in road_range:
+            for iz in road_range:
+                node = self.node_id(ix, iz)
+                self.node_x[node] = ix * road_spacing
+                self.node_z[node] = iz * road_spacing
+
+        for ix in road_range:
+            for iz in road_range:
+                node = self.node_id(ix, iz)
+                for direction, (dx, dz) in enumerate(DIR_VECTORS):
+                    target = self.node_id(ix + dx, iz + dz)
+                    if target < 0:
+                        continue
+                    self.node_out[node * 4 + direction] = len(self.edge_from)
+                    self.edge_from.append(node)
+                    self.edge_to.append(target)
+                    self.edge_dir.append(direction)
+                    self.edge_length.append(road_spacing)
+
+    @property
+    def node_count(self):
+        return len(self.node_x)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_from)
+
+    def node_id(self, ix, iz):
+        if not (self.first <= ix <= self.last and self.first <= iz <= self.last):
+            return -1
+        return (ix - self.first) * self.lines + (iz - self.first)
+
+    def node_index(self, node):
+        # Grid indices of a node id
+        return (node // self.lines + self.first, node % self.lines + self.first)
+
+    def node_position(self, node):
+        return (self.node_x[node], self.node_z[node])
+
+    def edge(self, node, direction):
+        return self.node_out[node * 4 + direction]
+
+    def clamp_index(self, value):
+        return min(max(int(round(value / self.road_spacing)), self.first), self.last)
+
+    def clamp_coord(self, value):
+        return min(max(value, self.min_coord), self.max_coord)
+
+    def lane_point(self, edge, t):
+        # Point on the lane of a directed edge, t from 0 (start node) to 1 (end node)
+        a, b = self.edge_from[edge], self.edge_to[edge]
+        dx, dz = DIR_VECTORS[self.edge_dir[edge]]
+        # Right hand side of the travel direction
+        right_x, right_z = dz, -dx
+        x = self.node_x[a] + (self.node_x[b] - self.node_x[a]) * t + right_x * self.lane_offset
+        z = self.node_z[a] + (self.node_z[b] - self.node_z[a]) * t + right_z * self.lane_offset
+        return (x, z)
+
+    def nearest_road_point(self, x, z):
+        # Closest point on any road centre line: (x, z, direction the road runs along)
+        line_x = self.clamp_index(x) * self.road_spacing  # road running along z
+        line_z = self.clamp_index(z) * self.road_spacing  # road running along x
+        on_z_road = (line_x, self.clamp_coord(z))
+        on_x_road = (self.clamp_coord(x), line_z)
+        if math.hypot(on_z_road[0] - x, on_z_road[1] - z) <= math.hypot(on_x_road[0] - x, on_x_road[1] - z):
+            return (on_z_road[0], on_z_road[1], DIR_NORTH)
+        return (on_x_road[0], on_x_road[1], DIR_EAST)
+
+    def nearest_intersection(self, x, z):
+        return self.node_id(self.clamp_index(x), self.clamp_index(z))
+
+    def snap_to_lane(self, x, z):
+        # Nearest lane position and heading: (x, z, rotation_y).
+        # Picks the lane on the same side of the centre line as (x, z).
+        road_x, road_z, direction = self.nearest_road_point(x, z)
+        if direction == DIR_NORTH:
+            # Right of +z is +x
+            direction = DIR_NORTH if x >= road_x else DIR_SOUTH
+        else:
+            # Right of +x is -z
+            direction = DIR_EAST if z <= road_z else DIR_WEST
+        dx, dz = DIR_VECTORS[direction]
+        return (road_x + dz * self.lane_offset, road_z - dx * self.lane_offset, direction_rotation(direction))
+
+    def next_intersection(self, x, z, direction):
+        # First intersection strictly ahead of (x, z) when driving in direction,
+        # on the road the point is on. -1 past the edge of the network.
+        dx, dz = DIR_VECTORS[direction]
+        s = self.road_spacing
+        if dx:
+            ix = math.floor(x / s) + 1 if dx > 0 else math.ceil(x / s) - 1
+            return self.node_id(ix, self.clamp_index(z))
+        iz = math.floor(z / s) + 1 if dz > 0 else math.ceil(z / s) - 1
+        return self.node_id(self.clamp_index(x), iz)
+
+    def edge_at(self, x, z, direction):
+        # Directed edge a car at (x, z) heading in direction is driving on
+        ahead = self.next_intersection(x, z, direction)
+        if ahead < 0:
+            return -1
+        ix, iz = self.node_index(ahead)
+        dx, dz = DIR_VECTORS[direction]
+        behind = self.node_id(ix - dx, iz - dz)
+        return self.edge(behind, direction) if behind >= 0 else -1
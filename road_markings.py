@@ -0,0 +1,35 @@
+from ursina import *
+from instancing import InstancedLayer
+
+# Dashed lane markings as one instanced layer instead of one Entity per dash
+
+
+def dash_transforms(road_spacing, road_width, road_range=range(-5, 6), dash_range=range(-200, 201, 40),
+                    dash_length=4, height=0.06):
+    # Same layout as the old per-dash loop: a dash every 40 units along every
+    # horizontal and vertical road, dash thickness scaled with the road width
+    thickness = road_width / 20
+    positions = []
+    scales = []
+    for i in road_range:
+        z = i * road_spacing
+        for dash in dash_range:
+            positions.append((dash, height, z))
+            scales.append((dash_length, 0.11, thickness))
+
+        x = i * road_spacing
+        for dash in dash_range:
+            positions.append((x, height, dash))
+            scales.append((thickness, 0.11, dash_length))
+    return positions, scales
+
+
+class RoadMarkingLayer(InstancedLayer):
+    def __init__(self, road_spacing, road_width, marking_color=color.white, **kwargs):
+        super().__init__(model='cube', **kwargs)
+        self.marking_color = marking_color
+        self.regenerate(road_spacing, road_width)
+
+    def regenerate(self, road_spacing, road_width, **layout):
+        positions, scales = dash_transforms(road_spacing, road_width, **layout)
+        self.set_instances(positions, scales, [self.marking_color] * len(positions))
@@ -0,0 +1,77 @@
+from ursina import *
+
+# Shadow caster budgeting for a single DirectionalLight
+# - the shadow frustum follows the player instead of covering the whole map,
+#   so the shadow map spends its texels where the camera is
+# - only casters within caster_distance of the player render into the shadow map
+# - flat things (ground, roads) only receive shadows and never cast them
+
+# Camera mask of Ursina's DirectionalLight shadow camera. Hiding an entity from
+# this mask removes it from the shadow pass only; the main camera still draws it.
+SHADOW_MASK = 0b0001
+
+
+class ShadowManager:
+    def __init__(self, light, radius=50, caster_distance=None, depth=150, caster_interval=5):
+        self.light = light
+        # Half the width of the square shadow frustum around the focus point
+        self.radius = radius
+        self.caster_distance = caster_distance if caster_distance is not None else radius
+        # How far back along the light direction the shadow camera sits
+        self.depth = depth
+        # Only re-evaluate casters every few frames, they rarely cross the border
+        self.caster_interval = caster_interval
+        self.caster_groups = []
+        self.receivers = []
+        self.caster_count = 0
+        self.frame = 0
+
+    def add_receivers(self, *entities):
+        for entity in entities:
+            entity.hide(SHADOW_MASK)
+            self.receivers.append(entity)
+
+    def add_casters(self, entities):
+        # Lists are kept by reference, so cars spawned later are picked up too.
+        # Batched meshes sit at the origin, they can set shadow_center / shadow_radius instead.
+        self.caster_groups.append(entities)
+
+    def fit_frustum(self, focus):
+        lens = self.light._light.get_lens()
+        size = self.radius * 2
+        lens.set_film_size(size, size)
+        lens.set_film_offset(0, 0)
+        lens.set_near_far(1, self.depth * 2)
+
+        # Snap the focus to whole shadow map texels so shadows don't shimmer while moving
+        texel = size / getattr(self.light, 'shadow_map_resolution', (1024, 1024))[0]
+        snapped = Vec3(round(focus[0] / texel) * texel, 0, round(focus[2] / texel) * texel)
+        self.light.world_position = snapped - self.light.forward * self.depth
+
+    def update_casters(self, focus):
+        count = 0
+        for group in self.caster_groups:
+            for entity in group:
+                if not entity or not entity.enabled:
+                    continue
+                # LOD flat buildings are marked unlit and must stay out of the shadow pass
+                if getattr(entity, 'unlit', False):
+                    entity.hide(SHADOW_MASK)
+                    continue
+                center = getattr(entity, 'shadow_center', None) or entity.world_position
+                reach = self.caster_distance + getattr(entity, 'shadow_radius', 0)
+                if (center[0] - focus[0]) ** 2 + (center[2] - focus[2]) ** 2 <= reach * reach:
+                    entity.show(SHADOW_MASK)
+                    count += 1
+                else:
+                    entity.hide(SHADOW_MASK)
+        self.caster_count = count
+
+    def update(self, focus):
+        # The light turns its shadows on a frame after it's created
+        if not getattr(self.light, 'shadows', False):
+            return
+        self.fit_frustum(focus)
+        if self.frame % self.caster_interval == 0:
+            self.update_casters(focus)
+        self.frame += 1
@@ -0,0 +1,100 @@
+from ursina import *
+
+# Fixed timestep simulation clock
+# Gameplay runs in fixed steps (60 per second by default) no matter the frame rate,
+# so movement, gravity and chases behave the same at 30 and at 240 fps. Frame time
+# goes into an accumulator and whole steps are taken out of it; after a long hitch
+# at most max_steps are run and the rest is dropped instead of spiralling.
+# Systems register with the clock and get fixed_update(dt) instead of update().
+# Tracked entities are drawn between their last two simulated transforms, so
+# motion stays smooth when the frame rate and the step rate don't line up.
+
+
+class SimClock:
+    def __init__(self, rate=60, max_steps=5):
+        self.step = 1 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.steps = 0            # steps run in the last tick
+        self.sim_time = 0.0
+        self.systems = []
+        self.schedulers = []      # UpdateSchedulers ticked from this clock
+        # entity -> [previous position, previous rotation, position, rotation]
+        self.tracked = {}
+
+    def register(self, system, interpolate=None):
+        # system: anything with fixed_update(dt), or a plain function of dt.
+        # Entities are interpolated unless interpolate=False.
+        if any(system in scheduler for scheduler in self.schedulers):
+            raise ValueError(f'{system} is already stepped by an update scheduler')
+        if system not in self.systems:
+            self.systems.append(system)
+        if interpolate is None:
+            interpolate = isinstance(system, Entity)
+        if interpolate:
+            self.track(system)
+        return system
+
+    def unregister(self, system):
+        if system in self.systems:
+            self.systems.remove(system)
+        self.untrack(system)
+
+    def track(self, entity):
+        position, rotation = Vec3(entity.position), Vec3(entity.rotation)
+        self.tracked[entity] = [position, rotation, position, rotation]
+
+    def untrack(self, entity):
+        state = self.tracked.pop(entity, None)
+        if state and entity:
+            entity.position, entity.rotation = state[2], state[3]
+
+    def snap(self, entity):
+        # Call after moving an entity by hand (getting out of a car, respawning): outside
+        # fixed_update the move would otherwise be undone by the next tick, inside it
+        # the entity would visibly slide there
+        if entity in self.tracked:
+            self.track(entity)
+
+    def tick(self, frame_dt):
+        # Call once per frame with time.dt
+        self.accumulator += frame_dt
+
+        # Put every tracked entity back to its simulated transform before stepping
+        for entity, state in list(self.tracked.items()):
+            if not entity:
+                del self.tracked[entity]
+                continue
+            entity.position, entity.rotation = state[2], state[3]
+
+        self.steps = 0
+        while self.accumulator >= self.step and self.steps < self.max_steps:
+            for state in self.tracked.values():
+                state[0], state[1] = state[2], state[3]
+            for system in list(self.systems):
+                if hasattr(system, 'fixed_update'):
+                    system.fixed_update(self.step)
+                else:
+                    system(self.step)
+            for entity, state in self.tracked.items():
+                if entity:
+                    state[2], state[3] = Vec3(entity.position), Vec3(entity.rotation)
+            self.accumulator -= self.step
+            self.sim_time += self.step
+            self.steps += 1
+        if self.steps == self.max_steps:
+            # Too far behind: drop the backlog rather than fall further behind next frame
+            self.accumulator = min(self.accumulator, self.step)
+
+        # Draw in between the last two steps
+        self.alpha = self.accumulator / self.step
+        for entity, state in self.tracked.items():
+            if entity:
+                entity.position = lerp(state[0], state[2], self.alpha)
+                entity.rotation = lerp_angles(state[1], state[3], self.alpha)
+
+
+def lerp_angles(a, b, t):
+    # Per axis, the short way round
+    return Vec3(*(x + ((y - x + 180) % 360 - 180) * t for x, y in zip(a, b)))
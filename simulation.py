@@ -0,0 +1,401 @@
+from collections import defaultdict
+import hashlib
+from ecs import World, DRIVE_WALK, DRIVE_CAR, driver_system, movement_system
+from ai_workers import AIWorkers, AI_NONE, AI_WANDER, AI_CHASE
+from road_graph import RoadGraph, direction_of
+from traffic import Traffic
+from crowd import Crowd
+from avoidance import Avoidance
+from pooling import ObjectPool
+from static_collision import StaticCollision
+from city_layout import load_or_generate, generate_grid_layout
+from rng_streams import RngStreams, STREAM_WORLD, STREAM_CROWD, STREAM_TRAFFIC, STREAM_AI
+import numpy as np
+
+# The app.py game, without a window
+# Everything that plays the game lives here: the player, vehicles and lane traffic,
+# pedestrians, AI, the wanted level and police. Actors are ECS ids. The window is
+# just a view on top: app.py hands in make_proxy to get an Entity bound to every
+# actor and reads ui_state() for the HUD, while headless.py steps the very same
+# simulation with scripted input as fast as the CPU allows.
+# input(time) returns the keys held at that sim time, as a mapping key -> 0/1
+# that gives 0 for keys not held (Ursina's held_keys, or a ScriptedInput).
+
+CITY_SEED = 1337
+ROAD_WIDTH = 4
+# (name, height, rgba); app.py passes its own colors, they don't change the layout
+BUILDING_TYPES = (
+    ('Office', 15, (100 / 255, 100 / 255, 120 / 255, 1)),
+    ('Apartment', 20, (150 / 255, 80 / 255, 80 / 255, 1)),
+    ('Store', 10, (80 / 255, 120 / 255, 80 / 255, 1)),
+    ('Hotel', 25, (180 / 255, 150 / 255, 100 / 255, 1)),
+)
+# (name, position, scale)
+SPECIAL_BUILDINGS = (
+    ('Police Station', (50, 8, 50), (12, 16, 12)),
+    ('Hotel', (-50, 15, -50), (15, 30, 15)),
+)
+
+# Orange, pink, violet, cyan
+PEDESTRIAN_PALETTE = ((1, 0.5, 0, 1), (1, 0, 0.5, 1), (0.5, 0, 1, 1), (0, 1, 1, 1))
+
+ACTOR_PLAYER = 'player'
+ACTOR_CAR = 'car'
+ACTOR_POLICE = 'police'
+
+
+class GameState:
+    def __init__(self):
+        self.wanted_level = 0
+        self.in_vehicle = False
+        self.current_vehicle = None
+        self.police_chase_active = False
+
+
+class ScriptedInput:
+    def __init__(self, script):
+        # script: (start, end, keys) entries, e.g. (0, 2, 'wd') holds w and d for two seconds
+        self.script = script
+
+    def __call__(self, time):
+        keys = defaultdict(int)
+        for start, end, held in self.script:
+            if start <= time < end:
+                for key in held:
+                    keys[key] = 1
+        return keys
+
+
+class Actor:
+    def __init__(self, simulation, eid, kind):
+        self.simulation = simulation
+        self.world = simulation.world
+        self.eid = eid
+        self.kind = kind
+        self.proxy = None
+        self.enabled = True
+        self.visible = True
+        self.controlled = False
+        # Slot in the lane traffic while AI driven, -1 when parked or player driven
+        self.traffic_slot = -1
+        self.chase_speed = 18
+
+    @property
+    def x(self):
+        return self.world.get(self.eid, 'transform', 'x')
+
+    @property
+    def z(self):
+        return self.world.get(self.eid, 'transform', 'z')
+
+    @property
+    def position(self):
+        transform = self.world['transform']
+        return tuple(transform[axis][self.eid].item() for axis in ('x', 'y', 'z'))
+
+    @property
+    def heading(self):
+        return self.world.get(self.eid, 'transform', 'heading')
+
+    @property
+    def speed(self):
+        return self.world.get(self.eid, 'kinematics', 'speed')
+
+    def show(self, visible):
+        self.visible = visible
+        if self.proxy is not None:
+            self.proxy.visible = visible
+
+    def enable(self):
+        self.enabled = True
+        if self.proxy is not None:
+            self.proxy.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.proxy is not None:
+            self.proxy.enabled = False
+
+
+class Simulation:
+    def __init__(self, input=None, make_proxy=None, building_types=BUILDING_TYPES, vehicle_count=15,
+                 pedestrian_count=20, police_count=3, ai_workers=None, seed=None, rng_streams=None):
+        # make_proxy(actor): an Entity to draw the actor with (placed at actor.position), or None
+        # ai_workers: AI worker processes, None for one per spare core, 0 for inline
+        # seed: same seed and input, same run (or pass the RngStreams to draw from)
+        self.input = input or (lambda time: defaultdict(int))
+        self.make_proxy = make_proxy
+        self.rng_streams = rng_streams or RngStreams(seed)
+        self.time = 0.0
+        self.keys = self.input(0.0)
+        self.game_state = GameState()
+        self.events = []   # (name, data) since the last drain_events()
+        self.world = World()
+
+        # Building layout comes from a seeded, cached generator so every run gets the same city
+        self.building_types = building_types
+        self.city_layout = load_or_generate(generate_grid_layout, CITY_SEED,
+                                            building_types=[(height, rgba) for _, height, rgba in building_types])
+        # Buildings only exist as boxes in the collision table here
+        self.static_collision = StaticCollision()
+        self.static_collision.add((-100, -0.5, -100), (100, 0, 100), tag='Ground')
+        for record in self.city_layout:
+            self.add_building(building_types[record['type']][0], record['position'], record['scale'])
+        for name, position, scale in SPECIAL_BUILDINGS:
+            self.add_building(name, position, scale)
+
+        # Intersections and lanes of the road grid, for AI and spawning;
+        # AI cars follow the lanes, keep their distance and stop at red lights
+        self.road_graph = RoadGraph(road_spacing=20, road_width=ROAD_WIDTH, road_range=range(-5, 6))
+        self.traffic = Traffic(self.road_graph, 64, car_size=(2.5, 1.2, 5), speed_range=(8, 15), y=0.6,
+                               rng=self.rng_streams[STREAM_TRAFFIC])
+
+        self.player = self.add_actor(ACTOR_PLAYER, 0, 1, 0,
+                                     kinematics={'max_speed': 8, 'turn_speed': 150},
+                                     driver={'mode': DRIVE_WALK},
+                                     health={'health': 100, 'max_health': 100})
+        self.vehicles = []
+        placements = self.rng_streams[STREAM_WORLD].uniform(-80, 80, (vehicle_count, 2))
+        for x, z in placements:
+            # Park on the nearest lane, facing the traffic direction
+            x, z, heading = self.road_graph.snap_to_lane(x, z)
+            vehicle = self.add_vehicle(ACTOR_CAR, x, z, heading)
+            self.join_traffic(vehicle)
+            self.vehicles.append(vehicle)
+        # Police cars are built up front and recycled, never created mid-chase
+        self.police_pool = ObjectPool(lambda: self.add_vehicle(ACTOR_POLICE, 0, 0, 0), reset=self.place_police,
+                                      retire=self.retire_police, size=police_count)
+
+        # Pedestrians: their random turns come from the AI workers, the crowd step only walks
+        # them, around each other, the buildings and the cars
+        self.crowd = Crowd(pedestrian_count, speed_range=(2, 4), timer_range=None, bounds=90, y=0.8,
+                          rng=self.rng_streams[STREAM_CROWD],
+                          avoidance=Avoidance(static_collision=self.static_collision, top=1.6))
+        self.crowd.spawn(pedestrian_count, (-80, -80, 80, 80), palette=PEDESTRIAN_PALETTE)
+        self.ai_workers = AIWorkers(pedestrian_count + 16, workers=ai_workers,
+                                     seed=self.rng_streams.seed_for(STREAM_AI))
+        self.ai_chasers = []   # chaser ids in the last submit, in slot order
+
+        for system in (self.input_system, self.traffic_system, self.police_target_system, self.ai_system,
+                       driver_system, movement_system, self.collision_system):
+            self.world.add_system(system)
+
+    def add_building(self, name, position, scale):
+        self.static_collision.add(tuple(p - s / 2 for p, s in zip(position, scale)),
+                                  tuple(p + s / 2 for p, s in zip(position, scale)), tag=name)
+
+    def add_actor(self, kind, x, y, z, heading=0, **components):
+        eid = self.world.create(transform={'x': x, 'y': y, 'z': z, 'heading': heading}, **components)
+        actor = Actor(self, eid, kind)
+        if self.make_proxy is not None:
+            actor.proxy = self.make_proxy(actor)
+            if actor.proxy is not None:
+                self.world.bind(eid, actor.proxy)
+        return actor
+
+    def add_vehicle(self, kind, x, z, heading):
+        return self.add_actor(kind, x, 0.6, z, heading,
+                              kinematics={'max_speed': 25, 'reverse_speed': 12.5, 'acceleration': 15,
+                                          'braking': 20, 'coast': 10, 'turn_speed': 80})
+
+    def emit(self, name, data=None):
+        self.events.append((name, data))
+
+    def drain_events(self):
+        events, self.events = self.events, []
+        return events
+
+    # Vehicles
+
+    def join_traffic(self, vehicle):
+        vehicle.traffic_slot = self.traffic.add(vehicle.x, vehicle.z, direction_of(vehicle.heading))
+
+    def take_control(self, vehicle):
+        vehicle.controlled = True
+        if vehicle.traffic_slot >= 0:
+            self.traffic.remove(vehicle.traffic_slot)
+            vehicle.traffic_slot = -1
+        self.world.remove(vehicle.eid, 'chaser')
+        self.world.add(vehicle.eid, 'driver', mode=DRIVE_CAR)
+        self.world.set(vehicle.eid, 'kinematics', 'speed', 0)
+
+    def release_control(self, vehicle):
+        # Cars stay parked where the player left them, police go back to chasing
+        vehicle.controlled = False
+        self.world.remove(vehicle.eid, 'driver')
+        self.world.set(vehicle.eid, 'kinematics', 'speed', 0)
+        if vehicle.kind == ACTOR_POLICE:
+            self.world.add(vehicle.eid, 'chaser', chase_speed=vehicle.chase_speed)
+
+    def try_enter_vehicle(self):
+        player = self.player
+        for vehicle in self.vehicles:
+            if np.hypot(vehicle.x - player.x, vehicle.z - player.z) < 3:
+                self.game_state.in_vehicle = True
+                self.game_state.current_vehicle = vehicle
+                self.world.remove(player.eid, 'driver')
+                self.world.set(player.eid, 'kinematics', 'speed', 0)
+                player.show(False)
+                self.take_control(vehicle)
+                break
+
+    def exit_vehicle(self):
+        game_state = self.game_state
+        if game_state.in_vehicle and game_state.current_vehicle:
+            game_state.in_vehicle = False
+            vehicle = game_state.current_vehicle
+            self.world.place(self.player.eid, vehicle.x + 2, 1, vehicle.z)
+            self.emit('teleport', self.player)
+            self.world.add(self.player.eid, 'driver', mode=DRIVE_WALK)
+            self.player.show(True)
+            self.release_control(vehicle)
+            game_state.current_vehicle = None
+
+    # Police
+
+    def place_police(self, police_car, x, z, heading):
+        self.world.place(police_car.eid, x, 0.6, z, heading=heading)
+        self.world.add(police_car.eid, 'chaser', chase_speed=police_car.chase_speed)
+        police_car.controlled = False
+        self.emit('teleport', police_car)
+
+    def retire_police(self, police_car):
+        self.world.remove(police_car.eid, 'chaser')
+        self.world.remove(police_car.eid, 'driver')
+        self.world.set(police_car.eid, 'kinematics', 'speed', 0)
+
+    def spawn_police(self):
+        self.game_state.police_chase_active = True
+        x, z = self.player.x, self.player.z
+        for px, pz in ((x + 50, z), (x - 50, z), (x, z + 50))[:self.game_state.wanted_level]:
+            # Police come in on a road lane, not inside a building
+            police_car = self.police_pool.acquire(*self.road_graph.snap_to_lane(px, pz))
+            self.vehicles.append(police_car)
+            self.emit('police', police_car)
+
+    # Systems, around the generic ones from ecs.py
+
+    def input_system(self, world, dt):
+        # Keys drive whoever the player controls
+        keys, game_state = self.keys, self.game_state
+        if game_state.in_vehicle:
+            if keys['f']:
+                self.exit_vehicle()
+        elif keys['e']:
+            self.try_enter_vehicle()
+        eid = game_state.current_vehicle.eid if game_state.in_vehicle else self.player.eid
+        world.set(eid, 'driver', 'throttle', keys['w'] - keys['s'])
+        world.set(eid, 'driver', 'steer', keys['d'] - keys['a'])
+
+    def traffic_system(self, world, dt):
+        # AI vehicles are driven by the lane traffic
+        following = [v for v in self.vehicles if v.traffic_slot >= 0]
+        if not following:
+            return
+        ids = np.array([v.eid for v in following])
+        slots = np.array([v.traffic_slot for v in following])
+        transform = world['transform']
+        transform['x'][ids] = self.traffic.x[slots]
+        transform['z'][ids] = self.traffic.z[slots]
+        transform['heading'][ids] = self.traffic.heading[slots]
+
+    def police_target_system(self, world, dt):
+        # The police chase the player, or the car the player is in
+        game_state = self.game_state
+        target = game_state.current_vehicle.eid if game_state.in_vehicle else self.player.eid
+        world['chaser']['target'][world.query('chaser')] = target
+
+    def ai_system(self, world, dt):
+        # Pedestrian wandering and police steering are decided on the AI workers: apply
+        # what they decided since the last step, then hand them this step's state.
+        # Slots: the crowd first, then the chasers.
+        ai_workers, crowd = self.ai_workers, self.crowd
+        ai_workers.collect()
+        walkers = crowd.capacity
+        turned = crowd.walking & (ai_workers.turned[:walkers] > 0)
+        crowd.heading[turned] = ai_workers.out_heading[:walkers][turned]
+        chasers = np.array(self.ai_chasers, dtype=np.int64)
+        slots = walkers + np.arange(len(chasers))
+        # Police sent back to the pool in the meantime don't get a decision
+        still = world.masks['chaser'][chasers]
+        chasers, slots = chasers[still], slots[still]
+        world['transform']['heading'][chasers] = ai_workers.out_heading[slots]
+        world['kinematics']['speed'][chasers] = np.where(ai_workers.moving[slots] > 0,
+                                                         world['chaser']['chase_speed'][chasers], 0)
+
+        ai_workers.kind[:walkers] = np.where(crowd.walking, AI_WANDER, AI_NONE)
+        ai_workers.heading[:walkers] = crowd.heading
+        ai_workers.turn_rate[:walkers] = 0.6
+        chasers = world.query('transform', 'kinematics', 'chaser')[:ai_workers.capacity - walkers]
+        slots = walkers + np.arange(len(chasers))
+        transform = world['transform']
+        target = world['chaser']['target'][chasers]
+        target = np.where(target >= 0, target, chasers)
+        ai_workers.kind[slots] = AI_CHASE
+        ai_workers.x[slots] = transform['x'][chasers]
+        ai_workers.z[slots] = transform['z'][chasers]
+        ai_workers.target_x[slots] = transform['x'][target]
+        ai_workers.target_z[slots] = transform['z'][target]
+        ai_workers.stop_distance[slots] = world['chaser']['stop_distance'][chasers]
+        self.ai_chasers = list(chasers)
+        ai_workers.submit(dt, walkers + len(chasers))
+
+    def collision_system(self, world, dt):
+        # Keep the player out of buildings, stop the player's car against them
+        transform = world['transform']
+        if self.game_state.in_vehicle:
+            eid = self.game_state.current_vehicle.eid
+            x, z, hit = self.static_collision.push_out(transform['x'][eid].item(), transform['z'][eid].item(),
+                                                       1.5, 0.1, 1.2)
+            if hit >= 0:
+                world.set(eid, 'kinematics', 'speed', 0)
+        else:
+            eid = self.player.eid
+            x, z, _ = self.static_collision.push_out(transform['x'][eid].item(), transform['z'][eid].item(),
+                                                     0.4, 0.1, 1.9)
+        transform['x'][eid], transform['z'][eid] = x, z
+
+    def crowd_step(self, dt):
+        crowd, game_state = self.crowd, self.game_state
+        cars = np.array([v.eid for v in self.vehicles if v.enabled], dtype=np.int64)
+        transform = self.world['transform']
+        crowd.step(dt, obstacles=(transform['x'][cars], transform['z'][cars], np.full(len(cars), 2.5)))
+
+        # Pedestrians hit by the car the player is driving
+        vehicle = game_state.current_vehicle
+        if game_state.in_vehicle and vehicle and abs(vehicle.speed) > 5:
+            hits = crowd.near(vehicle.x, vehicle.z, 3)
+            crowd.knock_down(hits)
+            for _ in hits:
+                game_state.wanted_level += 1
+                if game_state.wanted_level >= 2 and not game_state.police_chase_active:
+                    self.spawn_police()
+                self.emit('wanted', game_state.wanted_level)
+
+    def step(self, dt):
+        self.time += dt
+        self.keys = self.input(self.time)
+        self.traffic.step(dt)
+        self.world.step(dt)
+        self.crowd_step(dt)
+
+    def ui_state(self):
+        game_state = self.game_state
+        if game_state.in_vehicle:
+            info = f'Speed: {abs(game_state.current_vehicle.speed):.1f} | F: Exit Vehicle'
+        else:
+            info = 'WASD: Move | E: Enter Vehicle'
+        return {'wanted': f'Wanted: {"⭐" * game_state.wanted_level} {game_state.wanted_level}', 'info': info}
+
+    def state_digest(self):
+        # Short hash of the simulated state: same seed and input must give the same digest
+        digest = hashlib.sha1()
+        world = self.world
+        for values in (*world['transform'].values(), world['kinematics']['speed'], self.crowd.x, self.crowd.z,
+                       self.crowd.heading, self.crowd.state, self.traffic.edge, self.traffic.s, self.traffic.speed):
+            digest.update(values.tobytes())
+        digest.update(repr((self.game_state.wanted_level, self.game_state.in_vehicle)).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def close(self):
+        self.ai_workers.close()
@@ -0,0 +1,115 @@
+import numpy as np
+
+# Sleep/wake for idle actors
+# Parked cars and the like never move until someone gets in, yet as plain
+# entities they get an update call and a collider every frame. Asleep, an actor
+# is only an (x, z) in a packed array: no update (entity.ignore), no collision,
+# and gameplay scans look at the awake ones only. Actors wake when the focus
+# (the player) comes near, on impact (wake_near) or when AI asks for one (wake),
+# and doze off again once they are idle and far enough away.
+# on_sleep/on_wake(actor) let the owner drop a sleeping actor from anything else
+# that steps or tracks it (the fixed clock's interpolation, batched dynamics).
+
+WAKE_PROXIMITY = 'proximity'
+WAKE_IMPACT = 'impact'
+WAKE_REQUEST = 'request'
+
+
+class SleepSystem:
+    def __init__(self, wake_radius=15, sleep_radius=25, can_sleep=None, on_sleep=None, on_wake=None):
+        # can_sleep(actor): False while the actor is busy (e.g. being driven)
+        self.wake_radius = wake_radius
+        self.sleep_radius = sleep_radius
+        self.can_sleep = can_sleep
+        self.on_sleep = on_sleep
+        self.on_wake = on_wake
+        self.active = []
+        self.dormant = []
+        self.dormant_xz = np.zeros((0, 2), dtype=np.float32)
+        self.wakes = {WAKE_PROXIMITY: 0, WAKE_IMPACT: 0, WAKE_REQUEST: 0}
+
+    @property
+    def active_count(self):
+        return len(self.active)
+
+    @property
+    def dormant_count(self):
+        return len(self.dormant)
+
+    def add(self, actor, asleep=True):
+        if asleep:
+            self.put_to_sleep(actor)
+        else:
+            self.active.append(actor)
+        return actor
+
+    def remove(self, actor):
+        if actor in self.active:
+            self.active.remove(actor)
+        elif actor in self.dormant:
+            self.wake(actor, None)
+            self.active.remove(actor)
+
+    def put_to_sleep(self, actor):
+        if actor in self.active:
+            self.active.remove(actor)
+        # The collider is only switched off, not destroyed, so waking up is cheap
+        actor.sleep_collision = actor.collision
+        actor.collision = False
+        actor.ignore = True
+        self.dormant.append(actor)
+        self.rebuild()
+        if self.on_sleep is not None:
+            self.on_sleep(actor)
+
+    def wake(self, actor, reason=WAKE_REQUEST):
+        if actor not in self.dormant:
+            return False
+        self.dormant.remove(actor)
+        self.rebuild()
+        actor.ignore = False
+        actor.collision = actor.sleep_collision
+        self.active.append(actor)
+        if self.on_wake is not None:
+            self.on_wake(actor)
+        if reason:
+            self.wakes[reason] += 1
+        return True
+
+    def wake_near(self, x, z, radius, reason=WAKE_IMPACT):
+        # Wake everything asleep within radius of (x, z), e.g. around a crash
+        if not self.dormant:
+            return []
+        near = ((self.dormant_xz[:, 0] - x) ** 2 + (self.dormant_xz[:, 1] - z) ** 2) < radius * radius
+        woken = [self.dormant[i] for i in np.flatnonzero(near)]
+        for actor in woken:
+            self.wake(actor, reason)
+        return woken
+
+    def wake_touching(self, xs, zs, radius, reason=WAKE_IMPACT):
+        # Wake everything asleep within radius of any of the points (a batch of moving cars)
+        if not self.dormant or not len(xs):
+            return []
+        dx = self.dormant_xz[:, 0, None] - np.asarray(xs, dtype=np.float32)[None, :]
+        dz = self.dormant_xz[:, 1, None] - np.asarray(zs, dtype=np.float32)[None, :]
+        hit = (dx * dx + dz * dz < radius * radius).any(axis=1)
+        woken = [self.dormant[i] for i in np.flatnonzero(hit)]
+        for actor in woken:
+            self.wake(actor, reason)
+        return woken
+
+    def rebuild(self):
+        self.dormant_xz = np.array([(actor.x, actor.z) for actor in self.dormant], dtype=np.float32).reshape(-1, 2)
+
+    def update(self, focus):
+        # Call once per frame with the player's position
+        self.wake_near(focus[0], focus[2], self.wake_radius, WAKE_PROXIMITY)
+        for actor in list(self.active):
+            if self.can_sleep is not None and not self.can_sleep(actor):
+                continue
+            dx, dz = actor.x - focus[0], actor.z - focus[2]
+            if dx * dx + dz * dz > self.sleep_radius * self.sleep_radius:
+                self.put_to_sleep(actor)
+
+    def stats_text(self):
+        return f'{self.dormant_count} asleep / {self.active_count} awake'
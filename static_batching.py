@@ -0,0 +1,152 @@
+from ursina import *
+import math
+
+# Static geometry batching
+# Merges static cube entities that share a shader and texture into a few
+# combined meshes, so the city costs a handful of draw calls instead of one
+# per road and building. Each batch keeps the bounds of what went into it
+# (batch_bounds), for LOD, culling and collision tables.
+
+# Faces of a unit cube: (normal, four corners), wound the way Ursina's own
+# Plane mesh is, so the front side faces outwards.
+BOX_FACES = (
+    ((1, 0, 0), ((.5, .5, -.5), (.5, -.5, -.5), (.5, -.5, .5), (.5, .5, .5))),
+    ((-1, 0, 0), ((-.5, .5, .5), (-.5, -.5, .5), (-.5, -.5, -.5), (-.5, .5, -.5))),
+    ((0, 1, 0), ((.5, .5, .5), (-.5, .5, .5), (-.5, .5, -.5), (.5, .5, -.5))),
+    ((0, -1, 0), ((.5, -.5, -.5), (-.5, -.5, -.5), (-.5, -.5, .5), (.5, -.5, .5))),
+    ((0, 0, 1), ((.5, -.5, .5), (-.5, -.5, .5), (-.5, .5, .5), (.5, .5, .5))),
+    ((0, 0, -1), ((.5, .5, -.5), (-.5, .5, -.5), (-.5, -.5, -.5), (.5, -.5, -.5))),
+)
+
+
+def face_uv(normal, corner):
+    # Walls get v along the height, top and bottom are mapped from above
+    x, y, z = corner
+    if normal[0]:
+        return (z * normal[0] + .5, y + .5)
+    if normal[2]:
+        return (-x * normal[2] + .5, y + .5)
+    return (x + .5, z + .5)
+
+
+class MeshBuilder:
+    def __init__(self):
+        self.vertices = []
+        self.triangles = []
+        self.uvs = []
+        self.colors = []
+        self.normals = []
+
+    def add_box(self, position, scale, box_color, rotation_y=0, uv_rect=(0, 0, 1, 1), shades=None):
+        # shades: optional brightness per vertex (24 values, 4 per face in BOX_FACES order)
+        px, py, pz = position
+        sx, sy, sz = scale
+        cos_r = math.cos(math.radians(rotation_y))
+        sin_r = math.sin(math.radians(rotation_y))
+        u0, v0, u1, v1 = uv_rect
+
+        for face_index, (normal, corners) in enumerate(BOX_FACES):
+            start = len(self.vertices)
+            nx, ny, nz = normal
+            world_normal = (nx * cos_r + nz * sin_r, ny, -nx * sin_r + nz * cos_r)
+
+            for corner_index, corner in enumerate(corners):
+                x, y, z = corner[0] * sx, corner[1] * sy, corner[2] * sz
+                self.vertices.append(Vec3(
+                    px + x * cos_r + z * sin_r,
+                    py + y,
+                    pz - x * sin_r + z * cos_r
+                ))
+                u, v = face_uv(normal, corner)
+                self.uvs.append((u0 + u * (u1 - u0), v0 + v * (v1 - v0)))
+                self.normals.append(world_normal)
+
+                if shades is not None:
+                    shade = shades[face_index * 4 + corner_index]
+                    self.colors.append(Color(box_color[0] * shade, box_color[1] * shade, box_color[2] * shade, box_color[3]))
+                else:
+                    self.colors.append(box_color)
+
+            self.triangles.append((start, start + 1, start + 2, start + 3))
+
+    def build(self):
+        return Mesh(
+            vertices=self.vertices,
+            triangles=self.triangles,
+            uvs=self.uvs,
+            colors=self.colors,
+            normals=self.normals,
+            static=True
+        )
+
+
+def box_bounds(position, scale, rotation_y=0):
+    # Axis aligned bounds of a (possibly yawed) box, as (min, max) tuples
+    sx, sz = scale[0] / 2, scale[2] / 2
+    cos_r = abs(math.cos(math.radians(rotation_y)))
+    sin_r = abs(math.sin(math.radians(rotation_y)))
+    half_x = sx * cos_r + sz * sin_r
+    half_z = sx * sin_r + sz * cos_r
+    half_y = scale[1] / 2
+    return (
+        (position[0] - half_x, position[1] - half_y, position[2] - half_z),
+        (position[0] + half_x, position[1] + half_y, position[2] + half_z),
+    )
+
+
+class StaticBatcher:
+    def __init__(self):
+        self.groups = {}
+        self.batched_entities = []
+
+    def material_key(self, entity):
+        shader = entity.shader.name if entity.shader else None
+        texture = entity.texture.name if entity.texture else None
+        return (shader, texture)
+
+    def add(self, entity, tag=None, group=None, shades=None):
+        # Only plain cubes are merged, anything else is left alone.
+        # shades: optional baked brightness per vertex, see MeshBuilder.add_box
+        if not entity.model or entity.model.name != 'cube':
+            return False
+
+        key = self.material_key(entity) + (group,)
+        if key not in self.groups:
+            self.groups[key] = {
+                'shader': entity.shader,
+                'texture': entity.texture,
+                'builder': MeshBuilder(),
+                'bounds': [],
+            }
+
+        position = tuple(entity.world_position)
+        scale = tuple(entity.world_scale)
+        rotation_y = entity.world_rotation_y
+        self.groups[key]['builder'].add_box(position, scale, entity.color, rotation_y, shades=shades)
+
+        bmin, bmax = box_bounds(position, scale, rotation_y)
+        record = {'min': bmin, 'max': bmax, 'color': tuple(entity.color), 'tag': tag, 'group': group}
+        self.groups[key]['bounds'].append(record)
+        self.batched_entities.append(entity)
+        return True
+
+    def build(self, parent=scene):
+        # Replace the source entities with one combined entity per material (and group)
+        combined = []
+        for (shader_name, texture_name, group), data in self.groups.items():
+            batch = Entity(
+                parent=parent,
+                model=data['builder'].build(),
+                texture=data['texture'],
+                shader=data['shader'],
+            )
+            batch.group = group
+            batch.batch_bounds = data['bounds']
+            combined.append(batch)
+
+        for entity in self.batched_entities:
+            destroy(entity)
+
+        self.groups = {}
+        self.batched_entities = []
+        return combined
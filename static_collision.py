@@ -0,0 +1,206 @@
+import math
+from array import array
+
+# Static collision table
+# Everything that never moves (ground, roads, buildings) is registered once as an
+# axis aligned box in packed arrays instead of getting its own collider node.
+# A uniform grid over x/z maps each cell to the boxes touching it, so point,
+# sphere and ray queries only look at a handful of boxes no matter how big the
+# city gets. Dynamic actors keep their own colliders where they need them.
+
+
+class StaticCollision:
+    def __init__(self, cell_size=20):
+        self.cell_size = cell_size
+        self.min_x = array('f')
+        self.min_y = array('f')
+        self.min_z = array('f')
+        self.max_x = array('f')
+        self.max_y = array('f')
+        self.max_z = array('f')
+        self.alive = array('b')
+        self.tags = []
+        # Removed slots are reused, so streaming chunks in and out doesn't grow the arrays
+        self.free = []
+        self.cells = {}
+        # Box ids registered together (e.g. one streamed chunk), removed together
+        self.groups = {}
+
+    def __len__(self):
+        return len(self.alive) - len(self.free)
+
+    def cell_range(self, min_x, min_z, max_x, max_z):
+        s = self.cell_size
+        return (math.floor(min_x / s), math.floor(min_z / s), math.floor(max_x / s), math.floor(max_z / s))
+
+    def box_cells(self, box):
+        cx0, cz0, cx1, cz1 = self.cell_range(self.min_x[box], self.min_z[box], self.max_x[box], self.max_z[box])
+        return [(cx, cz) for cx in range(cx0, cx1 + 1) for cz in range(cz0, cz1 + 1)]
+
+    def add(self, bmin, bmax, tag=None):
+        if self.free:
+            box = self.free.pop()
+            self.min_x[box], self.min_y[box], self.min_z[box] = bmin
+            self.max_x[box], self.max_y[box], self.max_z[box] = bmax
+            self.alive[box] = 1
+            self.tags[box] = tag
+        else:
+            box = len(self.alive)
+            for values, value in zip((self.min_x, self.min_y, self.min_z, self.max_x, self.max_y, self.max_z),
+                                     (*bmin, *bmax)):
+                values.append(value)
+            self.alive.append(1)
+            self.tags.append(tag)
+
+        for key in self.box_cells(box):
+            self.cells.setdefault(key, []).append(box)
+        return box
+
+    def remove(self, box):
+        if not self.alive[box]:
+            return
+        for key in self.box_cells(box):
+            cell = self.cells.get(key)
+            if cell:
+                cell.remove(box)
+                if not cell:
+                    del self.cells[key]
+        self.alive[box] = 0
+        self.tags[box] = None
+        self.free.append(box)
+
+    def add_group(self, key, boxes):
+        # boxes: (min, max) or (min, max, tag)
+        self.groups[key] = [self.add(*box) for box in boxes]
+        return self.groups[key]
+
+    def remove_group(self, key):
+        for box in self.groups.pop(key, ()):
+            self.remove(box)
+
+    def bounds(self, box):
+        return ((self.min_x[box], self.min_y[box], self.min_z[box]),
+                (self.max_x[box], self.max_y[box], self.max_z[box]))
+
+    def tag(self, box):
+        return self.tags[box]
+
+    def candidates(self, min_x, min_z, max_x, max_z):
+        cx0, cz0, cx1, cz1 = self.cell_range(min_x, min_z, max_x, max_z)
+        if cx0 == cx1 and cz0 == cz1:
+            return self.cells.get((cx0, cz0), ())
+        found = set()
+        for cx in range(cx0, cx1 + 1):
+            for cz in range(cz0, cz1 + 1):
+                found.update(self.cells.get((cx, cz), ()))
+        return found
+
+    def query_point(self, x, y, z):
+        # First box containing the point, or -1
+        for box in self.candidates(x, z, x, z):
+            if (self.min_x[box] <= x <= self.max_x[box] and self.min_z[box] <= z <= self.max_z[box]
+                    and self.min_y[box] <= y <= self.max_y[box]):
+                return box
+        return -1
+
+    def query_sphere(self, x, y, z, radius):
+        # Every box the sphere touches
+        hits = []
+        for box in self.candidates(x - radius, z - radius, x + radius, z + radius):
+            dx = max(self.min_x[box] - x, 0, x - self.max_x[box])
+            dy = max(self.min_y[box] - y, 0, y - self.max_y[box])
+            dz = max(self.min_z[box] - z, 0, z - self.max_z[box])
+            if dx * dx + dy * dy + dz * dz <= radius * radius:
+                hits.append(box)
+        return hits
+
+    def ray_box(self, box, origin, direction, max_distance):
+        # Slab test, distance along the ray or None
+        near, far = 0.0, max_distance
+        for o, d, low, high in ((origin[0], direction[0], self.min_x[box], self.max_x[box]),
+                                (origin[1], direction[1], self.min_y[box], self.max_y[box]),
+                                (origin[2], direction[2], self.min_z[box], self.max_z[box])):
+            if abs(d) < 1e-9:
+                if o < low or o > high:
+                    return None
+                continue
+            t0, t1 = (low - o) / d, (high - o) / d
+            if t0 > t1:
+                t0, t1 = t1, t0
+            near, far = max(near, t0), min(far, t1)
+            if near > far:
+                return None
+        return near
+
+    def raycast(self, origin, direction, max_distance=100):
+        # Closest hit as (box, distance), or (-1, None). direction must be normalized.
+        # Walks the grid cells the ray crosses in order and stops at the first cell with a hit.
+        s = self.cell_size
+        cx, cz = math.floor(origin[0] / s), math.floor(origin[2] / s)
+        step_x = 1 if direction[0] > 0 else -1
+        step_z = 1 if direction[2] > 0 else -1
+        if abs(direction[0]) > 1e-9:
+            next_x = ((cx + (step_x > 0)) * s - origin[0]) / direction[0]
+            delta_x = s / abs(direction[0])
+        else:
+            next_x = delta_x = math.inf
+        if abs(direction[2]) > 1e-9:
+            next_z = ((cz + (step_z > 0)) * s - origin[2]) / direction[2]
+            delta_z = s / abs(direction[2])
+        else:
+            next_z = delta_z = math.inf
+
+        tested = set()
+        best, best_distance = -1, None
+        travelled = 0.0
+        while travelled <= max_distance:
+            for box in self.cells.get((cx, cz), ()):
+                if box in tested:
+                    continue
+                tested.add(box)
+                hit = self.ray_box(box, origin, direction, max_distance)
+                if hit is not None and (best_distance is None or hit < best_distance):
+                    best, best_distance = box, hit
+            # A hit inside the cells walked so far can't be beaten by later cells
+            if best_distance is not None and best_distance <= min(next_x, next_z):
+                break
+            if next_x < next_z:
+                travelled = next_x
+                next_x += delta_x
+                cx += step_x
+            else:
+                travelled = next_z
+                next_z += delta_z
+                cz += step_z
+        return best, best_distance
+
+    def push_out(self, x, z, radius, bottom, top):
+        # Move a circle of the given radius (spanning bottom..top in y) out of every
+        # box it overlaps, along the shortest way out. Returns (x, z, hit box or -1).
+        hit = -1
+        for box in self.candidates(x - radius, z - radius, x + radius, z + radius):
+            if self.max_y[box] <= bottom or self.min_y[box] >= top:
+                continue
+            min_x, max_x = self.min_x[box] - radius, self.max_x[box] + radius
+            min_z, max_z = self.min_z[box] - radius, self.max_z[box] + radius
+            if not (min_x < x < max_x and min_z < z < max_z):
+                continue
+            exits = ((x - min_x, min_x, None), (max_x - x, max_x, None), (z - min_z, None, min_z), (max_z - z, None, max_z))
+            _, new_x, new_z = min(exits, key=lambda e: e[0])
+            if new_x is not None:
+                x = new_x
+            else:
+                z = new_z
+            hit = box
+        return x, z, hit
+
+    # Bulk versions, one call per frame for a whole crowd or a batch of shots
+
+    def query_points(self, points):
+        return [self.query_point(*point) for point in points]
+
+    def query_spheres(self, spheres):
+        return [self.query_sphere(*sphere) for sphere in spheres]
+
+    def raycasts(self, rays, max_distance=100):
+        return [self.raycast(origin, direction, max_distance) for origin, direction in rays]
@@ -0,0 +1,244 @@
+from instancing import InstancedLayer
+import numpy as np
+
+# Lane traffic over the road graph
+# Every car is one slot in a set of NumPy arrays: the directed lane edge it is on,
+# how far along it is, its speed and the edge it will take at the next junction.
+# Each step the cars are sorted by (edge, distance), so every lane is one slice of
+# the sorted order (lane_start/lane_end) and a car's leader is simply the next
+# entry, or the last car of the lane it turns into. Intersections run two signal
+# phases, north/south and east/west, with an all-red gap in between.
+
+CAR_FREE = 0
+CAR_DRIVING = 1
+
+
+class Traffic:
+    def __init__(self, graph, capacity, car_size=(2, 1, 4), speed_range=(8, 15), acceleration=6, braking=12,
+                 min_gap=2, signal_period=8, clearance=1.5, y=0.6, rng=None):
+        self.graph = graph
+        self.capacity = capacity
+        self.car_size = car_size
+        self.car_length = car_size[2]
+        self.speed_range = speed_range
+        self.acceleration = acceleration
+        self.braking = braking
+        self.min_gap = min_gap
+        self.signal_period = signal_period
+        self.clearance = clearance
+        self.y = y
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.time = 0.0
+
+        # The graph's arrays as NumPy views
+        self.node_x = np.frombuffer(graph.node_x, dtype=np.float32)
+        self.node_z = np.frombuffer(graph.node_z, dtype=np.float32)
+        self.node_out = np.frombuffer(graph.node_out, dtype=np.int32).reshape(-1, 4)
+        self.edge_from = np.frombuffer(graph.edge_from, dtype=np.int32)
+        self.edge_to = np.frombuffer(graph.edge_to, dtype=np.int32)
+        self.edge_dir = np.frombuffer(graph.edge_dir, dtype=np.int8).astype(np.int32)
+        self.edge_length = np.frombuffer(graph.edge_length, dtype=np.float32)
+        # Cars wait with their front bumper at the edge of the crossing
+        self.stop_line = self.edge_length - graph.road_width / 2 - self.car_length / 2
+        # Junctions don't all switch at once
+        self.signal_offset = self.rng.uniform(0, signal_period * 2, graph.node_count)
+
+        self.edge = np.zeros(capacity, dtype=np.int32)
+        self.next_edge = np.zeros(capacity, dtype=np.int32)
+        self.s = np.zeros(capacity, dtype=np.float32)          # distance along the edge
+        self.speed = np.zeros(capacity, dtype=np.float32)
+        self.max_speed = np.zeros(capacity, dtype=np.float32)
+        self.state = np.full(capacity, CAR_FREE, dtype=np.int8)
+        self.colors = np.ones((capacity, 4), dtype=np.float32)
+        self.x = np.zeros(capacity, dtype=np.float32)
+        self.z = np.zeros(capacity, dtype=np.float32)
+        self.heading = np.zeros(capacity, dtype=np.float32)  # degrees, like rotation_y
+
+        # Per-lane occupancy, rebuilt every step: order holds the driving slots
+        # sorted by (edge, s), lane k is order[lane_start[k]:lane_end[k]]
+        self.order = np.zeros(0, dtype=np.int64)
+        self.lane_start = np.zeros(graph.edge_count, dtype=np.int64)
+        self.lane_end = np.zeros(graph.edge_count, dtype=np.int64)
+
+    @property
+    def driving(self):
+        return self.state == CAR_DRIVING
+
+    @property
+    def count(self):
+        return int(np.count_nonzero(self.driving))
+
+    def choose_turns(self, edges):
+        # Random exit at the end of each edge, no U-turns unless it's a dead end
+        outs = self.node_out[self.edge_to[edges]]
+        back = (self.edge_dir[edges] + 2) % 4
+        valid = outs >= 0
+        valid[np.arange(len(edges)), back] = False
+        dead_end = ~valid.any(axis=1)
+        valid[dead_end, back[dead_end]] = True
+        score = np.where(valid, self.rng.random(outs.shape), -1)
+        return outs[np.arange(len(edges)), score.argmax(axis=1)]
+
+    def spawn(self, count, palette=None):
+        # Spread cars over random lanes, queued a safe distance apart.
+        # Returns the slots used (fewer if the crowd or the lanes are full).
+        slots = np.flatnonzero(self.state == CAR_FREE)[:count]
+        edges = self.rng.integers(0, self.graph.edge_count, len(slots)).astype(np.int32)
+        # Rank of each new car within its lane, plus the cars already there
+        self.rebuild_lanes()
+        order = np.argsort(edges, kind='stable')
+        edges = edges[order]
+        first = np.searchsorted(edges, edges, 'left')
+        rank = np.arange(len(edges)) - first + (self.lane_end[edges] - self.lane_start[edges])
+        spacing = self.car_length + self.min_gap * 2
+        s = self.stop_line[edges] - rank * spacing
+        fits = s >= self.car_length / 2
+        slots, edges, s = slots[fits], edges[fits], s[fits]
+        n = len(slots)
+        self.edge[slots] = edges
+        self.s[slots] = s
+        self.next_edge[slots] = self.choose_turns(edges)
+        self.max_speed[slots] = self.rng.uniform(*self.speed_range, n)
+        self.speed[slots] = 0
+        if palette is None:
+            self.colors[slots, :3] = self.rng.random((n, 3))
+            self.colors[slots, 3] = 1
+        else:
+            self.colors[slots] = np.asarray(palette, dtype=np.float32)[self.rng.integers(0, len(palette), n)]
+        self.state[slots] = CAR_DRIVING
+        self.rebuild_lanes()
+        self.update_transforms()
+        return slots
+
+    def add(self, x, z, direction, speed=0, color=None):
+        # One car joining at (x, z) heading along a grid direction (e.g. an AI car
+        # taking over a parked vehicle). Returns the slot, or -1 if full or off the roads.
+        free = np.flatnonzero(self.state == CAR_FREE)
+        edge = self.graph.edge_at(x, z, direction)
+        if not len(free) or edge < 0:
+            return -1
+        slot = int(free[0])
+        ax, az = self.node_x[self.edge_from[edge]], self.node_z[self.edge_from[edge]]
+        dx, dz = ((0, 1), (1, 0), (0, -1), (-1, 0))[direction]
+        self.edge[slot] = edge
+        self.s[slot] = min(max((x - ax) * dx + (z - az) * dz, 0), self.edge_length[edge])
+        self.next_edge[slot] = self.choose_turns(np.array([edge]))[0]
+        self.max_speed[slot] = self.rng.uniform(*self.speed_range)
+        self.speed[slot] = speed
+        if color is not None:
+            self.colors[slot] = color
+        self.state[slot] = CAR_DRIVING
+        self.rebuild_lanes()
+        self.update_transforms()
+        return slot
+
+    def remove(self, slots):
+        self.state[slots] = CAR_FREE
+        self.rebuild_lanes()
+
+    def rebuild_lanes(self):
+        driving = np.flatnonzero(self.driving)
+        self.order = driving[np.lexsort((self.s[driving], self.edge[driving]))]
+        edges = self.edge[self.order]
+        lanes = np.arange(self.graph.edge_count)
+        self.lane_start = np.searchsorted(edges, lanes, 'left')
+        self.lane_end = np.searchsorted(edges, lanes, 'right')
+
+    def lane_cars(self, edge):
+        # Slots on a lane, back to front
+        return self.order[self.lane_start[edge]:self.lane_end[edge]]
+
+    def green(self, nodes, directions):
+        # Is the light green at nodes for traffic travelling in directions?
+        phase_time = (self.time + self.signal_offset[nodes]) % (self.signal_period * 2)
+        axis = (phase_time >= self.signal_period).astype(np.int32)
+        in_clearance = phase_time % self.signal_period > self.signal_period - self.clearance
+        return (directions % 2 == axis) & ~in_clearance
+
+    def step(self, dt):
+        self.time += dt
+        order = self.order
+        if not len(order) or dt <= 0:
+            return
+        edge = self.edge[order]
+        s = self.s[order]
+        length = self.edge_length[edge]
+
+        # Gap to the car in front on the same lane: the next entry in the sorted order
+        gap = np.full(len(order), np.inf, dtype=np.float32)
+        same_lane = edge[1:] == edge[:-1]
+        gap[:-1] = np.where(same_lane, s[1:] - s[:-1] - self.car_length, np.inf)
+
+        # The front car of a lane follows the last car of the lane it turns into
+        front = np.ones(len(order), dtype=bool)
+        front[:-1] = ~same_lane
+        front = np.flatnonzero(front)
+        next_edge = self.next_edge[order[front]]
+        occupied = self.lane_end[next_edge] > self.lane_start[next_edge]
+        tail = np.where(occupied, self.s[order[np.minimum(self.lane_start[next_edge], len(order) - 1)]], np.inf)
+        gap[front] = length[front] - s[front] + tail - self.car_length
+
+        # Red light: the stop line acts as a car standing there, for cars not past it yet
+        stop = self.stop_line[edge] - s
+        red = (stop >= 0) & ~self.green(self.edge_to[edge], self.edge_dir[edge])
+        gap = np.where(red, np.minimum(gap, stop), gap)
+
+        # Speed that still lets the car stop within the gap, reached at limited accel/braking
+        speed = self.speed[order]
+        target = np.minimum(self.max_speed[order], np.sqrt(2 * self.braking * np.maximum(gap - self.min_gap, 0)))
+        speed = speed + np.clip(target - speed, -self.braking * dt, self.acceleration * dt)
+        # Never drive into the car or the line ahead
+        move = np.clip(speed * dt, 0, np.maximum(gap, 0))
+        speed = np.where(move < speed * dt, move / dt, speed)
+        s = s + move
+
+        # Through the junction onto the next lane
+        over = np.flatnonzero(s >= length)
+        if len(over):
+            # Two cars turning into the same lane at once: one goes, the other waits a step
+            _, first = np.unique(self.next_edge[order[over]], return_index=True)
+            waiting = np.ones(len(over), dtype=bool)
+            waiting[first] = False
+            s[over[waiting]] = length[over[waiting]] - 0.01
+            speed[over[waiting]] = 0
+            over = over[~waiting]
+            slots = order[over]
+            s[over] -= length[over]
+            self.edge[slots] = self.next_edge[slots]
+            self.next_edge[slots] = self.choose_turns(self.edge[slots])
+
+        self.s[order] = s
+        self.speed[order] = speed
+        self.rebuild_lanes()
+        self.update_transforms()
+
+    def update_transforms(self):
+        order = self.order
+        edge = self.edge[order]
+        direction = self.edge_dir[edge]
+        dx = np.array((0, 1, 0, -1), dtype=np.float32)[direction]
+        dz = np.array((1, 0, -1, 0), dtype=np.float32)[direction]
+        start = self.edge_from[edge]
+        s = self.s[order]
+        # Driving on the right: the lane is offset to the right of the travel direction
+        offset = self.graph.lane_offset
+        self.x[order] = self.node_x[start] + dx * s + dz * offset
+        self.z[order] = self.node_z[start] + dz * s - dx * offset
+        self.heading[order] = direction * 90
+
+
+class TrafficRenderer(InstancedLayer):
+    def __init__(self, traffic, **kwargs):
+        super().__init__(model='cube', **kwargs)
+        self.traffic = traffic
+
+    def sync(self):
+        # Cars only ever face along the grid, so a swapped scale stands in for rotation
+        traffic = self.traffic
+        shown = traffic.order
+        width, height, length = traffic.car_size
+        along_x = (traffic.edge_dir[traffic.edge[shown]] % 2 == 1)[:, None]
+        scales = np.where(along_x, np.float32((length, height, width)), np.float32((width, height, length)))
+        positions = np.stack((traffic.x[shown], np.full(len(shown), traffic.y, dtype=np.float32),
+                              traffic.z[shown]), axis=1)
+        self.set_instance_arrays(positions, scales.astype(np.float32), traffic.colors[shown])
@@ -0,0 +1,103 @@
+import time as _time
+
+# Update LOD for AI actors
+# Actors far from the camera don't need a full update every frame. Each actor gets
+# a tier by distance: near ones tick every frame, mid-range ones every few frames
+# and far ones only now and then, with the time since their last tick as dt so
+# they still cover the same ground. Within a tier the actors are spread over the
+# frames of its interval (staggered), so the per-frame AI cost stays flat instead
+# of spiking every Nth frame.
+# Actors implement fixed_update(dt), the same as for the sim clock. An actor is
+# either scheduled or registered with the clock, never both, or it would step twice.
+
+DEFAULT_TIERS = ((50, 1), (120, 4), (None, 30))   # (max distance or None, interval in frames)
+
+
+class UpdateScheduler:
+    def __init__(self, tiers=DEFAULT_TIERS, clock=None):
+        # clock: the SimClock this scheduler is ticked from, to refuse actors it already steps
+        self.tiers = tiers
+        self.clock = clock
+        if clock is not None:
+            clock.schedulers.append(self)
+        # buckets[tier][phase]: the actors that tick on frames where frame % interval == phase
+        self.buckets = [[[] for _ in range(interval)] for _, interval in tiers]
+        self.entries = {}   # actor -> [tier, phase, time of last tick]
+        self.frame = 0
+        self.time = 0.0
+        # Last frame's numbers per tier, for tuning
+        self.stats = [{'actors': 0, 'ticked': 0, 'ms': 0.0} for _ in tiers]
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, actor):
+        return actor in self.entries
+
+    def tier_of(self, actor, focus):
+        dx, dz = actor.x - focus[0], actor.z - focus[2]
+        distance_sq = dx * dx + dz * dz
+        for tier, (max_distance, _) in enumerate(self.tiers):
+            if max_distance is None or distance_sq <= max_distance * max_distance:
+                return tier
+        return len(self.tiers) - 1
+
+    def place(self, actor, tier):
+        # Into the emptiest phase of the tier, which is what keeps the load even
+        buckets = self.buckets[tier]
+        phase = min(range(len(buckets)), key=lambda p: len(buckets[p]))
+        buckets[phase].append(actor)
+        return phase
+
+    def add(self, actor, focus=None):
+        if actor in self.entries:
+            return actor
+        if self.clock is not None and actor in self.clock.systems:
+            raise ValueError(f'{actor} is already stepped by the sim clock')
+        tier = self.tier_of(actor, focus) if focus is not None else 0
+        self.entries[actor] = [tier, self.place(actor, tier), self.time]
+        return actor
+
+    def remove(self, actor):
+        entry = self.entries.pop(actor, None)
+        if entry:
+            self.buckets[entry[0]][entry[1]].remove(actor)
+
+    def promote(self, actor, tier=0):
+        # E.g. a car the player just got into shouldn't wait for its next far tick
+        entry = self.entries.get(actor)
+        if entry and entry[0] != tier:
+            self.buckets[entry[0]][entry[1]].remove(actor)
+            entry[0], entry[1] = tier, self.place(actor, tier)
+
+    def tick(self, dt, focus):
+        # Call once per frame (or per sim step) with the camera position as focus
+        self.time += dt
+        self.frame += 1
+        moves = []
+        for tier, (_, interval) in enumerate(self.tiers):
+            stats = self.stats[tier]
+            stats['actors'] = sum(len(bucket) for bucket in self.buckets[tier])
+            bucket = self.buckets[tier][self.frame % interval]
+            start = _time.perf_counter()
+            for actor in list(bucket):
+                if not actor:
+                    # Destroyed elsewhere
+                    self.remove(actor)
+                    continue
+                entry = self.entries[actor]
+                actor.fixed_update(self.time - entry[2])
+                entry[2] = self.time
+                # Re-tier on tick: far actors are checked less often too
+                new_tier = self.tier_of(actor, focus)
+                if new_tier != tier:
+                    moves.append((actor, new_tier))
+            stats['ticked'] = len(bucket)
+            stats['ms'] = (_time.perf_counter() - start) * 1000
+
+        for actor, tier in moves:
+            self.promote(actor, tier)
+
+    def stats_text(self):
+        return ' | '.join(f'1/{interval}: {s["actors"]} ({s["ticked"]} ticked, {s["ms"]:.2f} ms)'
+                          for (_, interval), s in zip(self.tiers, self.stats))
@@ -0,0 +1,138 @@
+import numpy as np
+
+# Batched vehicle dynamics
+# Every car, player-driven, AI or police, is one slot in packed arrays: position,
+# heading, speed and its handling numbers. Controls come in as arrays too
+# (throttle -1..1, steer -1..1, e.g. held_keys['w'] - held_keys['s']), and one
+# step integrates all of them at once: accelerate or brake, drag when off the
+# throttle, steering scaled by speed, then forward motion along the heading.
+# Entities are bound to slots as render proxies and only get x, z and rotation_y
+# written back. Slots with awake = 0 (parked cars put to sleep) are skipped by
+# the step and never count as moving.
+#
+# Drag modes, for when the throttle is released:
+#   DRAG_COAST  slow down by coast (units/s per s) until stopped (app.py's cars)
+#   DRAG_DAMP   keep damping of the speed every 1/60 s (the old speed *= 0.95)
+#   DRAG_NONE   keep rolling at the current speed (cruising AI)
+
+DRAG_COAST = 0
+DRAG_DAMP = 1
+DRAG_NONE = 2
+
+DAMP_RATE = 60   # damping is given per step at this rate, scaled for other step sizes
+
+# Per slot, with defaults
+FIELDS = {
+    'x': 0.0, 'z': 0.0, 'heading': 0.0, 'speed': 0.0,
+    'throttle': 0.0, 'steer': 0.0,
+    'max_speed': 15.0, 'reverse_speed': 7.5, 'acceleration': 8.0, 'brake_power': 12.0, 'turn_speed': 60.0,
+    'drag': DRAG_DAMP, 'coast': 10.0, 'damping': 0.95,
+    'awake': 1,
+}
+FLAGS = ('drag', 'awake')   # stored as int8
+
+
+def integrate(speed, heading, throttle, steer, max_speed, reverse_speed, acceleration, brake_power, turn_speed,
+              drag=DRAG_COAST, coast=10.0, damping=0.95, dt=1 / 60, min_turn_speed=0.1):
+    # Arrays (or scalars) of one shape in, new (speed, heading) out. Heading in degrees, like rotation_y.
+    accelerated = speed + acceleration * dt
+    braked = speed - brake_power * dt
+    coast_step = coast * dt
+    coasted = np.where(speed > 0, np.maximum(speed - coast_step, 0), np.minimum(speed + coast_step, 0))
+    damped = speed * np.power(damping, dt * DAMP_RATE)
+    idle = np.where(drag == DRAG_COAST, coasted, np.where(drag == DRAG_DAMP, damped, speed))
+    speed = np.where(throttle > 0, accelerated, np.where(throttle < 0, braked, idle))
+    speed = np.clip(speed, -reverse_speed, max_speed)
+    # Cars turn with their speed (and backwards when reversing)
+    turn = steer * turn_speed * dt * speed / max_speed
+    heading = heading + np.where(np.abs(speed) > min_turn_speed, turn, 0)
+    return speed, heading
+
+
+def advance(x, z, heading, speed, dt):
+    # Forward motion along the heading: new (x, z)
+    radians = np.radians(heading)
+    step = speed * dt
+    return x + np.sin(radians) * step, z + np.cos(radians) * step
+
+
+class VehicleDynamics:
+    def __init__(self, capacity=32):
+        self.capacity = 0
+        self.count = 0
+        self.fields = {}
+        self.proxies = {}
+        self.grow(capacity)
+
+    def grow(self, capacity):
+        old = self.capacity
+        for name, default in FIELDS.items():
+            values = np.full(capacity, default, dtype=np.int8 if name in FLAGS else np.float32)
+            if old:
+                values[:old] = self.fields[name]
+            self.fields[name] = values
+            setattr(self, name, values)
+        self.capacity = capacity
+
+    def add(self, x=0.0, z=0.0, heading=0.0, **handling):
+        # Handling fields not given keep their defaults; reverse_speed defaults to half of max_speed
+        if self.count == self.capacity:
+            self.grow(self.capacity * 2)
+        slot = self.count
+        self.count += 1
+        handling.setdefault('reverse_speed', handling.get('max_speed', FIELDS['max_speed']) / 2)
+        for name, default in FIELDS.items():
+            self.fields[name][slot] = handling.get(name, default)
+        self.x[slot], self.z[slot], self.heading[slot] = x, z, heading
+        return slot
+
+    def bind(self, slot, entity):
+        self.proxies[slot] = entity
+
+    def place(self, slot, x, z, heading=None):
+        # Teleport (or pick up a move made elsewhere)
+        self.x[slot], self.z[slot] = x, z
+        if heading is not None:
+            self.heading[slot] = heading
+
+    def stop(self, slot):
+        self.speed[slot] = 0
+        self.throttle[slot] = 0
+        self.steer[slot] = 0
+
+    def sleep(self, slot):
+        # Stop the car and leave it out of every step until wake
+        self.stop(slot)
+        self.awake[slot] = 0
+
+    def wake(self, slot):
+        self.awake[slot] = 1
+
+    def step(self, dt):
+        n = self.count
+        if not n:
+            return
+        awake = self.awake[:n] != 0
+        speed, heading = integrate(self.speed[:n], self.heading[:n], self.throttle[:n], self.steer[:n],
+                                   self.max_speed[:n], self.reverse_speed[:n], self.acceleration[:n],
+                                   self.brake_power[:n], self.turn_speed[:n], self.drag[:n], self.coast[:n],
+                                   self.damping[:n], dt)
+        x, z = advance(self.x[:n], self.z[:n], heading, speed, dt)
+        self.speed[:n] = np.where(awake, speed, self.speed[:n])
+        self.heading[:n] = np.where(awake, heading, self.heading[:n])
+        self.x[:n] = np.where(awake, x, self.x[:n])
+        self.z[:n] = np.where(awake, z, self.z[:n])
+
+    def moving(self):
+        # Slots that moved or turned last step
+        n = self.count
+        return np.flatnonzero(((self.speed[:n] != 0) | (self.steer[:n] != 0) | (self.throttle[:n] != 0))
+                              & (self.awake[:n] != 0))
+
+    def sync(self, slots=None):
+        # Write x, z and heading back to the bound entities (by default only the ones that moved)
+        for slot in (self.moving() if slots is None else slots):
+            entity = self.proxies.get(slot)
+            if entity is not None:
+                entity.x, entity.z = self.x[slot].item(), self.z[slot].item()
+                entity.rotation_y = self.heading[slot].item()
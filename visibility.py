@@ -0,0 +1,189 @@
+import math
+
+# Grid based visibility culling
+# The city sits on a regular block grid, so each block (or streamed chunk) is a
+# cell with one bounding box. Every frame cells are tested against the camera
+# frustum, then against a few tall buildings close to the camera (conservative
+# occlusion: a cell is only hidden when an occluder covers all of it).
+
+
+def dot(a, b):
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+def normalized(v):
+    length = math.sqrt(dot(v, v)) or 1
+    return (v[0] / length, v[1] / length, v[2] / length)
+
+
+def frustum_planes(position, forward, right, up, h_fov, v_fov, far):
+    # Inward facing (normal, offset) planes, offset measured from the camera
+    a = math.radians(h_fov / 2)
+    b = math.radians(v_fov / 2)
+    ca, sa, cb, sb = math.cos(a), math.sin(a), math.cos(b), math.sin(b)
+
+    def combine(p, q, wp, wq):
+        return (p[0] * wp + q[0] * wq, p[1] * wp + q[1] * wq, p[2] * wp + q[2] * wq)
+
+    planes = [
+        (combine(right, forward, ca, sa), 0),     # left
+        (combine(right, forward, -ca, sa), 0),    # right
+        (combine(up, forward, cb, sb), 0),        # bottom
+        (combine(up, forward, -cb, sb), 0),       # top
+        (tuple(forward), 0),                      # near (the camera plane)
+        (tuple(-f for f in forward), far),        # far
+    ]
+    return [(normal, offset) for normal, offset in planes]
+
+
+def box_in_frustum(planes, position, bmin, bmax, margin=0.0):
+    for normal, offset in planes:
+        # Corner of the box furthest along the plane normal
+        corner = (
+            (bmax[0] if normal[0] >= 0 else bmin[0]) - position[0],
+            (bmax[1] if normal[1] >= 0 else bmin[1]) - position[1],
+            (bmax[2] if normal[2] >= 0 else bmin[2]) - position[2],
+        )
+        if dot(normal, corner) + offset < -margin:
+            return False
+    return True
+
+
+def footprint_view(position, bmin, bmax):
+    # Horizontal angular extent and distance range of a box seen from position,
+    # or None when the camera stands inside the footprint
+    px, pz = position[0], position[2]
+    if bmin[0] <= px <= bmax[0] and bmin[2] <= pz <= bmax[2]:
+        return None
+
+    center = math.atan2((bmin[0] + bmax[0]) / 2 - px, (bmin[2] + bmax[2]) / 2 - pz)
+    low, high = math.pi, -math.pi
+    far = 0
+    for x in (bmin[0], bmax[0]):
+        for z in (bmin[2], bmax[2]):
+            angle = math.atan2(x - px, z - pz) - center
+            angle = (angle + math.pi) % (2 * math.pi) - math.pi
+            low, high = min(low, angle), max(high, angle)
+            far = max(far, math.hypot(x - px, z - pz))
+
+    near_x = min(max(px, bmin[0]), bmax[0])
+    near_z = min(max(pz, bmin[2]), bmax[2])
+    near = math.hypot(near_x - px, near_z - pz)
+    return center + low, center + high, near, far
+
+
+def entity_bounds(entity):
+    position, scale = entity.world_position, entity.world_scale
+    return (
+        tuple(position[axis] - abs(scale[axis]) / 2 for axis in range(3)),
+        tuple(position[axis] + abs(scale[axis]) / 2 for axis in range(3)),
+    )
+
+
+class Cell:
+    def __init__(self, key, bmin, bmax, entities, occluders):
+        self.key = key
+        self.bmin = bmin
+        self.bmax = bmax
+        self.entities = entities
+        # (min, max) boxes solid enough to hide what's behind them
+        self.occluders = occluders
+        self.visible = True
+
+
+class GridCuller:
+    def __init__(self, occluder_range=90, max_occluders=8, min_occluder_height=6, margin=2.0):
+        self.cells = {}
+        self.occluder_range = occluder_range
+        self.max_occluders = max_occluders
+        self.min_occluder_height = min_occluder_height
+        self.margin = margin
+        self.stats = {'cells': 0, 'drawn': 0, 'frustum_culled': 0, 'occluded': 0}
+
+    def register_cell(self, key, entities, boxes):
+        # boxes: (min, max) of everything solid in the cell, used for bounds and as occluders
+        if not boxes:
+            return None
+        bmin = tuple(min(b[0][axis] for b in boxes) for axis in range(3))
+        bmax = tuple(max(b[1][axis] for b in boxes) for axis in range(3))
+        cell = Cell(key, bmin, bmax, entities, [b for b in boxes if b[1][1] - b[0][1] >= self.min_occluder_height])
+        self.cells[key] = cell
+        return cell
+
+    def unregister_cell(self, key):
+        self.cells.pop(key, None)
+
+    def set_visible(self, cell, visible):
+        if cell.visible != visible:
+            cell.visible = visible
+            for entity in cell.entities:
+                entity.visible = visible
+
+    def pick_occluders(self, position, candidates):
+        # Closest tall boxes rising above the camera, each with its view footprint
+        occluders = []
+        for bmin, bmax in candidates:
+            if bmax[1] <= position[1]:
+                continue
+            view = footprint_view(position, bmin, bmax)
+            if view and view[3] <= self.occluder_range:
+                occluders.append((view[3], bmax[1], view))
+        occluders.sort(key=lambda o: o[0])
+        return occluders[:self.max_occluders]
+
+    def is_occluded(self, position, cell, occluders):
+        if position[1] <= 0:
+            return False
+        view = footprint_view(position, cell.bmin, cell.bmax)
+        if view is None:
+            return False
+        low, high, near, far = view
+        target_rise = (cell.bmax[1] - position[1]) / max(near, 0.001)
+
+        for occluder_far, top, (o_low, o_high, o_near, _) in occluders:
+            if occluder_far >= near:
+                continue
+            # Lowest point of the occluder's top edge must be above the cell's highest point
+            if (top - position[1]) / occluder_far < target_rise:
+                continue
+            # Bring the cell's angles next to the occluder's before comparing
+            shift = round(((o_low + o_high) / 2 - (low + high) / 2) / (2 * math.pi)) * 2 * math.pi
+            if o_low <= low + shift and high + shift <= o_high:
+                return True
+        return False
+
+    def update(self, position, forward, right, up, h_fov, v_fov, far):
+        planes = frustum_planes(position, forward, right, up, h_fov, v_fov, far)
+        in_view = []
+        frustum_culled = 0
+        for cell in self.cells.values():
+            if box_in_frustum(planes, position, cell.bmin, cell.bmax, self.margin):
+                in_view.append(cell)
+            else:
+                self.set_visible(cell, False)
+                frustum_culled += 1
+
+        candidates = [box for cell in in_view for box in cell.occluders]
+        occluders = self.pick_occluders(position, candidates)
+
+        occluded = 0
+        for cell in in_view:
+            hidden = bool(occluders) and self.is_occluded(position, cell, occluders)
+            self.set_visible(cell, not hidden)
+            occluded += hidden
+
+        self.stats = {
+            'cells': len(self.cells),
+            'drawn': len(in_view) - occluded,
+            'frustum_culled': frustum_culled,
+            'occluded': occluded,
+        }
+        return self.stats
+
+    def update_from_camera(self, camera):
+        # The camera is usually parented to a scaled entity, so re-normalize its axes
+        h_fov, v_fov = camera.lens.get_fov()
+        return self.update(
+            tuple(camera.world_position), normalized(camera.forward), normalized(camera.right), normalized(camera.up),
+            h_fov, v_fov, camera.clip_plane_far
+        )
@@ -0,0 +1,133 @@
+from ursina import *
+import math
+
+# Chunked world streaming
+# The city is split on the road grid into square chunks of chunk_blocks x chunk_blocks
+# blocks. Only chunks near the player (or the car being driven) exist as entities;
+# loading and unloading is spread over frames with a per-frame budget.
+
+
+def chunk_block_range(c, chunk_blocks):
+    # Block indices covered by chunk index c along one axis
+    return range(c * chunk_blocks, (c + 1) * chunk_blocks)
+
+
+def chunk_road_segments(cx, cz, road_spacing, road_width, chunk_blocks, road_range=None, y=0.05):
+    # Road pieces inside one chunk as (position, scale) pairs, replacing the
+    # full-length road planes. road_range limits which road lines exist.
+    chunk_size = road_spacing * chunk_blocks
+    center_x = (cx + 0.5) * chunk_size
+    center_z = (cz + 0.5) * chunk_size
+    segments = []
+    for i in chunk_block_range(cz, chunk_blocks):
+        if road_range is None or i in road_range:
+            segments.append(((center_x, y, i * road_spacing), (chunk_size, 0.1, road_width)))
+    for i in chunk_block_range(cx, chunk_blocks):
+        if road_range is None or i in road_range:
+            segments.append(((i * road_spacing, y, center_z), (road_width, 0.1, chunk_size)))
+    return segments
+
+
+class ChunkManager:
+    def __init__(self, build_chunk, chunk_size, load_radius=150, unload_radius=None,
+                 loads_per_frame=1, unloads_per_frame=2, chunk_bounds=None):
+        # build_chunk(cx, cz) returns the list of entities making up that chunk
+        self.build_chunk = build_chunk
+        self.chunk_size = chunk_size
+        self.load_radius = load_radius
+        # Unload a bit further out than we load so chunks don't flicker on the border
+        self.unload_radius = unload_radius if unload_radius is not None else load_radius + chunk_size
+        self.loads_per_frame = loads_per_frame
+        self.unloads_per_frame = unloads_per_frame
+        # (min_cx, max_cx, min_cz, max_cz) inclusive, or None for no limit
+        self.chunk_bounds = chunk_bounds
+
+        self.loaded = {}
+        # (on_load(key, entities), on_unload(key)) pairs, e.g. LOD or culling bookkeeping
+        self.listeners = []
+        self.load_queue = []
+        self.unload_queue = []
+        self.last_focus_chunk = None
+
+    def chunk_of(self, x, z):
+        return (math.floor(x / self.chunk_size), math.floor(z / self.chunk_size))
+
+    def chunk_center(self, key):
+        return ((key[0] + 0.5) * self.chunk_size, (key[1] + 0.5) * self.chunk_size)
+
+    def chunk_distance(self, key, x, z):
+        cx, cz = self.chunk_center(key)
+        return math.hypot(cx - x, cz - z)
+
+    def in_bounds(self, key):
+        if self.chunk_bounds is None:
+            return True
+        min_cx, max_cx, min_cz, max_cz = self.chunk_bounds
+        return min_cx <= key[0] <= max_cx and min_cz <= key[1] <= max_cz
+
+    def wanted_chunks(self, x, z):
+        reach = int(math.ceil(self.load_radius / self.chunk_size)) + 1
+        fx, fz = self.chunk_of(x, z)
+        wanted = []
+        for cx in range(fx - reach, fx + reach + 1):
+            for cz in range(fz - reach, fz + reach + 1):
+                key = (cx, cz)
+                if self.in_bounds(key) and self.chunk_distance(key, x, z) <= self.load_radius:
+                    wanted.append(key)
+        return wanted
+
+    def plan(self, x, z):
+        # Rebuild the queues, nearest missing chunk first
+        wanted = [key for key in self.wanted_chunks(x, z) if key not in self.loaded]
+        wanted.sort(key=lambda key: self.chunk_distance(key, x, z))
+        self.load_queue = wanted
+        self.unload_queue = [key for key in self.loaded if self.chunk_distance(key, x, z) > self.unload_radius]
+
+    def add_listener(self, on_load=None, on_unload=None):
+        self.listeners.append((on_load, on_unload))
+        if on_load:
+            for key, entities in self.loaded.items():
+                on_load(key, entities)
+
+    def load(self, key):
+        entities = self.build_chunk(*key)
+        self.loaded[key] = entities
+        for on_load, _ in self.listeners:
+            if on_load:
+                on_load(key, entities)
+
+    def unload(self, key):
+        for _, on_unload in self.listeners:
+            if on_unload:
+                on_unload(key)
+        for entity in self.loaded.pop(key):
+            destroy(entity)
+
+    def prime(self, focus):
+        # Load everything around the start position at once (used before the first frame)
+        self.plan(focus[0], focus[2])
+        for key in self.load_queue:
+            self.load(key)
+        self.load_queue = []
+        self.last_focus_chunk = self.chunk_of(focus[0], focus[2])
+
+    def update(self, focus):
+        x, z = focus[0], focus[2]
+        focus_chunk = self.chunk_of(x, z)
+        if focus_chunk != self.last_focus_chunk:
+            self.last_focus_chunk = focus_chunk
+            self.plan(x, z)
+
+        for _ in range(min(self.unloads_per_frame, len(self.unload_queue))):
+            key = self.unload_queue.pop(0)
+            if key in self.loaded:
+                self.unload(key)
+
+        for _ in range(min(self.loads_per_frame, len(self.load_queue))):
+            key = self.load_queue.pop(0)
+            if key not in self.loaded:
+                self.load(key)
+
+    @property
+    def loaded_count(self):
+        return len(self.loaded)